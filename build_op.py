@@ -3,74 +3,32 @@
 from __future__ import print_function
 
 import argparse
-import fileinput
 import json
-from json import JSONEncoder,JSONDecoder
 import os
 import re
 import shutil
 import stat
-import subprocess
 import sys
-import tarfile
 import tempfile
+import time
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
-from twobit.oebuild import BBLayerSerializer, FetcherEncoder, LayerSerializer, PathSanity, Repo, RepoEncoder, RepoFetcher
+from twobit.oebuild import BBLayerSerializer, BuildTypeChecker, CacheCollector, CloneOptions, ConfParser, FetcherEncoder, FetchHistory, GeneratedFile, GitRunner, HostParallelism, LayerSerializer, ManifestArchive, ManifestError, ManifestLoader, MirrorCache, PathSanity, PlanEntry, ProcessLoop, ProgressDisplay, RemoteResolver, Repo, RepoEncoder, RepoFetcher, RetryPolicy, SharedCaches, StateCache, Tracer
 
-def layers_from_bblayers(top_dir, bblayers_fd):
-    """ Parse the layers from the bblayers.conf file
-
-    top_dir: The absolute path to replace occurrences of TOPDIR in the
-             bblayers.conf file.
-    bblayers_fd: A file object attached to the bblayers.conf file
+def trace_start(args):
+    """ Tracer for the git commands of an action run with --trace, None
+        otherwise.
     """
-    front = ""
-    while True:
-        cur = bblayers_fd.read(1)
-        if not front.endswith("BBLAYERS"):
-            front += cur
-        else:
-            break
-    # Gobble till first quote
-    while True:
-        cur = bblayers_fd.read(1)
-        if cur == '\"':
-            break
-    # collect all characters till the next quote
-    layers = ""
-    while True:
-        cur = bblayers_fd.read(1)
-        if cur == '\"' and not layers.endswith('\\'):
-            break
-        else:
-            if cur == '\n':
-                layers += ' '
-            else:
-                layers += cur
-
-    # strip newlines and extra whitespace
-    tmp =  " ".join(layers.replace("${TOPDIR}", top_dir).split())
-    return tmp
-
-def repo_state(git_dir):
-    """ Collect the url, branch and revision of the parameter git repo
+    return Tracer() if args.trace is not None else None
 
-    git_dir: The file path to a local git clone.
-    returns a tripple (url, branch, rev)
+def trace_write(tracer, args):
+    """ Write what tracer recorded to the file given with --trace.
     """
-    rev = subprocess.check_output(
-        ["git", "--git-dir", git_dir, "rev-parse", "HEAD"]
-    ).rstrip()
-    branch = subprocess.check_output(
-        ["git", "--git-dir", git_dir, "rev-parse", "--abbrev-ref", "HEAD"]
-    ).rstrip()
-    remote = subprocess.check_output(
-        ["git", "--git-dir", git_dir, "rev-parse", "--abbrev-ref", "--symbolic-full-name", "@{u}"]
-    ).split("/")[0].rstrip()
-    url = subprocess.check_output(
-        ["git", "--git-dir", git_dir, "config", "--get", "remote." + remote + ".url"]
-    ).rstrip()
-    return url, branch, rev
+    if tracer is not None:
+        tracer.write(args.trace, trace_format=args.trace_format)
 
 def json_gen(args):
     """ Parse bblayers.conf and collect data from repos in src_dir to generate
@@ -81,11 +39,14 @@ def json_gen(args):
     paths["bblayers_file"] = os.path.join(paths["conf_dir"], "bblayers.conf")
     paths["src_dir"] = args.src_dir
     paths["json_out"] = args.json_out
+    paths["cache_file"] = os.path.join(".build_op_cache", "state.json")
 
     # build a list of Repo objects and create a fetcher for them
+    cache = None if args.no_cache else StateCache(paths["cache_file"])
     repos = Repo.repos_from_state(paths["bblayers_file"],
                                   top_dir=paths._top_dir,
-                                  src_dir=paths["src_dir"])
+                                  src_dir=paths["src_dir"],
+                                  jobs=args.jobs, cache=cache)
     fetcher = RepoFetcher(paths["src_dir"], repos=repos)
     # Serialize Repo objects to JSON manifest
     with open(paths["json_out"], 'w') as repo_json_fd:
@@ -98,11 +59,14 @@ def layers_gen(args):
     paths["src_dir"] = args.src_dir
     paths["bblayers_file"] = args.bblayers_file
     paths["layers_file"] = args.layers_file
+    paths["cache_file"] = os.path.join(".build_op_cache", "state.json")
 
     # create list of Repo objects
+    cache = None if args.no_cache else StateCache(paths["cache_file"])
     repos = Repo.repos_from_state(paths["bblayers_file"],
                                   top_dir=paths._top_dir,
-                                  src_dir=paths["src_dir"])
+                                  src_dir=paths["src_dir"],
+                                  jobs=args.jobs, cache=cache)
 
     # create LAYERS file
     layers = LayerSerializer(repos)
@@ -127,37 +91,63 @@ def manifest(args):
     paths.setitem_strict("build_file", "build.sh", exist=True)
     paths.setitem_strict("build_op_file", "build_op.py", exist=True)
     paths.setitem_strict("layers_file", "LAYERS.json", exist=True)
-    archive_prefix = args.archive
-    paths["archive_file"] = archive_prefix + ".tar.bz2"
-
-    # collect build config files and tar it all up
-    # make temporary directory
-    tmp_paths = PathSanity(tempfile.mkdtemp())
-    tmp_paths.setitem_strict("conf_dir", "conf", exist=False)
-    # mk conf dir
-    os.mkdir(tmp_paths["conf_dir"])
-    # copy local.conf to tmp/conf/local.conf
-    shutil.copy(paths["bblayers_file"], tmp_paths["conf_dir"])
-    shutil.copy(paths["localconf_file"], tmp_paths["conf_dir"])
-    # copy environment.sh to tmp/
-    shutil.copy(paths["env_file"], tmp_paths._top_dir)
-    # copy build.sh to tmp/
-    shutil.copy(paths["build_file"], tmp_paths._top_dir)
-    # copy fetch.sh to tmp/
-    shutil.copy(paths["build_op_file"], tmp_paths._top_dir)
-    # copy LAYERS to tmp
-    shutil.copy(paths["layers_file"], tmp_paths._top_dir)
-
-    # tar it all up
-    with tarfile.open(paths["archive_file"], "w:bz2") as tar:
-        tar.add(tmp_paths._top_dir, arcname=archive_prefix, recursive=True)
-
-    return
+    archive_prefix, compression = ManifestArchive.split_name(args.archive)
+    if args.compression is not None:
+        compression = args.compression
+    try:
+        archive = ManifestArchive(os.path.basename(archive_prefix),
+                                  compression=compression or "bz2",
+                                  checksums=args.checksums,
+                                  mtime=int(os.environ.get("SOURCE_DATE_EPOCH", 0)))
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    paths["archive_file"] = os.path.join(os.path.dirname(archive_prefix),
+                                         archive.file_name())
+
+    # stream build config files straight into the archive
+    archive.add_file(paths["bblayers_file"], "conf/bblayers.conf")
+    archive.add_file(paths["localconf_file"], "conf/local.conf")
+    archive.add_file(paths["env_file"], "environment.sh")
+    archive.add_file(paths["build_file"], "build.sh")
+    archive.add_file(paths["build_op_file"], "build_op.py")
+    archive.add_file(paths["layers_file"], "LAYERS.json")
+    tracer = trace_start(args)
+    if not args.bundles:
+        archive.write(paths["archive_file"])
+        trace_write(tracer, args)
+        return
+
+    # bundle the pinned revision of every repo so the build can be
+    # reproduced without network access
+    paths.setitem_strict("src_dir", args.src_dir, exist=True)
+    try:
+        repos = ManifestLoader(paths["layers_file"]).load()
+    except ManifestError as e:
+        print(e)
+        sys.exit(1)
+    fetcher = RepoFetcher(paths["src_dir"], repos=repos, jobs=args.jobs,
+                          tracer=tracer)
+    bundle_dir = tempfile.mkdtemp()
+    try:
+        results = fetcher.bundle(bundle_dir)
+        if not all(result.ok() for result in results):
+            RepoFetcher.report(results)
+            sys.exit(1)
+        for repo in repos:
+            archive.add_file(os.path.join(bundle_dir, repo._name + ".bundle"),
+                             os.path.join("bundles", repo._name + ".bundle"))
+        archive.write(paths["archive_file"])
+    finally:
+        shutil.rmtree(bundle_dir)
+        trace_write(tracer, args)
 
 def setup(args):
     """ Setup build structure.
     """
-    # Setup paths to source and destination files. Test for existence.
+    # Setup paths to source and destination files. Test for existence,
+    # existing files are regenerated when updating.
+    dst_exist = None if args.update else False
     try:
         paths = PathSanity(args.top_dir)
         paths["src_dir"] = args.src_dir
@@ -168,8 +158,8 @@ def setup(args):
         paths.setitem_strict("build_src",
                              os.path.join(paths["build_op_data"],
                                           "build_" + build_type + ".sh"))
-        paths.setitem_strict("build_dst", "build.sh", exist=False)
-        paths.setitem_strict("json_dst", "LAYERS.json", exist=False)
+        paths.setitem_strict("build_dst", "build.sh", exist=dst_exist)
+        paths.setitem_strict("json_dst", "LAYERS.json", exist=dst_exist)
         paths.setitem_strict("json_src",
                              os.path.join(paths["build_op_data"],
                                           "LAYERS_" + build_type + ".json"))
@@ -178,53 +168,91 @@ def setup(args):
                                           "local_" + build_type + ".conf"))
         paths.setitem_strict("local_conf_dst",
                              os.path.join(paths["conf_dir"], "local.conf"),
-                             exist=False)
+                             exist=dst_exist)
         paths.setitem_strict("env_src",
                              os.path.join(paths["build_op_data"],
                                           "environment.sh.template"))
-        paths.setitem_strict("env_dst", "environment.sh", exist=False)
+        paths.setitem_strict("env_dst", "environment.sh", exist=dst_exist)
         paths.setitem_strict("bblayers_dst",
                              os.path.join(paths["conf_dir"], "bblayers.conf"),
-                             exist=False)
+                             exist=dst_exist)
     except ValueError as e:
         print(e)
         sys.exit(1)
 
     # Parse JSON file with repo data
-    with open(paths["json_src"], 'r') as repos_fd:
-        while True:
-            try:
-                repos = JSONDecoder(object_hook=Repo.repo_decode).decode(repos_fd.read())
-                fetcher = RepoFetcher(paths["src_dir"], repos=repos)
-            except ValueError:
-                break;
-    # create bblayers.conf file
-    if not os.path.isdir(paths["conf_dir"]):
-        os.mkdir(paths["conf_dir"])
-    bblayers = BBLayerSerializer(paths.getitem_rel("src_dir"),
-                                 repos=fetcher._repos)
-    with open(paths["bblayers_dst"], 'w') as test_file:
-        bblayers.write(fd=test_file)
-
-    # create LAYERS.json in root of build to make it obvious which layers are
+    try:
+        repos = ManifestLoader(paths["json_src"]).load()
+        if args.parallelism:
+            profile_name, profile = HostParallelism.load_profile(
+                os.path.join(paths["build_op_data"], "parallelism.json"), build_type)
+            parallelism = HostParallelism(cpus=args.cpus, memory=args.memory,
+                                          profile=profile, profile_name=profile_name)
+        # command line wins over the host config file
+        host_conf = SharedCaches.host_conf(args.host_conf)
+        min_free = args.min_free
+        if min_free is None:
+            min_free = host_conf.get("BUILD_OP_MIN_FREE", 20.0)
+        caches = SharedCaches(dl_dir=args.dl_dir or host_conf.get("DL_DIR"),
+                              sstate_dir=args.sstate_dir or host_conf.get("SSTATE_DIR"),
+                              min_free=min_free)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    errors = caches.check()
+    if errors:
+        for error in errors:
+            print(error)
+        sys.exit(1)
+    fetcher = RepoFetcher(paths["src_dir"], repos=repos)
+    # render every file in memory first. Only files whose content changed
+    # are replaced so an unchanged conf doesn't invalidate the parse cache.
+    def read(name):
+        with open(paths[name], 'r') as src_fd:
+            return src_fd.read()
+    executable = stat.S_IRWXU | stat.S_IRWXG | stat.S_IROTH | stat.S_IWOTH
+    outputs = []
+    # bblayers.conf, layers already fetched are sorted by their dependencies
+    bblayers_fd = StringIO()
+    bblayers = BBLayerSerializer(paths.getitem_rel("src_dir"), repos=fetcher._repos,
+                                 top_dir=paths._top_dir, roots=args.layer_root,
+                                 prune=args.prune_layers)
+    bblayers.write(fd=bblayers_fd)
+    for warning in bblayers.warnings():
+        print("warning: {0}".format(warning))
+    outputs.append(("bblayers_dst", bblayers_fd.getvalue(), None))
+
+    # LAYERS.json in root of build to make it obvious which layers are
     # currently in use.
-    shutil.copy(paths["json_src"], paths["json_dst"])
-
-    # copy local_type.conf -> local.conf
-    shutil.copy(paths["local_conf_src"], paths["local_conf_dst"])
+    outputs.append(("json_dst", read("json_src"), None))
+
+    # local_type.conf -> local.conf, later assignments win over the
+    # values from the template
+    local_conf = read("local_conf_src")
+    if args.parallelism:
+        local_conf += "\n" + parallelism.conf()
+    if caches.dirs():
+        local_conf += "\n" + caches.local_conf()
+    outputs.append(("local_conf_dst", local_conf, None))
+
+    # environment.sh
+    sources = paths.getitem_rel("src_dir")
+    environment = "".join(re.sub("@sources@", sources, line.rstrip()) + "\n"
+                          for line in read("env_src").splitlines())
+    if caches.dirs():
+        environment += "\n" + caches.environment()
+    outputs.append(("env_dst", environment, executable))
+
+    # build script
+    outputs.append(("build_dst", read("build_src"), executable))
 
-    # generate environment.sh
-    shutil.copy(paths["env_src"], paths["env_dst"])
-    os.chmod(paths["env_dst"],
-             stat.S_IRWXU | stat.S_IRWXG | stat.S_IROTH | stat.S_IWOTH)
-    for line in fileinput.input(paths["env_dst"], inplace=1):
-        line = re.sub("@sources@", paths.getitem_rel("src_dir"), line.rstrip())
-        print(line)
-
-    # copy build script
-    shutil.copy(paths["build_src"], paths["build_dst"])
-    os.chmod(paths["build_dst"],
-             stat.S_IRWXU | stat.S_IRWXG | stat.S_IROTH | stat.S_IWOTH)
+    if not os.path.isdir(paths["conf_dir"]):
+        os.mkdir(paths["conf_dir"])
+    for name, content, mode in outputs:
+        written = GeneratedFile(paths[name], mode=mode).write(content)
+        if args.update:
+            print("{0}: {1}".format(paths.getitem_rel(name),
+                                    "updated" if written else "unchanged"))
 
     return
 
@@ -236,30 +264,255 @@ def fetch_repos(args):
         paths = PathSanity(args.top_dir)
         paths["src_dir"] = args.src_dir
         paths.setitem_strict("json_in", args.json_in)
+        paths["history_file"] = os.path.join(".build_op_cache", "fetch-history.json")
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    tracer = trace_start(args)
+    if args.worktrees and args.mirror_dir is None:
+        print("--worktrees requires --mirror-dir")
+        sys.exit(1)
+    if args.worktrees and args.bundle_dir is not None:
+        print("--worktrees can't be used with --bundle-dir")
+        sys.exit(1)
+    mirror = None
+    if args.mirror_dir is not None:
+        mirror = MirrorCache(args.mirror_dir)
+    try:
+        clone_options = CloneOptions(args.depth, args.single_branch or None,
+                                     args.filter)
+        timeout = None
+        timeouts = {}
+        for spec in args.timeout:
+            op, seconds = RetryPolicy.parse_timeout(spec)
+            if op is None:
+                timeout = seconds
+            else:
+                timeouts[op] = seconds
+        policy = RetryPolicy(retries=args.retries, backoff=args.backoff,
+                             timeout=timeout, timeouts=timeouts)
     except ValueError as e:
         print(e)
         sys.exit(1)
 
     # Parse JSON file with repo data
-    with open(paths["json_in"], 'r') as repos_fd:
-        while True:
-            try:
-                repos = JSONDecoder(object_hook=Repo.repo_decode).decode(repos_fd.read())
-                fetcher = RepoFetcher(paths["src_dir"], repos=repos)
-            except ValueError:
-                break;
+    try:
+        repos = ManifestLoader(paths["json_in"]).load()
+    except ManifestError as e:
+        print(e)
+        sys.exit(1)
+    # concurrent git processes are driven by a single loop showing their
+    # progress
+    loop = None
+    if args.jobs > 1 or policy.has_timeouts():
+        display = ProgressDisplay() if sys.stderr.isatty() else None
+        loop = ProcessLoop(display=display)
+    fetcher = RepoFetcher(paths["src_dir"], repos=repos, jobs=args.jobs,
+                          mirror=mirror, clone_options=clone_options,
+                          tracer=tracer, worktrees=args.worktrees, loop=loop,
+                          policy=policy, fail_fast=args.fail_fast,
+                          history=FetchHistory(paths["history_file"]))
 
     if not os.path.exists(paths["src_dir"]):
         os.mkdir(paths["src_dir"])
 
     try:
-        if not update:
-            fetcher.clone()
+        if args.bundle_dir is not None:
+            results = fetcher.restore(os.path.abspath(args.bundle_dir))
+        elif not update:
+            results = fetcher.clone()
         else:
-            fetcher.update()
-    except EnvironmentError as e:
+            results = fetcher.update()
+    except KeyboardInterrupt:
+        if loop is not None:
+            loop.cancel()
+            loop.close()
+        print("fetch cancelled")
+        sys.exit(130)
+    finally:
+        # also after Ctrl-C, the trace shows what was hanging
+        trace_write(tracer, args)
+    if loop is not None:
+        loop.close()
+    RepoFetcher.report(results)
+    if not all(result.ok() for result in results):
+        sys.exit(1)
+
+def resolve(args):
+    """ Pin every repo in the JSON file to the commit its branch points at on
+        the remote.
+    """
+    try:
+        paths = PathSanity(args.top_dir)
+        paths.setitem_strict("json_in", args.json_in)
+        paths["json_out"] = args.json_out if args.json_out is not None else args.json_in
+        paths["cache_file"] = os.path.join(".build_op_cache", "ls-remote.json")
+        repos = ManifestLoader(paths["json_in"]).load()
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    cache_file = paths["cache_file"] if args.ttl > 0 else None
+    tracer = trace_start(args)
+    resolver = RemoteResolver(cache_file=cache_file, ttl=args.ttl,
+                              jobs=args.jobs,
+                              runner=GitRunner(tracer=tracer, name="ls-remote"))
+    try:
+        repos = resolver.resolve(repos, force=args.force)
+    except (EnvironmentError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+    finally:
+        trace_write(tracer, args)
+    fetcher = RepoFetcher(args.src_dir, repos=repos)
+    with open(paths["json_out"], 'w') as repo_json_fd:
+        json.dump(fetcher, repo_json_fd, indent=4, cls=FetcherEncoder)
+
+def plan_fetcher(args, tracer=None):
+    """ Create the RepoFetcher for the plan and apply actions, pinning
+        branches to the commit on their remote first if asked to.
+
+    tracer: Optional Tracer recording the git commands.
+    """
+    if args.worktrees and args.mirror_dir is None:
+        print("--worktrees requires --mirror-dir")
+        sys.exit(1)
+    try:
+        paths = PathSanity(args.top_dir)
+        paths["src_dir"] = args.src_dir
+        paths.setitem_strict("json_in", args.json_in)
+        paths["cache_file"] = os.path.join(".build_op_cache", "ls-remote.json")
+        repos = ManifestLoader(paths["json_in"]).load()
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if args.resolve:
+        cache_file = paths["cache_file"] if args.ttl > 0 else None
+        resolver = RemoteResolver(cache_file=cache_file, ttl=args.ttl,
+                                  jobs=args.jobs,
+                                  runner=GitRunner(tracer=tracer, name="ls-remote"))
+        try:
+            repos = resolver.resolve(repos)
+        except (EnvironmentError, ValueError) as e:
+            print(e)
+            sys.exit(1)
+    mirror = None
+    if args.mirror_dir is not None:
+        mirror = MirrorCache(args.mirror_dir)
+    return RepoFetcher(paths["src_dir"], repos=repos, jobs=args.jobs,
+                       mirror=mirror, worktrees=args.worktrees, tracer=tracer)
+
+def plan(args):
+    """ Show what apply would do to bring the repos to the state described
+        by the LAYERS.json file.
+    """
+    tracer = trace_start(args)
+    try:
+        entries = plan_fetcher(args, tracer).plan()
+    finally:
+        trace_write(tracer, args)
+    counts = {}
+    for entry in entries:
+        print(entry)
+        counts[entry._action] = counts.get(entry._action, 0) + 1
+    print(", ".join("{0} {1}".format(counts[action], action)
+                    for action in sorted(counts)))
+
+def apply_plan(args):
+    """ Bring the repos to the state described by the LAYERS.json file with
+        the minimal set of git operations.
+    """
+    tracer = trace_start(args)
+    try:
+        fetcher = plan_fetcher(args, tracer)
+        if not os.path.exists(fetcher._base):
+            os.mkdir(fetcher._base)
+        for entry in fetcher.plan():
+            if entry._action == PlanEntry.EXTRANEOUS:
+                print("warning: {0} is not in the JSON file, leaving it alone".format(entry._name))
+        results = fetcher.apply()
+    finally:
+        trace_write(tracer, args)
+    RepoFetcher.report(results)
+    if not all(result.ok() for result in results):
+        sys.exit(1)
+
+def check_all(args):
+    """ Check every build type in the build_op_data directory.
+    """
+    if not os.path.isdir(args.build_op_data):
+        print("{0} does not exist".format(args.build_op_data))
+        sys.exit(1)
+    checker = BuildTypeChecker(args.build_op_data, src_dir=args.src_dir)
+    start = time.time()
+    common_errors = checker.check_common()
+    results = checker.check_all()
+    total = time.time() - start
+    for error in common_errors:
+        print(error)
+    failed = 0
+    for build_type, errors, seconds in results:
+        status = "ok" if not errors else "{0} error(s)".format(len(errors))
+        print("{0}: {1} ({2:.1f} ms)".format(build_type, status, seconds * 1000))
+        for error in errors:
+            print("    {0}".format(error))
+        if errors:
+            failed += 1
+    print("checked {0} build types in {1:.1f} ms, {2} failed".format(
+        len(results), total * 1000, failed))
+    if failed or common_errors:
+        sys.exit(1)
+
+def cache_gc(args):
+    """ Evict least recently used entries from DL_DIR and SSTATE_DIR.
+    """
+    try:
+        paths = PathSanity(args.top_dir)
+        paths["local_conf"] = os.path.join("conf", "local.conf")
+        conf = ConfParser({"TOPDIR": paths._top_dir})
+        if os.path.exists(paths["local_conf"]):
+            conf.parse_file(paths["local_conf"])
+    except ValueError as e:
         print(e)
         sys.exit(1)
+    caches = []
+    for name, path, depth in (("DL_DIR", args.dl_dir, 1),
+                              ("SSTATE_DIR", args.sstate_dir, None)):
+        path = path or conf.getvar(name)
+        if path is None or "${" in path:
+            print("{0} is not set in {1}, use --{2}".format(
+                name, paths["local_conf"], name.lower().replace("_", "-")))
+            sys.exit(1)
+        if os.path.isdir(path):
+            caches.append((name, path, depth))
+    for build_dir in args.keep_build:
+        if not os.path.isdir(build_dir):
+            print("--keep-build {0} is not a directory".format(build_dir))
+            sys.exit(1)
+    keep = CacheCollector.referenced(args.keep_build or [paths._top_dir])
+    max_size = None if args.max_size is None else int(args.max_size * 1024 ** 3)
+    max_age = None if args.max_age is None else args.max_age * 24 * 3600
+    for name, path, depth in caches:
+        collector = CacheCollector(path, depth=depth)
+        listed = collector.scan()
+        print("{0} {1}: {2} entries, {3:.2f} GiB, listed {4} directories".format(
+            name, path, collector.entries(), collector.size() / float(1024 ** 3), listed))
+        evicted = collector.collect(max_size=max_size, max_age=max_age,
+                                    keep=keep if name == "SSTATE_DIR" else None,
+                                    dry_run=args.dry_run)
+        if args.verbose:
+            for key, size, last_use in evicted:
+                print("    {0} ({1:.1f} MiB, last used {2})".format(
+                    key, size / float(1024 ** 2),
+                    time.strftime("%Y-%m-%d", time.localtime(last_use))))
+        freed = sum(size for _, size, _ in evicted)
+        left = collector.size() - freed if args.dry_run else collector.size()
+        print("{0}: {1} {2} entries, {3:.2f} GiB, {4:.2f} GiB left".format(
+            name, "would evict" if args.dry_run else "evicted", len(evicted),
+            freed / float(1024 ** 3), left / float(1024 ** 3)))
+        if not args.dry_run:
+            collector.save()
 
 def main():
     description = "Manage OE build infrastructure."
@@ -277,31 +530,93 @@ def main():
     build_type_help = "The type of the build to setup."
     json_gen_help = "Parse bblayers.conf and git repos in source dir to generate JSON file describing the build."
     json_out_help = "File to write JSON representation of the build state to."
-    archive_file_help = "Prefix for build archive file name."
+    archive_file_help = "Prefix for build archive file name. A known " \
+            "extension like .tar.gz selects the compression."
+    compression_help = "Compression for the archive. Default is bz2 unless " \
+            "the archive name has a known extension. zst needs the " \
+            "zstandard python module."
+    checksums_help = "Add a SHA256SUMS file with the hash of each file in " \
+            "the archive."
     layers_file_help = "File it write LAYERS representation of the build state to."
     layers_gen_help = "Parse git repos in source dir to generate LAYERS file describing the build."
+    state_jobs_help = "Number of repos whose state is collected concurrently."
+    no_cache_help = "Scan every repo instead of reusing the state cached " \
+            "in .build_op_cache for repos whose git metadata is unchanged."
+    bundles_help = "Include a git bundle of the pinned revision of each " \
+            "repo so the build can be restored offline with " \
+            "'fetch --bundle-dir'."
+    bundle_jobs_help = "Number of bundles created concurrently."
+    fetch_bundle_dir_help = "Create the repos from the bundles in this " \
+            "directory (the 'bundles' directory of a manifest archive) " \
+            "instead of cloning them."
+    trace_help = "Record the time, exit code and bytes transferred of " \
+            "every git command and write the trace to this file."
+    trace_format_help = "Format of the trace file: plain JSON or the " \
+            "Chrome trace event format (chrome://tracing, Perfetto)."
     build_op_data_help = "Path to directory containing data for use by " + __file__
 
     parser = argparse.ArgumentParser(prog=__file__, description=description)
     actionparser = parser.add_subparsers(help=action_help)
     # parser for 'setup' action
+    setup_parallelism_help = "Set BB_NUMBER_THREADS, PARALLEL_MAKE and " \
+            "BB_NUMBER_PARSE_THREADS in local.conf from the CPUs and memory " \
+            "of this host and the profile of the build type in " \
+            "build_op_data/parallelism.json."
+    setup_update_help = "Regenerate the files of an existing build " \
+            "directory. Files whose content didn't change are left alone so " \
+            "bitbake keeps its parse cache."
+    setup_layer_root_help = "Collection or layer the build needs. Layers " \
+            "none of the roots depends on are reported, or dropped with " \
+            "--prune-layers. May be given many times."
+    setup_prune_layers_help = "Leave layers incompatible with the core " \
+            "layer or not needed by a --layer-root out of bblayers.conf. " \
+            "Needs the layers fetched, run setup --update after fetch."
+    setup_cpus_help = "Number of CPUs to use instead of the detected one."
+    setup_memory_help = "Memory in GiB to use instead of the detected one."
+    setup_dl_dir_help = "Download directory shared with other build " \
+            "directories, overrides DL_DIR from the host config file."
+    setup_sstate_dir_help = "sstate cache shared with other build " \
+            "directories, overrides SSTATE_DIR from the host config file."
+    setup_host_conf_help = "Host config file setting DL_DIR, SSTATE_DIR and " \
+            "BUILD_OP_MIN_FREE in bitbake syntax. Default is the first of " + \
+            ", ".join(SharedCaches.HOST_CONFS) + " that exists."
+    setup_min_free_help = "Free space in GiB required on the filesystems of " \
+            "the shared directories (default: BUILD_OP_MIN_FREE or 20)."
     setup_parser = actionparser.add_parser("setup", help=setup_help)
     setup_parser.add_argument("-b", "--build-type", default="oe-core", help=build_type_help)
     setup_parser.add_argument("-t", "--top-dir", default=os.getcwd(), help=top_dir_help)
     setup_parser.add_argument("-s", "--src-dir", default="sources", help=source_dir_help)
     setup_parser.add_argument("-d", "--build-op-data", default="build_op_data", help=build_op_data_help)
+    setup_parser.add_argument("-u", "--update", action="store_true", default=False, help=setup_update_help)
+    setup_parser.add_argument("--layer-root", action="append", default=[], help=setup_layer_root_help)
+    setup_parser.add_argument("--prune-layers", action="store_true", default=False, help=setup_prune_layers_help)
+    setup_parser.add_argument("--parallelism", action="store_true", default=False, help=setup_parallelism_help)
+    setup_parser.add_argument("--cpus", type=int, default=None, help=setup_cpus_help)
+    setup_parser.add_argument("--memory", type=float, default=None, help=setup_memory_help)
+    setup_parser.add_argument("--dl-dir", default=None, help=setup_dl_dir_help)
+    setup_parser.add_argument("--sstate-dir", default=None, help=setup_sstate_dir_help)
+    setup_parser.add_argument("--host-conf", default=None, help=setup_host_conf_help)
+    setup_parser.add_argument("--min-free", type=float, default=None, help=setup_min_free_help)
     setup_parser.set_defaults(func=setup)
     # parser for 'manifest' action
     manifest_parser = actionparser.add_parser("manifest", help=manifest_help)
     manifest_parser.add_argument("-s", "--src-dir", default="sources", help=source_dir_help)
     manifest_parser.add_argument("-t", "--top-dir", default=os.getcwd(), help=top_dir_help)
     manifest_parser.add_argument("-a", "--archive", default="archive.tar.bz2", help=archive_file_help)
+    manifest_parser.add_argument("-c", "--compression", choices=sorted(ManifestArchive.EXTENSIONS), default=None, help=compression_help)
+    manifest_parser.add_argument("--checksums", action="store_true", default=False, help=checksums_help)
+    manifest_parser.add_argument("--bundles", action="store_true", default=False, help=bundles_help)
+    manifest_parser.add_argument("--jobs", type=int, default=1, help=bundle_jobs_help)
+    manifest_parser.add_argument("--trace", default=None, help=trace_help)
+    manifest_parser.add_argument("--trace-format", choices=["json", "chrome"], default="json", help=trace_format_help)
     manifest_parser.set_defaults(func=manifest)
     # parser for 'json-refresh' action
     jsongen_parser = actionparser.add_parser("json-gen", help=json_gen_help)
     jsongen_parser.add_argument("-s", "--src-dir", default="sources", help=source_dir_help)
     jsongen_parser.add_argument("-t", "--top-dir", default=os.getcwd(), help=top_dir_help)
     jsongen_parser.add_argument("-j", "--json-out", default="LAYERS.json", help=json_out_help)
+    jsongen_parser.add_argument("--jobs", type=int, default=1, help=state_jobs_help)
+    jsongen_parser.add_argument("--no-cache", action="store_true", default=False, help=no_cache_help)
     jsongen_parser.set_defaults(func=json_gen)
     # generate LAYERS file from current state
     layersgen_parser = actionparser.add_parser("layers-gen", help=layers_gen_help)
@@ -309,16 +624,134 @@ def main():
     layersgen_parser.add_argument("-t", "--top-dir", default=os.getcwd(), help=top_dir_help)
     layersgen_parser.add_argument("-l", "--layers-file", default="LAYERS", help=layers_file_help)
     layersgen_parser.add_argument("-b", "--bblayers-file", default="conf/bblayers.conf", help=bblayers_help)
+    layersgen_parser.add_argument("--jobs", type=int, default=1, help=state_jobs_help)
+    layersgen_parser.add_argument("--no-cache", action="store_true", default=False, help=no_cache_help)
     layersgen_parser.set_defaults(func=layers_gen)
+    # pin branches in the JSON file to revisions
+    resolve_help = "Resolve the branch of every repo in the JSON file to " \
+            "the commit it points at on the remote and write a pinned JSON " \
+            "file."
+    resolve_out_help = "File to write the pinned JSON to. Defaults to " \
+            "overwriting the input file."
+    resolve_ttl_help = "Seconds to reuse cached ls-remote results from " \
+            ".build_op_cache. 0 disables the cache."
+    resolve_force_help = "Also re-resolve repos that already have a revision."
+    resolve_parser = actionparser.add_parser("resolve", help=resolve_help)
+    resolve_parser.add_argument("-t", "--top-dir", default=os.getcwd(), help=top_dir_help)
+    resolve_parser.add_argument("-s", "--src-dir", default="sources", help=source_dir_help)
+    resolve_parser.add_argument("-j", "--json-in", default="LAYERS.json", help=repos_json_help)
+    resolve_parser.add_argument("-o", "--json-out", default=None, help=resolve_out_help)
+    resolve_parser.add_argument("--ttl", type=int, default=300, help=resolve_ttl_help)
+    resolve_parser.add_argument("--jobs", type=int, default=4, help="Number of remotes queried concurrently.")
+    resolve_parser.add_argument("-f", "--force", action="store_true", default=False, help=resolve_force_help)
+    resolve_parser.add_argument("--trace", default=None, help=trace_help)
+    resolve_parser.add_argument("--trace-format", choices=["json", "chrome"], default="json", help=trace_format_help)
+    resolve_parser.set_defaults(func=resolve)
+    # check all build types in the data directory
+    check_all_help = "Check the files of every build type in the " \
+            "build_op_data directory and generate their bblayers.conf in " \
+            "memory."
+    check_all_parser = actionparser.add_parser("check-all", help=check_all_help)
+    check_all_parser.add_argument("-d", "--build-op-data", default="build_op_data", help=build_op_data_help)
+    check_all_parser.add_argument("-s", "--src-dir", default="sources", help=source_dir_help)
+    check_all_parser.set_defaults(func=check_all)
+    # garbage collect the download directory and sstate cache
+    cache_gc_help = "Evict least recently used entries from DL_DIR and " \
+            "SSTATE_DIR down to a size or age budget. The directories are " \
+            "taken from conf/local.conf unless given."
+    cache_gc_dl_dir_help = "Download directory, default DL_DIR from local.conf."
+    cache_gc_sstate_dir_help = "sstate cache, default SSTATE_DIR from local.conf."
+    cache_gc_max_size_help = "Size in GiB each directory is reduced to."
+    cache_gc_max_age_help = "Evict entries not used for this many days."
+    cache_gc_keep_build_help = "Build directory or TMPDIR whose stamps name " \
+            "sstate archives that are never evicted. May be given many " \
+            "times. Defaults to the top directory."
+    cache_gc_dry_run_help = "Only report what would be evicted, the cache " \
+            "and its index are left untouched."
+    cache_gc_verbose_help = "List every evicted entry."
+    cache_gc_parser = actionparser.add_parser("cache-gc", help=cache_gc_help)
+    cache_gc_parser.add_argument("-t", "--top-dir", default=os.getcwd(), help=top_dir_help)
+    cache_gc_parser.add_argument("--dl-dir", default=None, help=cache_gc_dl_dir_help)
+    cache_gc_parser.add_argument("--sstate-dir", default=None, help=cache_gc_sstate_dir_help)
+    cache_gc_parser.add_argument("--max-size", type=float, default=None, help=cache_gc_max_size_help)
+    cache_gc_parser.add_argument("--max-age", type=float, default=None, help=cache_gc_max_age_help)
+    cache_gc_parser.add_argument("--keep-build", action="append", default=[], help=cache_gc_keep_build_help)
+    cache_gc_parser.add_argument("-n", "--dry-run", action="store_true", default=False, help=cache_gc_dry_run_help)
+    cache_gc_parser.add_argument("-v", "--verbose", action="store_true", default=False, help=cache_gc_verbose_help)
+    cache_gc_parser.set_defaults(func=cache_gc)
+    # Compare the repos with the JSON file and update only what differs
+    plan_help = "Compare the repos in the source directory with the JSON " \
+            "file and show what apply would do, without using the network."
+    apply_help = "Bring the repos to the state in the JSON file running " \
+            "only the git operations each one needs."
+    plan_resolve_help = "Resolve branches to the commit on their remote " \
+            "first. Otherwise repos without a revision are compared with " \
+            "their branch as of the last fetch."
+    plan_jobs_help = "Number of repos processed concurrently."
+    plan_worktrees_help = "The repos are worktrees of the mirrors in the " \
+            "mirror directory, see fetch --worktrees."
+    plan_mirror_help = "Directory of bare mirrors shared between builds."
+    for name, func, action_help in (("plan", plan, plan_help),
+                                    ("apply", apply_plan, apply_help)):
+        plan_parser = actionparser.add_parser(name, help=action_help)
+        plan_parser.add_argument("-t", "--top-dir", default=os.getcwd(), help=top_dir_help)
+        plan_parser.add_argument("-s", "--src-dir", default="sources", help=source_dir_help)
+        plan_parser.add_argument("-j", "--json-in", default="LAYERS.json", help=repos_json_help)
+        plan_parser.add_argument("--jobs", type=int, default=4, help=plan_jobs_help)
+        plan_parser.add_argument("--resolve", action="store_true", default=False, help=plan_resolve_help)
+        plan_parser.add_argument("--ttl", type=int, default=300, help=resolve_ttl_help)
+        plan_parser.add_argument("-m", "--mirror-dir", default=None, help=plan_mirror_help)
+        plan_parser.add_argument("--worktrees", action="store_true", default=False, help=plan_worktrees_help)
+        plan_parser.add_argument("--trace", default=None, help=trace_help)
+        plan_parser.add_argument("--trace-format", choices=["json", "chrome"], default="json", help=trace_format_help)
+        plan_parser.set_defaults(func=func)
     # Fetch repos and set their state to match the specification in the JSON
     # file
     fetch_help = "Fetch repos and set them to the state defined in JSON file."
     fetch_update_help = "Update existing repos if necessary. Use carefully."
+    fetch_jobs_help = "Number of repos to clone / update concurrently. " \
+            "Output from git is collected and printed per repo when " \
+            "greater than 1."
+    fetch_mirror_help = "Directory of bare mirrors shared between builds. " \
+            "New clones borrow objects from the mirror of their URL."
+    fetch_depth_help = "Default depth for shallow clones. Pinned revisions " \
+            "missing from the shallow history are fetched on demand."
+    fetch_single_branch_help = "Only clone the history of the branch from " \
+            "the JSON file."
+    fetch_filter_help = "Default partial clone filter, e.g. blob:none or " \
+            "tree:0."
+    fetch_worktrees_help = "Check repos out as git worktrees of the " \
+            "mirrors in the mirror directory instead of cloning them, so " \
+            "build directories share one clone per URL. Worktrees have a " \
+            "detached HEAD at the pinned revision."
+    fetch_timeout_help = "Seconds a git command may run before it is " \
+            "killed, either for every command or as OPERATION=SECONDS for " \
+            "one git subcommand, e.g. clone=3600. May be given many times."
+    fetch_retries_help = "Number of times a network operation (clone, " \
+            "fetch, pull, remote, ls-remote) that timed out or lost its " \
+            "connection is retried."
+    fetch_backoff_help = "Seconds to wait before the first retry, doubled " \
+            "for every following one."
+    fetch_fail_fast_help = "Stop at the first repo that fails instead of " \
+            "processing every repo."
     fetch_parser = actionparser.add_parser("fetch", help=fetch_help)
     fetch_parser.add_argument("-s", "--src-dir", default="sources", help=source_dir_help)
     fetch_parser.add_argument("-t", "--top-dir", default=os.getcwd(), help=top_dir_help)
     fetch_parser.add_argument("-j", "--json-in", default="LAYERS.json", help=repos_json_help)
     fetch_parser.add_argument("-u", "--update", action="store_true", default=False, help=fetch_update_help)
+    fetch_parser.add_argument("--jobs", type=int, default=1, help=fetch_jobs_help)
+    fetch_parser.add_argument("-m", "--mirror-dir", default=None, help=fetch_mirror_help)
+    fetch_parser.add_argument("--timeout", action="append", default=[], help=fetch_timeout_help)
+    fetch_parser.add_argument("--retries", type=int, default=0, help=fetch_retries_help)
+    fetch_parser.add_argument("--backoff", type=float, default=1.0, help=fetch_backoff_help)
+    fetch_parser.add_argument("--fail-fast", action="store_true", default=False, help=fetch_fail_fast_help)
+    fetch_parser.add_argument("--worktrees", action="store_true", default=False, help=fetch_worktrees_help)
+    fetch_parser.add_argument("--depth", type=int, default=None, help=fetch_depth_help)
+    fetch_parser.add_argument("--single-branch", action="store_true", default=False, help=fetch_single_branch_help)
+    fetch_parser.add_argument("--filter", default=None, help=fetch_filter_help)
+    fetch_parser.add_argument("--bundle-dir", default=None, help=fetch_bundle_dir_help)
+    fetch_parser.add_argument("--trace", default=None, help=trace_help)
+    fetch_parser.add_argument("--trace-format", choices=["json", "chrome"], default="json", help=trace_format_help)
     fetch_parser.set_defaults(func=fetch_repos)
 
     args = parser.parse_args()
@@ -0,0 +1,96 @@
+from twobit.oebuild import CacheCollector
+from argparse import ArgumentParser
+import os
+from functions import check
+
+DAY = 24 * 3600
+NOW = 1000 * DAY
+OLD = "0" * 63 + "1"
+KEPT = "0" * 63 + "2"
+NEW = "0" * 63 + "3"
+
+def make(path, size, age):
+    """ Create a file of size bytes last used age days before NOW.
+    """
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as out_fd:
+        out_fd.write("x" * size)
+    os.utime(path, (NOW - age * DAY, NOW - age * DAY))
+
+def sstate(sstate_dir, task_hash, age):
+    name = "sstate:zlib:core2-64:1.2:r0:core2-64:3:{0}_populate_sysroot.tgz".format(task_hash)
+    path = os.path.join(sstate_dir, task_hash[:2], task_hash[2:4], name)
+    make(path, 1000, age)
+    make(path + ".siginfo", 24, age)
+    return os.path.join(task_hash[:2], task_hash[2:4], name)
+
+def main():
+    """ Test case for twobit.oebuild.CacheCollector.
+    """
+    description="Program to exercise LRU eviction from DL_DIR and SSTATE_DIR."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-c", "--caches",
+                        required=True,
+                        help="directory to create the caches in")
+    args = parser.parse_args()
+    sstate_dir = os.path.join(args.caches, "sstate-cache")
+    dl_dir = os.path.join(args.caches, "downloads")
+    build_dir = os.path.join(args.caches, "build")
+
+    old = sstate(sstate_dir, OLD, 30)
+    kept = sstate(sstate_dir, KEPT, 40)
+    new = sstate(sstate_dir, NEW, 1)
+    make(os.path.join(build_dir, "tmp", "stamps", "core2-64", "zlib",
+                      "1.2-r0.do_populate_sysroot_setscene.{0}".format(KEPT)), 0, 0)
+    keep = CacheCollector.referenced([build_dir])
+    check(keep == set([KEPT]), "referenced {0}".format(keep))
+
+    # first run lists everything, archives and siginfo are one entry
+    collector = CacheCollector(sstate_dir)
+    listed = collector.scan()
+    check(listed == 3 and collector.entries() == 3, "scan {0} {1}".format(listed, collector.entries()))
+    check(not os.path.exists(os.path.join(sstate_dir, CacheCollector.INDEX)),
+          "scan wrote to the cache")
+    check(collector.size() == 3 * 1024, "size {0}".format(collector.size()))
+    evicted = collector.collect(max_age=7 * DAY, keep=keep, dry_run=True, now=NOW)
+    check([key for key, _, _ in evicted] == [old], "dry run {0}".format(evicted))
+    check(os.path.exists(os.path.join(sstate_dir, old)), "dry run removed files")
+    collector.save()
+
+    # the next run reuses the index
+    collector = CacheCollector(sstate_dir)
+    check(collector.scan() == 0, "incremental scan")
+    # an archive restored since the index was written is not evicted
+    restored = os.path.join(sstate_dir, old)
+    os.utime(restored, (NOW, NOW))
+    evicted = collector.collect(max_size=2048, keep=keep, now=NOW)
+    check([key for key, _, _ in evicted] == [new], "size budget {0}".format(evicted))
+    check(not os.path.exists(os.path.join(sstate_dir, new + ".siginfo")), "siginfo left")
+    check(os.path.exists(os.path.join(sstate_dir, kept)), "kept archive removed")
+    check(collector.size() == 2 * 1024, "size after {0}".format(collector.size()))
+    collector.save()
+    collector = CacheCollector(sstate_dir)
+    check(collector.scan() == 1 and collector.entries() == 2, "rescan after eviction")
+
+    # mirrors in DL_DIR are entries as a whole
+    make(os.path.join(dl_dir, "zlib-1.2.tar.xz"), 500, 3)
+    make(os.path.join(dl_dir, "zlib-1.2.tar.xz.done"), 0, 3)
+    make(os.path.join(dl_dir, "git2", "github.com.madler.zlib", "objects", "pack", "p.pack"), 2000, 20)
+    make(os.path.join(dl_dir, "git2", "github.com.madler.zlib", "HEAD"), 20, 20)
+    os.utime(os.path.join(dl_dir, "git2", "github.com.madler.zlib", "objects", "pack"),
+             (NOW - 20 * DAY, NOW - 20 * DAY))
+    os.utime(os.path.join(dl_dir, "git2", "github.com.madler.zlib", "objects"),
+             (NOW - 20 * DAY, NOW - 20 * DAY))
+    os.utime(os.path.join(dl_dir, "git2", "github.com.madler.zlib"),
+             (NOW - 20 * DAY, NOW - 20 * DAY))
+    collector = CacheCollector(dl_dir, depth=1)
+    collector.scan()
+    check(collector.entries() == 2 and collector.size() == 2520, "downloads {0}".format(collector.size()))
+    evicted = collector.collect(max_age=10 * DAY, now=NOW)
+    check([key for key, _, _ in evicted] == [os.path.join("git2", "github.com.madler.zlib")],
+          "downloads evicted {0}".format(evicted))
+    check(not os.path.exists(os.path.join(dl_dir, "git2", "github.com.madler.zlib")), "mirror left")
+
+if __name__ == '__main__':
+    main()
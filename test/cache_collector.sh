@@ -0,0 +1,31 @@
+#!/bin/sh
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+CACHES=${BASE}.caches
+
+# setup
+rm -rf ${CACHES}
+mkdir -p ${CACHES}
+
+# test
+PYTHONPATH+=../ python ./cache_collector.py --caches="${CACHES}"
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# a missing --keep-build is an error, a dry run leaves the caches alone
+BUILD_OP=$(readlink -f ../build_op.py)
+mkdir -p ${CACHES}/top ${CACHES}/dl ${CACHES}/sstate
+(cd ${CACHES}/top && python ${BUILD_OP} cache-gc --dl-dir ../dl \
+    --sstate-dir ../sstate --keep-build ../no-such-build --dry-run)
+if [ $? -eq 0 ]; then
+    exit 1
+fi
+(cd ${CACHES}/top && python ${BUILD_OP} cache-gc --dl-dir ../dl \
+    --sstate-dir ../sstate --dry-run)
+if [ $? -ne 0 ] || [ -n "$(ls -A ${CACHES}/dl)$(ls -A ${CACHES}/sstate)" ]; then
+    exit 1
+fi
+
+# tear down
+rm -rf ${CACHES}
@@ -0,0 +1,84 @@
+from twobit.oebuild import CloneOptions, ManifestLoader, Repo, RepoEncoder, RepoFetcher
+from argparse import ArgumentParser
+from functions import check
+import json
+import os
+import subprocess
+
+def git(work_tree, args):
+    return subprocess.check_output(
+        ["git", "-C", work_tree] + args).decode("utf-8").strip()
+
+def main():
+    """ Test case for shallow, single branch and partial clones with
+        twobit.oebuild.CloneOptions.
+
+    A shallow clone pinned to a commit outside its history has to fetch
+    that commit on demand. Options from the manifest, even false or null,
+    win over the defaults from the command line.
+    """
+    description="Program to clone git repos with twobit.oebuild.CloneOptions."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-s", "--src-dir",
+                        default="clone_options_test",
+                        help="directory where repos are cloned")
+    parser.add_argument("-u", "--url",
+                        required=True,
+                        help="file:// URL of the repo, local paths can't be shallow")
+    parser.add_argument("-r", "--revision",
+                        required=True,
+                        help="commit on master below its tip")
+    args = parser.parse_args()
+
+    # the manifest turns off the defaults given on the command line
+    manifest = args.src_dir + ".json"
+    with open(manifest, 'w') as manifest_fd:
+        json.dump([{"name": "full", "url": args.url, "single-branch": False,
+                    "depth": None, "filter": None}], manifest_fd)
+    full = ManifestLoader(manifest).load()[0]
+    os.unlink(manifest)
+    defaults = CloneOptions(depth=1, single_branch=True, clone_filter="blob:none")
+    check(full._clone_options.merge(defaults).args("master") == [],
+          "manifest options {0}".format(full._clone_options.merge(defaults).args("master")))
+    encoded = json.loads(json.dumps(full, cls=RepoEncoder))
+    check(encoded.get("single-branch") is False and "depth" in encoded and
+          encoded["depth"] is None and "filter" in encoded and encoded["filter"] is None,
+          "encoded {0}".format(encoded))
+    check(CloneOptions.decode({"name": "plain"}) is None, "no clone options")
+
+    repos = [
+        full,
+        Repo("shallow", args.url, revision=args.revision, layers=None,
+             clone_options=CloneOptions(depth=1)),
+        Repo("single", args.url, branch="other", layers=None,
+             clone_options=CloneOptions(single_branch=True)),
+        Repo("blobless", args.url, layers=None,
+             clone_options=CloneOptions(clone_filter="blob:none")),
+    ]
+    results = RepoFetcher(args.src_dir, repos=repos, jobs=2,
+                          clone_options=CloneOptions(single_branch=True)).clone()
+    RepoFetcher.report(results)
+    check(all(result.ok() for result in results), "clone failed")
+
+    shallow = os.path.join(args.src_dir, "shallow")
+    check(git(shallow, ["rev-parse", "HEAD"]) == args.revision, "shallow clone not at revision")
+    check(git(shallow, ["rev-parse", "--is-shallow-repository"]) == "true", "clone isn't shallow")
+    check(git(shallow, ["rev-list", "--count", "HEAD"]) == "1", "history wasn't truncated")
+
+    single = os.path.join(args.src_dir, "single")
+    check(git(single, ["rev-parse", "--abbrev-ref", "HEAD"]) == "other", "wrong branch")
+    check(git(single, ["branch", "--remotes"]).split() == ["origin/other"],
+          "more than one branch fetched")
+
+    full = os.path.join(args.src_dir, "full")
+    check(git(full, ["branch", "--remotes"]).split() ==
+          ["origin/HEAD", "->", "origin/master", "origin/master", "origin/other"],
+          "manifest didn't override --single-branch")
+    check(git(full, ["rev-parse", "--is-shallow-repository"]) == "false", "full clone is shallow")
+
+    blobless = os.path.join(args.src_dir, "blobless")
+    check(git(blobless, ["config", "remote.origin.partialclonefilter"]) == "blob:none",
+          "clone isn't partial")
+
+if __name__ == '__main__':
+    main()
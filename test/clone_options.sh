@@ -0,0 +1,40 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+REPO_DIR=${BASE}.git
+REPO_TMP=${BASE}_tmp
+SRC_DIR=${BASE}_test
+
+# setup
+# master with three commits and a second branch, served like a hosting
+# site would: partial clones and fetching reachable commits by id allowed
+repo_init ${REPO_DIR} ${REPO_TMP}
+echo "test" | { repo_commit ${REPO_TMP} test_file; }
+FIRST=$(git --git-dir=${REPO_TMP}/.git rev-parse HEAD)
+echo "test2" | { repo_commit ${REPO_TMP} test_file; }
+echo "test3" | { repo_commit ${REPO_TMP} test_file; }
+git --git-dir=${REPO_TMP}/.git --work-tree=${REPO_TMP} checkout -b other
+echo "other" | { repo_commit ${REPO_TMP} test_file other; }
+git --git-dir=${REPO_DIR} config uploadpack.allowFilter true
+git --git-dir=${REPO_DIR} config uploadpack.allowReachableSHA1InWant true
+mkdir ${SRC_DIR}
+
+# test
+PYTHONPATH+=../ python ./clone_options.py --src-dir="${SRC_DIR}" \
+    --url="file://$(pwd)/${REPO_DIR}" --revision="${FIRST}"
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+if ! grep -q "^test$" ${SRC_DIR}/shallow/test_file; then
+    exit 2
+fi
+
+# tear down
+rm -rf ${REPO_DIR} ${REPO_TMP} ${SRC_DIR}
@@ -0,0 +1,53 @@
+from twobit.oebuild import ConfParser
+from argparse import ArgumentParser
+import sys
+
+def main():
+    """ Test case to exercise the twobit.oebuild.ConfParser object.
+
+    Parse a conf file and print the expanded value of each variable.
+    Variable flags are requested as 'VAR[flag]'. The other statements can be
+    printed after the variables.
+    """
+    description="Program to parse a bitbake conf file using the twobit.oebuild.ConfParser object."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-c", "--conf",
+                        default="data/bblayers.conf",
+                        help="conf file to parse")
+    parser.add_argument("-t", "--top-dir",
+                        default="/top",
+                        help="value of TOPDIR")
+    parser.add_argument("-l", "--layer-dir",
+                        default=None,
+                        help="value of LAYERDIR")
+    parser.add_argument("-d", "--directives",
+                        action="store_true",
+                        default=False,
+                        help="print the statements that aren't assignments")
+    parser.add_argument("variables",
+                        nargs="+",
+                        help="variables to print")
+    args = parser.parse_args()
+
+    variables = {"TOPDIR": args.top_dir}
+    if args.layer_dir is not None:
+        variables["LAYERDIR"] = args.layer_dir
+    conf = ConfParser(variables)
+    try:
+        conf.parse_file(args.conf)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    for var in args.variables:
+        if var.endswith("]"):
+            name, flag = var[:-1].split("[")
+            value = conf.getvarflag(name, flag)
+        else:
+            value = conf.getvar(var)
+        print("{0}={1}".format(var, value))
+    if args.directives:
+        for keyword, arg, lineno in conf.directives():
+            print("{0} {1} {2}".format(keyword, arg, lineno))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+#!/bin/sh
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+TEST_PY=${BASE}.py
+CONF_IN=data/bblayers.conf
+EXPECTED=data/bblayers.expected
+OUT=${BASE}.out
+
+# parse conf file and print the value of each variable
+PYTHONPATH+=../ python ./${TEST_PY} --conf=${CONF_IN} --top-dir=/top \
+    LCONF_VERSION BBPATH BBFILES BBLAYERS LAYERS_DIR "LAYERS_DIR[doc]" \
+    DISTRO_FEATURES UNSET > ${OUT}
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+if ! diff ${EXPECTED} ${OUT}; then
+    exit 2
+fi
+
+# a layer.conf with statements other than assignments and immediate
+# expansion
+PYTHONPATH+=../ python ./${TEST_PY} --conf=data/layer.conf --layer-dir=/layer \
+    --directives BBFILE_COLLECTIONS LAYERSERIES_COMPAT_core CORE_SERIES LAST \
+    SELF_REF FOO BAZ > ${OUT}
+if [ $? -ne 0 ]; then
+    exit 3
+fi
+if ! diff data/layer.expected ${OUT}; then
+    exit 4
+fi
+
+# tear down
+rm -rf ${OUT}
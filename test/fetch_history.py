@@ -0,0 +1,51 @@
+from twobit.oebuild import FetchHistory, WorkPool
+from argparse import ArgumentParser
+import threading
+from functions import check
+
+def main():
+    """ Test case for twobit.oebuild.FetchHistory and ordered WorkPool.map.
+    """
+    description="Program to exercise longest first scheduling from recorded durations."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-f", "--history-file",
+                        required=True,
+                        help="JSON file holding the history")
+    args = parser.parse_args()
+
+    history = FetchHistory(args.history_file)
+    history.record("small", "cloned", 1.0)
+    history.record("big", "cloned", 10.0)
+    history.record("big", "updated", 1.0)
+    history.save()
+
+    # a second process records concurrently, both survive the merge
+    other = FetchHistory(args.history_file)
+    other.record("medium", "cloned", 5.0)
+    other.save()
+    history.record("big", "cloned", 20.0)
+    history.save()
+
+    history = FetchHistory(args.history_file)
+    check(history.estimate("big", "cloned") == 15.0, "moving average")
+    check(history.estimate("medium", "cloned") == 5.0, "concurrent record lost")
+    work = [("small", "cloned"), ("big", "updated"), ("medium", "cloned"),
+            ("new", "cloned"), ("big", "cloned")]
+    order = history.order(work)
+    check(order == [3, 4, 2, 0, 1], "order {0}".format(order))
+
+    # items are started in the given order, results stay in item order
+    for jobs in (1, 2):
+        started = []
+        lock = threading.Lock()
+        def func(item):
+            with lock:
+                started.append(item)
+            return item * 2
+        results = WorkPool(jobs).map(func, [0, 1, 2, 3, 4], order=order)
+        check(results == [0, 2, 4, 6, 8], "results {0}".format(results))
+        if jobs == 1:
+            check(started == order, "started {0}".format(started))
+
+if __name__ == '__main__':
+    main()
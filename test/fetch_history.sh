@@ -0,0 +1,13 @@
+#!/bin/sh
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+HISTORY_FILE=${BASE}.json
+
+# test
+PYTHONPATH+=../ python ./fetch_history.py --history-file="${HISTORY_FILE}"
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# tear down
+rm -f ${HISTORY_FILE} ${HISTORY_FILE}.lock
@@ -0,0 +1,9 @@
+# helpers shared by the python test drivers
+import sys
+
+def check(condition, message):
+    """ Exit with a failure message unless condition holds.
+    """
+    if not condition:
+        print("FAIL: {0}".format(message))
+        sys.exit(1)
@@ -12,7 +12,7 @@ repo_init () {
 repo_commit () {
     local REPO_TMP=$1
     local FILE=$2
-    local BRANCH=${3:master}
+    local BRANCH=${3:-master}
 
     while read LINE; do
         echo ${LINE}
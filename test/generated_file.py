@@ -0,0 +1,39 @@
+from twobit.oebuild import GeneratedFile
+from argparse import ArgumentParser
+import os
+import stat
+from functions import check
+
+def main():
+    """ Test case for twobit.oebuild.GeneratedFile.
+    """
+    description="Program to exercise writing generated files only when they change."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-o", "--out-dir",
+                        required=True,
+                        help="directory to write the files to")
+    args = parser.parse_args()
+    path = os.path.join(args.out_dir, "local.conf")
+    content = 'BB_NUMBER_THREADS = "8"\n'
+
+    # new file
+    check(GeneratedFile(path).write(content), "new file not written")
+    with open(path, 'r') as conf_fd:
+        check(conf_fd.read() == content, "content")
+    check(GeneratedFile(path).current() == GeneratedFile.digest(content), "digest")
+    # same content keeps the file and its mtime
+    os.utime(path, (1000, 1000))
+    check(not GeneratedFile(path).write(content), "unchanged file written")
+    check(os.stat(path).st_mtime == 1000, "mtime changed")
+    # new content replaces the file, no temporary file is left behind
+    check(GeneratedFile(path).write(content + 'PARALLEL_MAKE = "-j 8"\n'), "changed file")
+    check(os.stat(path).st_mtime != 1000, "mtime kept")
+    check(os.listdir(args.out_dir) == ["local.conf"], "files {0}".format(os.listdir(args.out_dir)))
+    # the mode is applied even if the content didn't change
+    script = os.path.join(args.out_dir, "build.sh")
+    GeneratedFile(script).write("#!/bin/sh\n")
+    check(not GeneratedFile(script, mode=0o755).write("#!/bin/sh\n"), "script written")
+    check(stat.S_IMODE(os.stat(script).st_mode) == 0o755, "mode")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+#!/bin/sh
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+OUT_DIR=${BASE}.out
+
+# setup
+rm -rf ${OUT_DIR}
+mkdir -p ${OUT_DIR}
+
+# test
+PYTHONPATH+=../ python ./generated_file.py --out-dir="${OUT_DIR}"
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# tear down
+rm -rf ${OUT_DIR}
@@ -0,0 +1,64 @@
+from twobit.oebuild import GitState
+from argparse import ArgumentParser
+import subprocess
+import sys
+import time
+
+def git_state(git_dir):
+    """ Collect repo state the way build_op.py used to: four git processes.
+    """
+    rev = subprocess.check_output(
+        ["git", "--git-dir", git_dir, "rev-parse", "HEAD"]
+    ).decode("utf-8").rstrip()
+    branch = subprocess.check_output(
+        ["git", "--git-dir", git_dir, "rev-parse", "--abbrev-ref", "HEAD"]
+    ).decode("utf-8").rstrip()
+    remote = subprocess.check_output(
+        ["git", "--git-dir", git_dir, "rev-parse", "--abbrev-ref", "--symbolic-full-name", "@{u}"]
+    ).decode("utf-8").split("/")[0].rstrip()
+    url = subprocess.check_output(
+        ["git", "--git-dir", git_dir, "config", "--get", "remote." + remote + ".url"]
+    ).decode("utf-8").rstrip()
+    return url, branch, rev
+
+def main():
+    """ Test case and benchmark for twobit.oebuild.GitState.
+
+    Compares the state collected by GitState against the state reported by
+    git itself and prints the time and number of git processes spent per
+    repo by each.
+    """
+    description="Program to compare twobit.oebuild.GitState against git."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-j", "--jobs",
+                        type=int,
+                        default=4,
+                        help="number of repos processed concurrently")
+    parser.add_argument("git_dirs",
+                        nargs="+",
+                        help=".git directories of the repos to inspect")
+    args = parser.parse_args()
+
+    start = time.time()
+    expected = [git_state(git_dir) for git_dir in args.git_dirs]
+    git_time = time.time() - start
+
+    collector = GitState()
+    start = time.time()
+    states = collector.collect(args.git_dirs, jobs=args.jobs)
+    state_time = time.time() - start
+
+    count = len(args.git_dirs)
+    print("git:      {0:.4f}s, 4.00 spawns per repo".format(git_time))
+    print("GitState: {0:.4f}s, {1:.2f} spawns per repo".format(
+        state_time, float(collector.spawns()) / count))
+    failed = False
+    for git_dir, want, got in zip(args.git_dirs, expected, states):
+        if tuple(want) != tuple(got):
+            print("mismatch for {0}: {1} != {2}".format(git_dir, want, got))
+            failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
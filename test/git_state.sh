@@ -0,0 +1,38 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+REPO_DIR=${BASE}.git
+REPO_TMP=${BASE}_tmp
+CLONES=${BASE}_test
+
+# setup
+# create a repo with two branches and a number of clones of it
+repo_init ${REPO_DIR} ${REPO_TMP}
+echo "test" | { repo_commit ${REPO_TMP} test_file; }
+git --git-dir=${REPO_TMP}/.git --work-tree=${REPO_TMP} checkout -b other
+echo "test2" | { repo_commit ${REPO_TMP} test_file other; }
+mkdir ${CLONES}
+GIT_DIRS=""
+for i in 0 1 2 3 4 5 6 7; do
+    git clone ${REPO_DIR} ${CLONES}/clone${i}
+    GIT_DIRS="${GIT_DIRS} ${CLONES}/clone${i}/.git"
+done
+# exercise packed refs and a branch other than master
+git --git-dir=${CLONES}/clone1/.git pack-refs --all
+git --git-dir=${CLONES}/clone2/.git --work-tree=${CLONES}/clone2 checkout other
+
+# test
+PYTHONPATH+=../ python ./git_state.py ${GIT_DIRS}
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# tear down
+rm -rf ${REPO_DIR} ${REPO_TMP} ${CLONES}
@@ -0,0 +1,62 @@
+from twobit.oebuild import ConfParser, HostParallelism
+from argparse import ArgumentParser
+from functions import check
+
+def main():
+    """ Test case for twobit.oebuild.HostParallelism.
+    """
+    description="Program to exercise the parallelism settings derived from the host."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-p", "--profiles",
+                        required=True,
+                        help="JSON file with parallelism profiles")
+    args = parser.parse_args()
+
+    # CPU bound host
+    settings = dict(HostParallelism(cpus=8, memory=64).settings())
+    check(settings == {"BB_NUMBER_THREADS": "8", "PARALLEL_MAKE": "-j 8",
+                       "BB_NUMBER_PARSE_THREADS": "8"}, "cpu bound {0}".format(settings))
+    # memory bound host with the profile of a heavy build type
+    name, profile = HostParallelism.load_profile(args.profiles, "heavy")
+    check(name == "heavy" and profile["mem_per_make_job"] == 4.0 and
+          profile["mem_per_task"] == 2.0, "profile {0}".format(profile))
+    parallelism = HostParallelism(cpus=64, memory=32, profile=profile, profile_name=name)
+    settings = dict(parallelism.settings())
+    check(settings == {"BB_NUMBER_THREADS": "16", "PARALLEL_MAKE": "-j 1",
+                       "BB_NUMBER_PARSE_THREADS": "48"}, "memory bound {0}".format(settings))
+    # make jobs get the memory the tasks leave, large hosts are used fully
+    settings = dict(HostParallelism(cpus=64, memory=128).settings())
+    check(settings["BB_NUMBER_THREADS"] == "64" and settings["PARALLEL_MAKE"] == "-j 64",
+          "large host {0}".format(settings))
+    settings = dict(HostParallelism(cpus=8, memory=16).settings())
+    check(settings["BB_NUMBER_THREADS"] == "8" and settings["PARALLEL_MAKE"] == "-j 8",
+          "small host {0}".format(settings))
+    # 48 tasks (max_threads) reserve 96 GiB, the other 160 GiB fit 40 make
+    # jobs of 4 GiB
+    settings = dict(HostParallelism(cpus=64, memory=256, profile=profile).settings())
+    check(settings["BB_NUMBER_THREADS"] == "48" and settings["PARALLEL_MAKE"] == "-j 40",
+          "large host, heavy profile {0}".format(settings))
+    # build types without a profile use the default one
+    name, profile = HostParallelism.load_profile(args.profiles, "light")
+    check(name == "default" and profile["max_threads"] == 48, "default profile")
+    # never less than one
+    settings = dict(HostParallelism(cpus=4, memory=0.5).settings())
+    check(settings["BB_NUMBER_THREADS"] == "1", "minimum {0}".format(settings))
+
+    # the generated fragment overrides the template values
+    conf = ConfParser()
+    conf.parse('BB_NUMBER_THREADS ?= "24"\nPARALLEL_MAKE ?= "-j 24"\n' + parallelism.conf(),
+               filename="local.conf")
+    check(conf.getvar("BB_NUMBER_THREADS") == "16", "local.conf value")
+    check(conf.getvar("PARALLEL_MAKE") == "-j 1", "local.conf value")
+    for profile in ({"mem_per_jobs": 1}, {"mem_per_task": "2"}, {"mem_per_parser": -1},
+                    {"max_threads": 2.5}, {"max_threads": 0}, {"max_threads": True}):
+        try:
+            HostParallelism(cpus=1, memory=1, profile=profile)
+        except ValueError:
+            pass
+        else:
+            check(False, "invalid profile accepted: {0}".format(profile))
+
+if __name__ == '__main__':
+    main()
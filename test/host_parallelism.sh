@@ -0,0 +1,21 @@
+#!/bin/sh
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+PROFILES=${BASE}.json
+
+# setup
+cat > ${PROFILES} << EOF_PROFILES
+{
+    "default": {"mem_per_task": 1.0, "max_threads": 48},
+    "heavy": {"mem_per_task": 2.0, "mem_per_make_job": 4.0}
+}
+EOF_PROFILES
+
+# test
+PYTHONPATH+=../ python ./host_parallelism.py --profiles="${PROFILES}"
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# tear down
+rm -f ${PROFILES}
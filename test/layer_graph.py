@@ -0,0 +1,72 @@
+from twobit.oebuild import BBLayerSerializer, ConfParser, LayerGraph, Repo
+from argparse import ArgumentParser
+import os
+from functions import check
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+LAYERS = ["sources/meta-measured", "sources/openembedded-core/meta",
+          "sources/meta-tpm", "sources/meta-old", "sources/meta-extra",
+          "sources/meta-unused", "sources/meta-unfetched"]
+
+def main():
+    """ Test case for twobit.oebuild.LayerGraph.
+    """
+    description="Program to exercise ordering and pruning layers by their dependencies."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-t", "--top-dir",
+                        required=True,
+                        help="TOPDIR holding the layers")
+    args = parser.parse_args()
+
+    graph = LayerGraph(args.top_dir, LAYERS)
+    check(graph.collections("sources/openembedded-core/meta") == ["core"], "collections")
+    check(graph.priority("sources/meta-extra") == {"extra": 7}, "priority")
+    check(graph.dependencies("sources/meta-measured") ==
+          ["sources/openembedded-core/meta", "sources/meta-tpm"], "version constraints")
+    check(graph.missing("sources/meta-unused") == ["missing"], "missing")
+    check(not graph.compatible("sources/meta-old"), "incompatible layer")
+    check(graph.compatible("sources/meta-unfetched"), "unknown layer")
+
+    # dependencies first, the given order otherwise
+    order = graph.order()
+    check(order == ["sources/openembedded-core/meta", "sources/meta-tpm",
+                    "sources/meta-measured", "sources/meta-old", "sources/meta-extra",
+                    "sources/meta-unused", "sources/meta-unfetched"], "order {0}".format(order))
+    # without pruning every layer is kept and the problems reported
+    check(graph.layers() == order, "layers without pruning")
+    warnings = "\n".join(graph.warnings())
+    check("meta-old is not compatible" in warnings and "which no layer provides" in warnings,
+          "warnings {0}".format(warnings))
+    # a layer.conf bitbake would reject keeps what was parsed before the error
+    check("unparsed line" in warnings and "provides core" not in warnings,
+          "warnings {0}".format(warnings))
+    # incompatible and unneeded layers are dropped, layers not fetched yet kept
+    graph = LayerGraph(args.top_dir, LAYERS)
+    kept = graph.layers(roots=["measured"], prune=True)
+    check(kept == ["sources/openembedded-core/meta", "sources/meta-tpm",
+                   "sources/meta-measured", "sources/meta-unfetched"], "pruned {0}".format(kept))
+    graph = LayerGraph(args.top_dir, LAYERS)
+    kept = graph.layers(prune=True)
+    check("sources/meta-extra" not in kept and "sources/meta-unused" in kept,
+          "depends on a dropped layer {0}".format(kept))
+
+    # the serializer writes the sorted layers
+    repos = [Repo("meta-measured", "url"),
+             Repo("openembedded-core", "url", layers=["meta"]),
+             Repo("meta-tpm", "url")]
+    serializer = BBLayerSerializer("sources", repos=repos, top_dir=os.path.abspath(args.top_dir))
+    bblayers_fd = StringIO()
+    serializer.write(fd=bblayers_fd)
+    conf = ConfParser({"TOPDIR": "/TOPDIR"})
+    conf.parse(bblayers_fd.getvalue(), filename="bblayers.conf")
+    found = conf.getvar("BBLAYERS").split()
+    check(found == ["/TOPDIR/sources/openembedded-core/meta", "/TOPDIR/sources/meta-tpm",
+                    "/TOPDIR/sources/meta-measured"], "bblayers {0}".format(found))
+    check(serializer.warnings() == [], "serializer warnings {0}".format(serializer.warnings()))
+
+if __name__ == '__main__':
+    main()
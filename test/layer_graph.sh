@@ -0,0 +1,63 @@
+#!/bin/sh
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+TOP_DIR=${BASE}.top
+SRC_DIR=${TOP_DIR}/sources
+
+# write conf/layer.conf of layer $1
+layer_conf () {
+    mkdir -p ${SRC_DIR}/$1/conf
+    cat > ${SRC_DIR}/$1/conf/layer.conf
+}
+
+# setup
+rm -rf ${TOP_DIR}
+layer_conf openembedded-core/meta << EOF_LAYER
+BBPATH .= ":\${LAYERDIR}"
+BBFILE_COLLECTIONS += "core"
+BBFILE_PATTERN_core = "^\${LAYERDIR}/"
+BBFILE_PRIORITY_core = "5"
+LAYERSERIES_CORENAMES = "thud"
+LAYERSERIES_COMPAT_core = "thud"
+addpylib \${LAYERDIR}/lib oe
+EOF_LAYER
+layer_conf meta-measured << EOF_LAYER
+BBFILE_COLLECTIONS += "measured"
+BBFILE_PRIORITY_measured = "6"
+LAYERDEPENDS_measured = "core (>= 11) tpm"
+LAYERSERIES_COMPAT_measured = "thud"
+EOF_LAYER
+layer_conf meta-tpm << EOF_LAYER
+BBFILE_COLLECTIONS += "tpm"
+BBFILE_PRIORITY_tpm = "6"
+LAYERDEPENDS_tpm = "core"
+LAYERSERIES_COMPAT_tpm = "thud warrior"
+EOF_LAYER
+layer_conf meta-old << EOF_LAYER
+BBFILE_COLLECTIONS += "old"
+BBFILE_PRIORITY_old = "6"
+LAYERDEPENDS_old = "core"
+LAYERSERIES_COMPAT_old = "rocko"
+EOF_LAYER
+layer_conf meta-extra << EOF_LAYER
+BBFILE_COLLECTIONS += "extra"
+BBFILE_PRIORITY_extra = "7"
+LAYERDEPENDS_extra = "old"
+LAYERSERIES_COMPAT_extra = "thud"
+EOF_LAYER
+layer_conf meta-unused << EOF_LAYER
+BBFILE_COLLECTIONS += "unused"
+BBFILE_PRIORITY_unused = "6"
+LAYERDEPENDS_unused = "core missing"
+LAYERSERIES_COMPAT_unused = "thud"
+this is not bitbake
+EOF_LAYER
+
+# test
+PYTHONPATH+=../ python ./layer_graph.py --top-dir="${TOP_DIR}"
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# tear down
+rm -rf ${TOP_DIR}
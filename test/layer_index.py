@@ -0,0 +1,53 @@
+from twobit.oebuild import LayerIndex, Repo
+from argparse import ArgumentParser
+import os
+from functions import check
+
+def bblayers(top_dir, layers):
+    """ Write a bblayers.conf enabling layers, relative to TOPDIR.
+    """
+    path = os.path.join(top_dir, "conf", "bblayers.conf")
+    with open(path, 'w') as bblayers_fd:
+        bblayers_fd.write('BBLAYERS ?= " \\\n')
+        for layer in layers:
+            bblayers_fd.write("    ${{TOPDIR}}/{0} \\\n".format(layer))
+        bblayers_fd.write('"\n')
+    return path
+
+def main():
+    """ Test case for twobit.oebuild.LayerIndex and the layers found by
+        Repo.repos_from_state.
+    """
+    description="Program to exercise finding the active layers of repos."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-t", "--top-dir",
+                        required=True,
+                        help="TOPDIR with the repos in its sources directory")
+    args = parser.parse_args()
+    top_dir = os.path.abspath(args.top_dir)
+    src_dir = os.path.join(top_dir, "sources")
+    repo_root = os.path.join(src_dir, "meta-openembedded")
+
+    # the contents of layers aren't searched
+    layers = LayerIndex().layers(repo_root)
+    check(layers == ["meta-oe", "meta-oe-extra", "meta-oe/nested"], "layers {0}".format(layers))
+    check(LayerIndex(max_depth=1).layers(repo_root) == ["meta-oe", "meta-oe-extra"], "max depth")
+
+    # meta-oe must not match because meta-oe-extra is active
+    path = bblayers(top_dir, ["sources/meta-openembedded/meta-oe-extra"])
+    repos = Repo.repos_from_state(path, top_dir=top_dir, src_dir=src_dir)
+    check(len(repos) == 1 and tuple(repos[0]._layers) == ("meta-oe-extra",),
+          "prefix match {0}".format(repos[0]._layers))
+    # and the other way round, in BBLAYERS order
+    path = bblayers(top_dir, ["sources/meta-openembedded/meta-oe/nested",
+                              "sources/meta-openembedded/meta-oe"])
+    repos = Repo.repos_from_state(path, top_dir=top_dir, src_dir=src_dir)
+    check(tuple(repos[0]._layers) == ("meta-oe/nested", "meta-oe"),
+          "BBLAYERS order {0}".format(repos[0]._layers))
+    # no active layer
+    path = bblayers(top_dir, [])
+    repos = Repo.repos_from_state(path, top_dir=top_dir, src_dir=src_dir)
+    check(repos[0]._layers is None, "no layers {0}".format(repos[0]._layers))
+
+if __name__ == '__main__':
+    main()
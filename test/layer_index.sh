@@ -0,0 +1,35 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+REPO_DIR=${BASE}.git
+REPO_TMP=${BASE}_tmp
+TOP_DIR=${BASE}_top
+
+# setup
+# a repo with layers whose names are prefixes of each other
+repo_init ${REPO_DIR} ${REPO_TMP}
+for LAYER in meta-oe meta-oe-extra meta-oe/nested; do
+    mkdir -p ${REPO_TMP}/${LAYER}/conf
+    echo "BBFILE_COLLECTIONS += \"$(basename ${LAYER})\"" | \
+        { repo_commit ${REPO_TMP} ${LAYER}/conf/layer.conf; }
+done
+mkdir -p ${REPO_TMP}/meta-oe/recipes-core/conf
+echo "not a layer" | { repo_commit ${REPO_TMP} meta-oe/recipes-core/conf/layer.conf; }
+mkdir -p ${TOP_DIR}/sources ${TOP_DIR}/conf
+git clone ${REPO_DIR} ${TOP_DIR}/sources/meta-openembedded
+
+# test
+PYTHONPATH+=../ python ./layer_index.py --top-dir=${TOP_DIR}
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# tear down
+rm -rf ${REPO_DIR} ${REPO_TMP} ${TOP_DIR}
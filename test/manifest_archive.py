@@ -0,0 +1,34 @@
+from twobit.oebuild import ManifestArchive
+from argparse import ArgumentParser
+import os
+import sys
+
+def main():
+    """ Test case to exercise the twobit.oebuild.ManifestArchive object.
+    """
+    description="Program to archive files using the twobit.oebuild.ManifestArchive object."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-a", "--archive",
+                        default="manifest_archive_test",
+                        help="prefix of the archive")
+    parser.add_argument("-c", "--compression",
+                        default="bz2",
+                        help="compression of the archive")
+    parser.add_argument("files",
+                        nargs="+",
+                        help="files to archive")
+    args = parser.parse_args()
+
+    try:
+        archive = ManifestArchive(args.archive, compression=args.compression,
+                                  checksums=True)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    for path in args.files:
+        archive.add_file(path, os.path.join("files", os.path.basename(path)))
+    archive.write(archive.file_name())
+    print(archive.file_name())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+#!/bin/sh
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+TEST_PY=${BASE}.py
+PREFIX=${BASE}_test
+FILES="data/simple.json data/bblayers.conf"
+
+for COMPRESSION in bz2 gz none; do
+    # archives of the same files must be identical
+    ARCHIVE=$(PYTHONPATH+=../ python ./${TEST_PY} --archive=${PREFIX} \
+        --compression=${COMPRESSION} ${FILES})
+    if [ $? -ne 0 ]; then
+        exit 1
+    fi
+    mv ${ARCHIVE} ${ARCHIVE}.first
+    touch ${FILES}
+    PYTHONPATH+=../ python ./${TEST_PY} --archive=${PREFIX} \
+        --compression=${COMPRESSION} ${FILES} > /dev/null
+    if ! cmp ${ARCHIVE}.first ${ARCHIVE}; then
+        exit 2
+    fi
+    # and hold the right content
+    mkdir ${PREFIX}_out
+    tar -xf ${ARCHIVE} -C ${PREFIX}_out
+    if ! (cd ${PREFIX}_out/${PREFIX} && sha256sum --quiet -c SHA256SUMS); then
+        exit 3
+    fi
+    rm -rf ${ARCHIVE} ${ARCHIVE}.first ${PREFIX}_out
+done
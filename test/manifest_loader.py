@@ -0,0 +1,30 @@
+from twobit.oebuild import ManifestError, ManifestLoader
+from argparse import ArgumentParser
+import sys
+
+def main():
+    """ Test case to exercise the twobit.oebuild.ManifestLoader object.
+
+    Load each manifest, printing the error for those that fail to load.
+    Exits with the number of manifests that failed.
+    """
+    description="Program to load LAYERS.json files using the twobit.oebuild.ManifestLoader object."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("manifests",
+                        nargs="+",
+                        help="manifest files to load")
+    args = parser.parse_args()
+
+    failed = 0
+    for path in args.manifests:
+        try:
+            repos = ManifestLoader(path).load()
+        except ManifestError as e:
+            print(e)
+            failed += 1
+            continue
+        print("{0}: {1} repos".format(path, len(repos)))
+    sys.exit(failed)
+
+if __name__ == '__main__':
+    main()
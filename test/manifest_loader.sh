@@ -0,0 +1,38 @@
+#!/bin/sh
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+TEST_PY=${BASE}.py
+OUT=${BASE}.out
+
+# every manifest we ship must load
+PYTHONPATH+=../ python ./${TEST_PY} data/simple.json ../build_op_data/LAYERS_*.json
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# broken manifests must be rejected with the location of the problem
+expect_error () {
+    local MESSAGE="$1"
+    echo "$2" > ${BASE}_bad.json
+    PYTHONPATH+=../ python ./${TEST_PY} ${BASE}_bad.json > ${OUT}
+    if [ $? -ne 1 ]; then
+        exit 2
+    fi
+    if ! grep -qF "${MESSAGE}" ${OUT}; then
+        cat ${OUT}
+        exit 3
+    fi
+}
+expect_error "repo 0 (a): key 'url': missing" '[{"name": "a"}]'
+expect_error "repo 1 (a): key 'name': duplicate name" \
+    '[{"name": "a", "url": "u"}, {"name": "a", "url": "v"}]'
+expect_error "repo 1 (./a): key 'name': duplicate checkout path" \
+    '[{"name": "a", "url": "u"}, {"name": "./a", "url": "v"}]'
+expect_error "key 'revison': unknown key" \
+    '[{"name": "a", "url": "u", "revison": "x"}]'
+expect_error "key 'layers': must be a list of strings or null" \
+    '[{"name": "a", "url": "u", "layers": "meta"}]'
+expect_error "line 1 column" '[{"name": "a" "url": "u"}]'
+
+# tear down
+rm -f ${OUT} ${BASE}_bad.json
@@ -0,0 +1,57 @@
+from twobit.oebuild import MirrorCache, Repo, RepoFetcher
+from argparse import ArgumentParser
+from functions import check
+import os
+
+def main():
+    """ Test case for cloning through twobit.oebuild.MirrorCache.
+
+    Repos sharing a URL are cloned from one mirror, and every clone borrows
+    its objects from the mirror through alternates.
+    """
+    description="Program to clone git repos through a mirror cache with twobit.oebuild.RepoFetcher."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-s", "--src-dir",
+                        default="mirror_cache_test",
+                        help="directory where repos are cloned")
+    parser.add_argument("-m", "--mirror-dir",
+                        default="mirror_cache_mirrors",
+                        help="directory holding the mirrors")
+    parser.add_argument("-e", "--existing",
+                        action="store_true",
+                        default=False,
+                        help="the mirrors exist already and are only updated")
+    parser.add_argument("urls",
+                        nargs="+",
+                        help="URLs of repos to clone, may repeat")
+    args = parser.parse_args()
+
+    repos = [Repo("repo{0}".format(i), url, layers=None)
+             for i, url in enumerate(args.urls)]
+    mirror = MirrorCache(args.mirror_dir)
+    results = RepoFetcher(args.src_dir, repos=repos, jobs=2, mirror=mirror).clone()
+    RepoFetcher.report(results)
+    check(all(result.ok() for result in results), "clone failed")
+
+    # each URL is mirrored or updated once, whichever repo gets to it first
+    urls = set(args.urls)
+    output = "".join(result._output or "" for result in results)
+    mirrored = output.count("mirroring ")
+    updated = output.count("updating mirror ")
+    if args.existing:
+        check(mirrored == 0 and updated == len(urls),
+              "{0} mirrors cloned, {1} updated".format(mirrored, updated))
+    else:
+        check(mirrored == len(urls) and updated == 0,
+              "{0} mirrors cloned, {1} updated".format(mirrored, updated))
+    for repo in repos:
+        alternates = os.path.join(args.src_dir, repo._name, ".git", "objects", "info",
+                                  "alternates")
+        check(os.path.exists(alternates), "{0} has no alternates".format(repo._name))
+        with open(alternates, 'r') as alternates_fd:
+            found = alternates_fd.read().strip()
+        check(os.path.normpath(found) == os.path.join(mirror.path(repo._url), "objects"),
+              "{0} borrows from {1}".format(repo._name, found))
+
+if __name__ == '__main__':
+    main()
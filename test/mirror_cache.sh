@@ -0,0 +1,45 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+MIRROR_DIR=${BASE}_mirrors
+
+# setup
+# two repos, the first one used twice like openembedded-core and
+# openembedded-core_old in a manifest
+for i in 0 1; do
+    repo_init ${BASE}${i}.git ${BASE}${i}_tmp
+    echo "test${i}" | { repo_commit ${BASE}${i}_tmp test_file; }
+done
+URLS="${BASE}0.git ${BASE}0.git ${BASE}1.git"
+mkdir ${BASE}_a ${BASE}_b
+
+# test
+PYTHONPATH+=../ python ./mirror_cache.py --src-dir="${BASE}_a" \
+    --mirror-dir="${MIRROR_DIR}" ${URLS}
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+if [ $(ls -d ${MIRROR_DIR}/*.git | wc -l) -ne 2 ]; then
+    exit 2
+fi
+# a second build directory reuses the mirrors, picking up new commits
+echo "test0 update" | { repo_commit ${BASE}0_tmp test_file; }
+PYTHONPATH+=../ python ./mirror_cache.py --src-dir="${BASE}_b" \
+    --mirror-dir="${MIRROR_DIR}" --existing ${URLS}
+if [ $? -ne 0 ]; then
+    exit 3
+fi
+if ! grep -q "^test0 update$" ${BASE}_b/repo1/test_file || \
+   ! grep -q "^test1$" ${BASE}_b/repo2/test_file; then
+    exit 4
+fi
+
+# tear down
+rm -rf ${BASE}0.git ${BASE}1.git ${BASE}0_tmp ${BASE}1_tmp ${BASE}_a ${BASE}_b ${MIRROR_DIR}
@@ -0,0 +1,58 @@
+from twobit.oebuild import ProcessLoop
+from argparse import ArgumentParser
+import tempfile
+import threading
+import time
+from functions import check
+
+def main():
+    """ Test case for twobit.oebuild.ProcessLoop.
+
+    Runs many processes at once through a single loop and checks output
+    capture, per job output files, timeouts and cancellation.
+    """
+    description="Program to exercise the twobit.oebuild.ProcessLoop object."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-n", "--count",
+                        type=int,
+                        default=32,
+                        help="number of processes run concurrently")
+    args = parser.parse_args()
+
+    loop = ProcessLoop()
+    # stdout is captured, stderr goes to the file of each job
+    outs = [tempfile.TemporaryFile(mode="w+") for _ in range(args.count)]
+    start = time.time()
+    jobs = [loop.submit(["sh", "-c", "sleep 0.5; echo out{0}; echo err{0} >&2".format(i)],
+                        out=outs[i], capture=True, name="job{0}".format(i))
+            for i in range(args.count)]
+    for i, job in enumerate(jobs):
+        rc, stdout = job.wait()
+        check(rc == 0, "job{0} exit code {1}".format(i, rc))
+        check(stdout == "out{0}\n".format(i), "job{0} stdout {1!r}".format(i, stdout))
+        outs[i].seek(0)
+        check(outs[i].read() == "err{0}\n".format(i), "job{0} stderr".format(i))
+    # the processes ran concurrently
+    check(time.time() - start < 0.5 * args.count / 2, "jobs didn't run concurrently")
+    check(loop.call(["sh", "-c", "exit 3"]) == 3, "exit code not returned")
+
+    # timeouts kill the whole process group
+    job = loop.submit(["sh", "-c", "sleep 30 & sleep 30; wait"], timeout=0.2)
+    start = time.time()
+    job.wait()
+    check(job.timed_out(), "job didn't time out")
+    check(time.time() - start < 5, "timed out job wasn't killed")
+
+    # cancel kills running jobs and fails new ones
+    job = loop.submit(["sleep", "30"])
+    threading.Timer(0.2, loop.cancel).start()
+    start = time.time()
+    rc = job.wait()[0]
+    check(job.cancelled() and rc != 0, "job wasn't cancelled")
+    check(time.time() - start < 5, "cancelled job wasn't killed")
+    job = loop.submit(["true"])
+    check(job.wait()[0] != 0 and job.cancelled(), "job started after cancel")
+    loop.close()
+
+if __name__ == '__main__':
+    main()
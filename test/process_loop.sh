@@ -0,0 +1,7 @@
+#!/bin/sh
+
+# test
+PYTHONPATH+=../ python ./process_loop.py --count=32
+if [ $? -ne 0 ]; then
+    exit 1
+fi
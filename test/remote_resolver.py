@@ -0,0 +1,69 @@
+from twobit.oebuild import RemoteResolver, Repo
+from argparse import ArgumentParser
+import os
+import subprocess
+from functions import check
+
+class CountingResolver(RemoteResolver):
+    """ RemoteResolver counting the URLs it runs ls-remote on.
+    """
+    def __init__(self, *args, **kwargs):
+        RemoteResolver.__init__(self, *args, **kwargs)
+        self.queried = []
+    def ls_remote(self, url):
+        self.queried.append(url)
+        return RemoteResolver.ls_remote(self, url)
+
+def rev_parse(work_tree, rev):
+    return subprocess.check_output(["git", "-C", work_tree, "rev-parse", rev]).decode("utf-8").strip()
+
+def main():
+    """ Test case for twobit.oebuild.RemoteResolver.
+    """
+    description="Program to exercise pinning branches with batched, cached ls-remote."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-u", "--url", required=True, help="URL of the repo")
+    parser.add_argument("-w", "--work-tree", required=True, help="clone pushing to the repo")
+    parser.add_argument("-c", "--cache-file", required=True, help="ls-remote cache file")
+    args = parser.parse_args()
+    # git runs ls-remote from the top of the work tree it's called in
+    args.url = os.path.abspath(args.url)
+    master = rev_parse(args.work_tree, "master")
+    other = rev_parse(args.work_tree, "other")
+    repos = [Repo("a", args.url, branch="master"),
+             Repo("b", args.url, branch="other"),
+             Repo("c", args.url, branch="v1"),
+             Repo("pinned", args.url, branch="master", revision="0" * 40)]
+
+    # one ls-remote for every repo on the URL
+    resolver = CountingResolver(cache_file=args.cache_file, ttl=300, jobs=2)
+    resolved = resolver.resolve(repos)
+    check(resolver.queried == [args.url], "queried {0}".format(resolver.queried))
+    check([repo._revision for repo in resolved] == [master, other, master, "0" * 40],
+          "revisions {0}".format([repo._revision for repo in resolved]))
+    check(resolver.resolve(repos, force=True)[3]._revision == master, "force")
+
+    # a new commit on the remote isn't seen while the cache is fresh
+    subprocess.check_call(["git", "-C", args.work_tree, "commit", "--quiet",
+                           "--allow-empty", "--message", "new"])
+    subprocess.check_call(["git", "-C", args.work_tree, "push", "--quiet", "origin", "master"])
+    new = rev_parse(args.work_tree, "master")
+    resolver = CountingResolver(cache_file=args.cache_file, ttl=300)
+    check(resolver.resolve(repos)[0]._revision == master and resolver.queried == [],
+          "cache not used")
+    # but is once it expired
+    resolver = CountingResolver(cache_file=args.cache_file, ttl=0)
+    check(resolver.resolve(repos)[0]._revision == new and resolver.queried == [args.url],
+          "expired cache used")
+    resolver = CountingResolver(cache_file=args.cache_file, ttl=300)
+    check(resolver.resolve(repos)[0]._revision == new, "cache not refreshed")
+
+    try:
+        RemoteResolver(ttl=0).resolve([Repo("x", args.url, branch="missing")])
+    except ValueError:
+        pass
+    else:
+        check(False, "missing branch resolved")
+
+if __name__ == '__main__':
+    main()
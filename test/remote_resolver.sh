@@ -0,0 +1,34 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+REPO_DIR=${BASE}.git
+REPO_TMP=${BASE}_tmp
+CACHE_FILE=${BASE}.json
+
+# setup
+# a repo with two branches and a tag
+repo_init ${REPO_DIR} ${REPO_TMP}
+echo "test" | { repo_commit ${REPO_TMP} test_file; }
+git --git-dir=${REPO_TMP}/.git tag v1
+git --git-dir=${REPO_TMP}/.git push origin v1
+git --git-dir=${REPO_TMP}/.git --work-tree=${REPO_TMP} checkout -b other
+echo "test2" | { repo_commit ${REPO_TMP} test_file other; }
+git --git-dir=${REPO_TMP}/.git --work-tree=${REPO_TMP} checkout master
+rm -f ${CACHE_FILE}
+
+# test
+PYTHONPATH+=../ python ./remote_resolver.py --url="${REPO_DIR}" \
+    --work-tree="${REPO_TMP}" --cache-file="${CACHE_FILE}"
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# tear down
+rm -rf ${REPO_DIR} ${REPO_TMP} ${CACHE_FILE} ${CACHE_FILE}.lock
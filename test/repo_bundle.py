@@ -0,0 +1,42 @@
+from twobit.oebuild import GitState, Repo, RepoFetcher
+from argparse import ArgumentParser
+import os
+from functions import check
+
+def main():
+    """ Test case for the bundle / restore methods of twobit.oebuild.RepoFetcher.
+
+    Bundles a pinned repo, takes its remote away and restores the repo from
+    the bundle, which must not need the network.
+    """
+    description="Program to round trip repos through git bundles with twobit.oebuild.RepoFetcher."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-s", "--src-dir", required=True, help="directory holding the repos")
+    parser.add_argument("-b", "--bundle-dir", required=True, help="directory for the bundles")
+    parser.add_argument("-r", "--restore-dir", required=True, help="directory to restore to")
+    parser.add_argument("-u", "--url", required=True, help="URL of the repo")
+    parser.add_argument("--revision", required=True, help="pinned revision")
+    args = parser.parse_args()
+    repos = [Repo("pinned", args.url, revision=args.revision, layers=None)]
+
+    results = RepoFetcher(args.src_dir, repos=repos).bundle(args.bundle_dir)
+    RepoFetcher.report(results)
+    check(all(result.ok() for result in results), "bundle failed")
+    check(os.path.isfile(os.path.join(args.bundle_dir, "pinned.bundle")), "no bundle")
+
+    # restoring must work offline
+    os.rename(args.url, args.url + ".offline")
+    os.mkdir(args.restore_dir)
+    results = RepoFetcher(args.restore_dir, repos=repos).restore(args.bundle_dir)
+    RepoFetcher.report(results)
+    check(all(result.ok() for result in results), "restore failed")
+    url, branch, revision = GitState().state(os.path.join(args.restore_dir, "pinned", ".git"))
+    check(revision == args.revision, "restored at {0}".format(revision))
+    check(branch == "master", "restored on {0}".format(branch))
+    check(os.path.abspath(url) == os.path.abspath(args.url), "origin {0}".format(url))
+    # the bundle ref isn't left behind in the source repo
+    refs = GitState.git_dirs(os.path.join(args.src_dir, "pinned", ".git"))[1]
+    check(not os.path.exists(os.path.join(refs, Repo.BUNDLE_REF)), "bundle ref left")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+REPO_DIR=${BASE}.git
+REPO_TMP=${BASE}_tmp
+SRC_DIR=${BASE}_test
+BUNDLE_DIR=${BASE}_bundles
+RESTORE_DIR=${BASE}_restored
+
+# setup
+# a repo with two commits, cloned and pinned to the first one
+repo_init ${REPO_DIR} ${REPO_TMP}
+echo "test" | { repo_commit ${REPO_TMP} test_file; }
+FIRST=$(git --git-dir=${REPO_TMP}/.git rev-parse HEAD)
+echo "test2" | { repo_commit ${REPO_TMP} test_file; }
+mkdir ${SRC_DIR} ${BUNDLE_DIR}
+git clone ${REPO_DIR} ${SRC_DIR}/pinned
+git --git-dir=${SRC_DIR}/pinned/.git --work-tree=${SRC_DIR}/pinned reset --hard ${FIRST}
+
+# test
+PYTHONPATH+=../ python ./repo_bundle.py --src-dir="${SRC_DIR}" \
+    --bundle-dir="${BUNDLE_DIR}" --restore-dir="${RESTORE_DIR}" \
+    --url="${REPO_DIR}" --revision="${FIRST}"
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+if ! grep -q "^test$" ${RESTORE_DIR}/pinned/test_file; then
+    exit 2
+fi
+
+# tear down
+rm -rf ${REPO_DIR} ${REPO_DIR}.offline ${REPO_TMP} ${SRC_DIR} ${BUNDLE_DIR} ${RESTORE_DIR}
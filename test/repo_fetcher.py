@@ -0,0 +1,31 @@
+from twobit.oebuild import Repo, RepoFetcher
+from argparse import ArgumentParser
+import sys
+
+def main():
+    """ Test case to exercise concurrent cloning with twobit.oebuild.RepoFetcher.
+    """
+    description="Program to clone git repos in parallel using the twobit.oebuild.RepoFetcher object."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-s", "--src-dir",
+                        default="repo_fetcher_test",
+                        help="directory where repos are cloned")
+    parser.add_argument("-j", "--jobs",
+                        type=int,
+                        default=2,
+                        help="number of repos cloned concurrently")
+    parser.add_argument("urls",
+                        nargs="+",
+                        help="URLs of repos to clone")
+    args = parser.parse_args()
+
+    repos = [Repo("repo{0}".format(i), url, layers=None)
+             for i, url in enumerate(args.urls)]
+    fetcher = RepoFetcher(args.src_dir, repos=repos, jobs=args.jobs)
+    results = fetcher.clone()
+    RepoFetcher.report(results)
+    if not all(result.ok() for result in results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
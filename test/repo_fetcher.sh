@@ -0,0 +1,60 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+SRC_DIR=${BASE}_test
+
+# setup
+# create three repos each with a single commit
+URLS=""
+for i in 0 1 2; do
+    repo_init ${BASE}${i}.git ${BASE}${i}_tmp
+    echo "test${i}" | { repo_commit ${BASE}${i}_tmp test_file; }
+    rm -rf ${BASE}${i}_tmp
+    URLS="${URLS} ${BASE}${i}.git"
+done
+mkdir ${SRC_DIR}
+
+# test
+PYTHONPATH+=../ python ./repo_fetcher.py --src-dir="${SRC_DIR}" --jobs=3 ${URLS}
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+for i in 0 1 2; do
+    if ! grep -q "^test${i}$" ${SRC_DIR}/repo${i}/test_file; then
+        exit 2
+    fi
+done
+
+# cloning over existing repos must be reported as a failure
+PYTHONPATH+=../ python ./repo_fetcher.py --src-dir="${SRC_DIR}" --jobs=3 ${URLS}
+if [ $? -eq 0 ]; then
+    exit 3
+fi
+
+# a clone of an empty repo has no HEAD to switch to, it fails on its own
+# and the other repos and the summary aren't affected
+mkdir ${BASE}_empty.git
+git init --bare ${BASE}_empty.git
+mkdir ${BASE}_partial
+PYTHONPATH+=../ python ./repo_fetcher.py --src-dir="${BASE}_partial" --jobs=2 \
+    ${BASE}_empty.git ${BASE}1.git > ${BASE}.out 2>&1
+if [ $? -eq 0 ]; then
+    exit 4
+fi
+cat ${BASE}.out
+if ! grep -q "^    repo0: error: " ${BASE}.out || \
+   ! grep -q "^    repo1: cloned$" ${BASE}.out || \
+   ! grep -q "^test1$" ${BASE}_partial/repo1/test_file; then
+    exit 5
+fi
+
+# tear down
+rm -rf ${SRC_DIR} ${BASE}0.git ${BASE}1.git ${BASE}2.git ${BASE}_empty.git \
+    ${BASE}_partial ${BASE}.out
@@ -0,0 +1,58 @@
+from twobit.oebuild import MirrorCache, PlanEntry, Repo, RepoFetcher
+from argparse import ArgumentParser
+import sys
+
+def main():
+    """ Test case for the plan / apply methods of twobit.oebuild.RepoFetcher.
+
+    Checks the action planned for each repo against the expected one, then
+    optionally applies the plan and makes sure everything is up to date.
+    """
+    description="Program to plan and apply minimal repo updates with twobit.oebuild.RepoFetcher."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-s", "--src-dir",
+                        default="repo_plan_test",
+                        help="directory holding the repos")
+    parser.add_argument("-m", "--mirror-dir",
+                        default=None,
+                        help="check repos out as worktrees of mirrors in this directory")
+    parser.add_argument("-a", "--apply",
+                        action="store_true",
+                        default=False,
+                        help="apply the plan after checking it")
+    parser.add_argument("repos",
+                        nargs="+",
+                        help="NAME,URL,REVISION,EXPECTED_ACTION for each repo, "
+                             "use an empty REVISION for none")
+    args = parser.parse_args()
+
+    repos = []
+    expected = []
+    for spec in args.repos:
+        name, url, revision, action = spec.split(",")
+        repos.append(Repo(name, url, revision=revision or None, layers=None))
+        expected.append((name, action))
+    if args.mirror_dir is None:
+        fetcher = RepoFetcher(args.src_dir, repos=repos, jobs=2)
+    else:
+        fetcher = RepoFetcher(args.src_dir, repos=repos, jobs=2,
+                              mirror=MirrorCache(args.mirror_dir), worktrees=True)
+    entries = fetcher.plan()
+    for entry in entries:
+        print(entry)
+    found = [(entry._name, entry._action) for entry in entries
+             if entry._action != PlanEntry.EXTRANEOUS]
+    if found != expected:
+        print("expected {0}".format(expected))
+        sys.exit(1)
+    if args.apply:
+        results = fetcher.apply()
+        RepoFetcher.report(results)
+        if not all(result.ok() for result in results):
+            sys.exit(2)
+        if any(entry._action != PlanEntry.UP_TO_DATE for entry in fetcher.plan()
+               if entry._action != PlanEntry.EXTRANEOUS):
+            sys.exit(3)
+
+if __name__ == '__main__':
+    main()
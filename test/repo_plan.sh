@@ -0,0 +1,80 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+REPO_DIR=${BASE}.git
+REPO_TMP=${BASE}_tmp
+SRC_DIR=${BASE}_test
+WT_DIR=${BASE}_worktrees
+MIRROR_DIR=${BASE}_mirrors
+
+# setup
+# a repo with two commits, cloned three times
+repo_init ${REPO_DIR} ${REPO_TMP}
+echo "test" | { repo_commit ${REPO_TMP} test_file; }
+FIRST=$(git --git-dir=${REPO_TMP}/.git rev-parse HEAD)
+echo "test2" | { repo_commit ${REPO_TMP} test_file; }
+mkdir ${SRC_DIR}
+for NAME in current behind pinned; do
+    git clone ${REPO_DIR} ${SRC_DIR}/${NAME}
+done
+# 'behind' has fetched a new commit it isn't at yet
+echo "test3" | { repo_commit ${REPO_TMP} test_file; }
+git --git-dir=${SRC_DIR}/behind/.git fetch
+git init ${SRC_DIR}/extra
+
+# test
+PYTHONPATH+=../ python ./repo_plan.py --src-dir="${SRC_DIR}" \
+    "current,${REPO_DIR},,up-to-date" \
+    "behind,${REPO_DIR},,fast-forward" \
+    "pinned,${REPO_DIR},${FIRST},needs-reset" \
+    "missing,${REPO_DIR},,missing"
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+PYTHONPATH+=../ python ./repo_plan.py --src-dir="${SRC_DIR}" --apply \
+    "current,${REPO_DIR},,up-to-date" \
+    "behind,${REPO_DIR},,fast-forward" \
+    "pinned,${REPO_DIR},${FIRST},needs-reset" \
+    "missing,${REPO_DIR},,missing"
+if [ $? -ne 0 ]; then
+    exit 2
+fi
+if ! grep -q "^test3$" ${SRC_DIR}/behind/test_file || \
+   ! grep -q "^test$" ${SRC_DIR}/pinned/test_file || \
+   ! grep -q "^test3$" ${SRC_DIR}/missing/test_file; then
+    exit 3
+fi
+# the extraneous repo is left alone
+if [ ! -d ${SRC_DIR}/extra/.git ]; then
+    exit 4
+fi
+
+# worktrees resolve the branch in the mirror, which has no origin remote
+mkdir ${WT_DIR}
+PYTHONPATH+=../ python ./repo_plan.py --src-dir="${WT_DIR}" \
+    --mirror-dir="${MIRROR_DIR}" --apply \
+    "current,${REPO_DIR},,missing" \
+    "pinned,${REPO_DIR},${FIRST},missing"
+if [ $? -ne 0 ]; then
+    exit 5
+fi
+PYTHONPATH+=../ python ./repo_plan.py --src-dir="${WT_DIR}" \
+    --mirror-dir="${MIRROR_DIR}" --apply \
+    "current,${REPO_DIR},,up-to-date" \
+    "pinned,${REPO_DIR},,needs-reset"
+if [ $? -ne 0 ]; then
+    exit 6
+fi
+if ! grep -q "^test3$" ${WT_DIR}/pinned/test_file; then
+    exit 7
+fi
+
+# tear down
+rm -rf ${REPO_DIR} ${REPO_TMP} ${SRC_DIR} ${WT_DIR} ${MIRROR_DIR}
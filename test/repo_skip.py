@@ -0,0 +1,37 @@
+from twobit.oebuild import Repo, RepoFetcher
+from argparse import ArgumentParser
+from functions import check
+
+def main():
+    """ Test case for skipping repos already at their pinned revision in
+        twobit.oebuild.RepoFetcher.update.
+    """
+    description="Program to update git repos, skipping those at their pinned revision, with twobit.oebuild.RepoFetcher."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-s", "--src-dir",
+                        default="repo_skip_test",
+                        help="directory holding the repos")
+    parser.add_argument("repos",
+                        nargs="+",
+                        help="NAME,URL,REVISION,EXPECTED_STATUS for each repo")
+    args = parser.parse_args()
+
+    repos = []
+    expected = []
+    for spec in args.repos:
+        name, url, revision, status = spec.split(",")
+        repos.append(Repo(name, url, revision=revision, layers=None))
+        expected.append((name, status))
+    results = RepoFetcher(args.src_dir, repos=repos, jobs=2).update()
+    RepoFetcher.report(results)
+    check(all(result.ok() for result in results), "update failed")
+    found = [(result._name, result._status) for result in results]
+    check(found == expected, "expected {0}, got {1}".format(expected, found))
+    # skipped repos never touch the network
+    for result in results:
+        fetched = "fetching {0} ...".format(result._name) in (result._output or "")
+        check(fetched == (result._status != "skipped"),
+              "{0} {1} but fetched is {2}".format(result._name, result._status, fetched))
+
+if __name__ == '__main__':
+    main()
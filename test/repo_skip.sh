@@ -0,0 +1,53 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+REPO_DIR=${BASE}.git
+REPO_TMP=${BASE}_tmp
+SRC_DIR=${BASE}_test
+
+# setup
+# a repo with two commits, cloned twice at the first one
+repo_init ${REPO_DIR} ${REPO_TMP}
+echo "test" | { repo_commit ${REPO_TMP} test_file; }
+FIRST=$(git --git-dir=${REPO_TMP}/.git rev-parse HEAD)
+mkdir ${SRC_DIR}
+for NAME in pinned moved; do
+    git clone ${REPO_DIR} ${SRC_DIR}/${NAME}
+done
+echo "test2" | { repo_commit ${REPO_TMP} test_file; }
+SECOND=$(git --git-dir=${REPO_TMP}/.git rev-parse HEAD)
+
+# test
+# only the repo whose pinned revision moved is fetched
+PYTHONPATH+=../ python ./repo_skip.py --src-dir="${SRC_DIR}" \
+    "pinned,${REPO_DIR},${FIRST},skipped" \
+    "moved,${REPO_DIR},${SECOND},updated" > ${BASE}.out
+if [ $? -ne 0 ]; then
+    cat ${BASE}.out
+    exit 1
+fi
+cat ${BASE}.out
+if ! grep -q "^1 skipped, 1 updated$" ${BASE}.out; then
+    exit 2
+fi
+if ! grep -q "^test$" ${SRC_DIR}/pinned/test_file || \
+   ! grep -q "^test2$" ${SRC_DIR}/moved/test_file; then
+    exit 3
+fi
+# and once it's there it's skipped too
+PYTHONPATH+=../ python ./repo_skip.py --src-dir="${SRC_DIR}" \
+    "pinned,${REPO_DIR},${FIRST},skipped" \
+    "moved,${REPO_DIR},${SECOND},skipped"
+if [ $? -ne 0 ]; then
+    exit 4
+fi
+
+# tear down
+rm -rf ${REPO_DIR} ${REPO_TMP} ${SRC_DIR} ${BASE}.out
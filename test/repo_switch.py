@@ -0,0 +1,46 @@
+from twobit.oebuild import Repo, RepoFetcher
+from argparse import ArgumentParser
+import sys
+
+def main():
+    """ Test case for twobit.oebuild.Repo.switch through RepoFetcher.
+
+    Clones the repo or resets it to the revision and checks the number of
+    files that were rewritten.
+    """
+    description="Program to move a repo between revisions with twobit.oebuild.RepoFetcher."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-s", "--src-dir",
+                        default="repo_switch_test",
+                        help="directory holding the repo")
+    parser.add_argument("-u", "--url",
+                        required=True,
+                        help="URL of the repo")
+    parser.add_argument("-r", "--revision",
+                        required=True,
+                        help="revision to move the repo to")
+    parser.add_argument("-c", "--clone",
+                        action="store_true",
+                        default=False,
+                        help="clone the repo instead of resetting it")
+    parser.add_argument("-t", "--touched",
+                        type=int,
+                        default=0,
+                        help="number of files expected to be rewritten")
+    args = parser.parse_args()
+
+    repo = Repo("repo", args.url, revision=args.revision, layers=None)
+    fetcher = RepoFetcher(args.src_dir, repos=[repo])
+    if args.clone:
+        results = fetcher.clone()
+    else:
+        results = fetcher.reset_state()
+    RepoFetcher.report(results)
+    if not results[0].ok():
+        sys.exit(1)
+    if not args.clone and len(results[0]._touched) != args.touched:
+        print("expected {0} files to be rewritten".format(args.touched))
+        sys.exit(2)
+
+if __name__ == '__main__':
+    main()
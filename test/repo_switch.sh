@@ -0,0 +1,70 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+REPO_DIR=${BASE}.git
+REPO_TMP=${BASE}_tmp
+SRC_DIR=${BASE}_test
+WORK_TREE=${SRC_DIR}/repo
+
+# mtime of a file in the work tree
+mtime () {
+    stat -c %Y ${WORK_TREE}/$1
+}
+
+# setup
+# two commits, the second one only changes the recipe
+repo_init ${REPO_DIR} ${REPO_TMP}
+echo "LAYERSERIES_COMPAT = \"test\"" > ${REPO_TMP}/layer.conf
+echo "other" > ${REPO_TMP}/README
+git --git-dir=${REPO_TMP}/.git --work-tree=${REPO_TMP} add layer.conf README
+echo "PV = \"1\"" | { repo_commit ${REPO_TMP} test.bb; }
+FIRST=$(git --git-dir=${REPO_TMP}/.git rev-parse HEAD)
+echo "PV = \"2\"" | { repo_commit ${REPO_TMP} test.bb; }
+SECOND=$(git --git-dir=${REPO_TMP}/.git rev-parse HEAD)
+mkdir ${SRC_DIR}
+
+# test
+PYTHONPATH+=../ python ./repo_switch.py --src-dir="${SRC_DIR}" \
+    --url="${REPO_DIR}" --revision="${SECOND}" --clone
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+# age every file so rewriting one is noticed
+touch -d "2001-01-01" ${WORK_TREE}/layer.conf ${WORK_TREE}/README ${WORK_TREE}/test.bb
+OLD=$(mtime README)
+
+# already at the revision: nothing is rewritten
+PYTHONPATH+=../ python ./repo_switch.py --src-dir="${SRC_DIR}" \
+    --url="${REPO_DIR}" --revision="${SECOND}" --touched=0
+if [ $? -ne 0 ]; then
+    exit 2
+fi
+for FILE in layer.conf README test.bb; do
+    if [ $(mtime ${FILE}) -ne ${OLD} ]; then
+        exit 3
+    fi
+done
+
+# moving to the first commit only rewrites the recipe
+PYTHONPATH+=../ python ./repo_switch.py --src-dir="${SRC_DIR}" \
+    --url="${REPO_DIR}" --revision="${FIRST}" --touched=1
+if [ $? -ne 0 ]; then
+    exit 4
+fi
+if [ $(mtime test.bb) -eq ${OLD} ] || [ $(mtime README) -ne ${OLD} ] || \
+   [ $(mtime layer.conf) -ne ${OLD} ]; then
+    exit 5
+fi
+if ! grep -q '^PV = "1"$' ${WORK_TREE}/test.bb; then
+    exit 6
+fi
+
+# tear down
+rm -rf ${REPO_DIR} ${REPO_TMP} ${SRC_DIR}
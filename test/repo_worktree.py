@@ -0,0 +1,49 @@
+from twobit.oebuild import GitState, MirrorCache, Repo, RepoFetcher
+from argparse import ArgumentParser
+import os
+import sys
+
+def main():
+    """ Test case to exercise worktrees sharing mirrors with twobit.oebuild.RepoFetcher.
+    """
+    description="Program to check out git repos as worktrees of shared mirrors using the twobit.oebuild.RepoFetcher object."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-s", "--src-dir",
+                        default="repo_worktree_test",
+                        help="directory where worktrees are created")
+    parser.add_argument("-m", "--mirror-dir",
+                        default="repo_worktree_mirrors",
+                        help="directory holding the shared mirrors")
+    parser.add_argument("-j", "--jobs",
+                        type=int,
+                        default=2,
+                        help="number of repos processed concurrently")
+    parser.add_argument("-u", "--update",
+                        action="store_true",
+                        default=False,
+                        help="update existing worktrees")
+    parser.add_argument("urls",
+                        nargs="+",
+                        help="URLs of repos to check out")
+    args = parser.parse_args()
+
+    repos = [Repo("repo{0}".format(i), url, layers=None)
+             for i, url in enumerate(args.urls)]
+    fetcher = RepoFetcher(args.src_dir, repos=repos, jobs=args.jobs,
+                          mirror=MirrorCache(args.mirror_dir), worktrees=True)
+    if args.update:
+        results = fetcher.update()
+    else:
+        results = fetcher.clone()
+    RepoFetcher.report(results)
+    if not all(result.ok() for result in results):
+        sys.exit(1)
+    # the branch must survive the detached HEAD
+    for repo in repos:
+        url, branch, rev = GitState().state(os.path.join(args.src_dir, repo._name, ".git"))
+        if branch != repo._branch:
+            print("{0}: unexpected state {1}".format(repo._name, (url, branch, rev)))
+            sys.exit(2)
+
+if __name__ == '__main__':
+    main()
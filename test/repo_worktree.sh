@@ -0,0 +1,63 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+MIRROR_DIR=${BASE}_mirrors
+
+# setup
+# create two repos each with a single commit
+URLS=""
+for i in 0 1; do
+    repo_init ${BASE}${i}.git ${BASE}${i}_tmp
+    echo "test${i}" | { repo_commit ${BASE}${i}_tmp test_file; }
+    URLS="${URLS} ${BASE}${i}.git"
+done
+mkdir ${BASE}_a ${BASE}_b
+
+# test
+# set up two build directories concurrently
+PYTHONPATH+=../ python ./repo_worktree.py --src-dir="${BASE}_a" \
+    --mirror-dir="${MIRROR_DIR}" ${URLS} &
+PID=$!
+PYTHONPATH+=../ python ./repo_worktree.py --src-dir="${BASE}_b" \
+    --mirror-dir="${MIRROR_DIR}" ${URLS}
+RC_B=$?
+wait ${PID}
+if [ $? -ne 0 ] || [ ${RC_B} -ne 0 ]; then
+    exit 1
+fi
+for i in 0 1; do
+    for DIR in ${BASE}_a ${BASE}_b; do
+        if ! grep -q "^test${i}$" ${DIR}/repo${i}/test_file; then
+            exit 2
+        fi
+    done
+done
+# one clone per URL
+if [ $(ls -d ${MIRROR_DIR}/*.git | wc -l) -ne 2 ]; then
+    exit 3
+fi
+
+# updating one build directory leaves the other alone
+echo "test0 update" | { repo_commit ${BASE}0_tmp test_file; }
+PYTHONPATH+=../ python ./repo_worktree.py --src-dir="${BASE}_a" \
+    --mirror-dir="${MIRROR_DIR}" --update ${URLS}
+if [ $? -ne 0 ]; then
+    exit 4
+fi
+if ! grep -q "^test0 update$" ${BASE}_a/repo0/test_file; then
+    exit 5
+fi
+if ! grep -q "^test0$" ${BASE}_b/repo0/test_file; then
+    exit 6
+fi
+
+# tear down
+rm -rf ${BASE}_a ${BASE}_b ${MIRROR_DIR} ${BASE}0.git ${BASE}1.git \
+    ${BASE}0_tmp ${BASE}1_tmp
@@ -0,0 +1,95 @@
+from twobit.oebuild import GitRunner, ProcessLoop, RetryPolicy
+from argparse import ArgumentParser
+import os
+import threading
+import time
+from functions import check
+
+def main():
+    """ Test case for twobit.oebuild.RetryPolicy and its use by GitRunner.
+    """
+    description="Program to exercise retries and timeouts of git commands."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("--url",
+                        required=True,
+                        help="bare repo that is missing until the first retry")
+    parser.add_argument("--clone-dir",
+                        required=True,
+                        help="directory the repo is cloned into")
+    args = parser.parse_args()
+
+    check(RetryPolicy.parse_timeout("30") == (None, 30.0), "default timeout")
+    check(RetryPolicy.parse_timeout("clone=3600") == ("clone", 3600.0), "per operation timeout")
+    for spec in ("clone=", "=30", "soon"):
+        try:
+            RetryPolicy.parse_timeout(spec)
+        except ValueError:
+            continue
+        check(False, "{0} accepted".format(spec))
+    policy = RetryPolicy(retries=3, backoff=0.5, max_backoff=1.5, timeouts={"clone": 60})
+    check([policy.delay(i) for i in range(4)] == [0.5, 1.0, 1.5, 1.5], "backoff")
+    eof = "fatal: early EOF\nfatal: index-pack failed\n"
+    check(policy.retry("fetch", 2, 128, eof) and not policy.retry("fetch", 3, 128, eof),
+          "retry count")
+    check(policy.retry("clone", 0, -15, "", timed_out=True), "timeout isn't retried")
+    check(policy.retry("ls-remote", 0, 128,
+                       "fatal: unable to access 'https://example.com/x.git/': "
+                       "Could not resolve host: example.com\n"), "ls-remote isn't retried")
+    check(not policy.retry("fetch", 0, 128, "fatal: couldn't find remote ref nope\n"),
+          "missing ref is retried")
+    check(not policy.retry("fetch", 0, 128, None), "unknown failure is retried")
+    check(not policy.retry("checkout", 0, 1, eof), "local operations are retried")
+    check(policy.timeout("clone") == 60 and policy.timeout("fetch") is None, "timeouts")
+    try:
+        GitRunner(policy=policy)
+    except ValueError:
+        pass
+    else:
+        check(False, "timeouts accepted without a loop")
+
+    # the remote shows up while the clone is waiting for its first retry,
+    # over file:// git reports it like a server that went away
+    url = "file://" + os.path.abspath(args.url)
+    hidden = args.url + ".hidden"
+    os.rename(args.url, hidden)
+    threading.Timer(0.2, os.rename, (hidden, args.url)).start()
+    loop = ProcessLoop()
+    runner = GitRunner(loop=loop, policy=policy)
+    rc = runner.call(['clone', url, args.clone_dir])
+    check(rc == 0, "clone wasn't retried")
+    check(os.path.isdir(os.path.join(args.clone_dir, ".git")), "clone missing")
+
+    # failing local operations are not retried
+    start = time.time()
+    rc = runner.call(['--git-dir={0}'.format(os.path.join(args.clone_dir, ".git")),
+                      'checkout', 'no-such-branch'])
+    check(rc != 0 and time.time() - start < 0.5, "checkout was retried")
+
+    # neither is a pull that can't fast-forward or adding an existing remote
+    git_dir = os.path.join(args.clone_dir, ".git")
+    other = args.clone_dir + "_other"
+    for work_tree in (args.clone_dir, other):
+        if work_tree == other:
+            runner.call(['clone', '-q', url, other])
+        with open(os.path.join(work_tree, "diverged"), "w") as f:
+            f.write(work_tree)
+        runner.call_tree(work_tree, ['add', 'diverged'])
+        runner.call_tree(work_tree, ['commit', '-q', '-m', 'diverged'])
+    runner.call_tree(other, ['push', '-q', 'origin', 'HEAD'])
+    start = time.time()
+    rc = runner.call_tree(args.clone_dir, ['pull', '--ff-only', '-q', 'origin'])
+    check(rc != 0 and time.time() - start < 0.5, "pull was retried")
+    start = time.time()
+    rc = runner.call(['--git-dir={0}'.format(git_dir), 'remote', 'add', 'origin', args.url])
+    check(rc != 0 and time.time() - start < 0.5, "remote add was retried")
+    loop.close()
+
+    # without a loop the stderr of git is kept to decide on a retry
+    os.rename(args.url, hidden)
+    threading.Timer(0.2, os.rename, (hidden, args.url)).start()
+    runner = GitRunner(policy=RetryPolicy(retries=3, backoff=0.5))
+    rc = runner.call(['--git-dir={0}'.format(git_dir), 'fetch', '-q', 'origin'])
+    check(rc == 0, "fetch wasn't retried")
+
+if __name__ == '__main__':
+    main()
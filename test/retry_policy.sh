@@ -0,0 +1,26 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+REPO_DIR=${BASE}.git
+REPO_TMP=${BASE}_tmp
+CLONE_DIR=${BASE}_test
+
+# setup
+repo_init ${REPO_DIR} ${REPO_TMP}
+echo "test" | { repo_commit ${REPO_TMP} test_file; }
+
+# test
+PYTHONPATH+=../ python ./retry_policy.py --url="${REPO_DIR}" --clone-dir="${CLONE_DIR}"
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# tear down
+rm -rf ${REPO_DIR} ${REPO_TMP} ${CLONE_DIR} ${CLONE_DIR}_other
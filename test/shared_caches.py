@@ -0,0 +1,57 @@
+from twobit.oebuild import ConfParser, SharedCaches
+from argparse import ArgumentParser
+import os
+from functions import check
+
+def main():
+    """ Test case for twobit.oebuild.SharedCaches.
+    """
+    description="Program to exercise the checks and fragments for shared caches."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-c", "--host-conf",
+                        required=True,
+                        help="host config file setting DL_DIR and SSTATE_DIR")
+    parser.add_argument("-d", "--caches",
+                        required=True,
+                        help="directory holding the shared caches")
+    args = parser.parse_args()
+    caches_dir = os.path.abspath(args.caches)
+
+    # host config values are expanded, missing files are ignored
+    host_conf = SharedCaches.host_conf(args.host_conf)
+    for name in SharedCaches.VARIABLES:
+        host_conf[name] = os.path.normpath(host_conf[name])
+    check(host_conf == {"DL_DIR": os.path.join(caches_dir, "downloads"),
+                        "SSTATE_DIR": os.path.join(caches_dir, "sstate-cache"),
+                        "BUILD_OP_MIN_FREE": 0.0}, "host conf {0}".format(host_conf))
+    check(SharedCaches.host_conf(args.host_conf + ".missing") == {}, "missing host conf")
+
+    # directories are created and the fragments override the template
+    caches = SharedCaches(dl_dir=host_conf["DL_DIR"],
+                          sstate_dir=host_conf["SSTATE_DIR"], min_free=0)
+    check(caches.check() == [], "check {0}".format(caches.check()))
+    check(os.path.isdir(host_conf["DL_DIR"]), "DL_DIR created")
+    conf = ConfParser({"TOPDIR": "/build"})
+    conf.parse('DL_DIR ?= "${TOPDIR}/downloads"\n'
+               'SSTATE_DIR ?= "${TOPDIR}/sstate-cache"\n' + caches.local_conf(),
+               filename="local.conf")
+    check(conf.getvar("DL_DIR") == host_conf["DL_DIR"], "local.conf DL_DIR")
+    check(conf.getvar("SSTATE_DIR") == host_conf["SSTATE_DIR"], "local.conf SSTATE_DIR")
+    check('export SSTATE_DIR="{0}"'.format(host_conf["SSTATE_DIR"]) in caches.environment(),
+          "environment {0}".format(caches.environment()))
+
+    # nothing shared, nothing emitted
+    check(SharedCaches().local_conf() == "" and SharedCaches().check() == [], "no caches")
+
+    # not enough space
+    errors = SharedCaches(dl_dir=host_conf["DL_DIR"], min_free=float("inf")).check()
+    check(len(errors) == 1 and "GiB free" in errors[0], "free space {0}".format(errors))
+
+    # read only directory, root may write anyway
+    if os.geteuid() != 0:
+        os.chmod(host_conf["SSTATE_DIR"], 0o555)
+        errors = SharedCaches(sstate_dir=host_conf["SSTATE_DIR"], min_free=0).check()
+        check(len(errors) == 1 and "not writable" in errors[0], "writable {0}".format(errors))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+#!/bin/sh
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+CACHES=${BASE}.caches
+HOST_CONF=${BASE}.conf
+
+# setup
+rm -rf ${CACHES}
+mkdir -p ${CACHES}
+cat > ${HOST_CONF} << EOF_HOST_CONF
+CACHES = "$(pwd)/${CACHES}"
+DL_DIR = "\${CACHES}/downloads"
+SSTATE_DIR = "\${CACHES}/sstate-cache"
+BUILD_OP_MIN_FREE = "0"
+EOF_HOST_CONF
+
+# test
+PYTHONPATH+=../ python ./shared_caches.py --host-conf="${HOST_CONF}" --caches="${CACHES}"
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# tear down
+chmod -R u+w ${CACHES}
+rm -rf ${CACHES} ${HOST_CONF}
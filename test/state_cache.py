@@ -0,0 +1,60 @@
+from twobit.oebuild import Repo, StateCache
+from argparse import ArgumentParser
+import os
+import subprocess
+from functions import check
+
+def main():
+    """ Test case for twobit.oebuild.StateCache used by
+        Repo.repos_from_state.
+    """
+    description="Program to exercise reusing and invalidating cached repo state."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-t", "--top-dir",
+                        required=True,
+                        help="TOPDIR with a repo in its sources directory")
+    args = parser.parse_args()
+    top_dir = os.path.abspath(args.top_dir)
+    src_dir = os.path.join(top_dir, "sources")
+    repo_root = os.path.join(src_dir, "meta-test")
+    bblayers = os.path.join(top_dir, "conf", "bblayers.conf")
+    cache_file = os.path.join(top_dir, ".build_op_cache", "state.json")
+
+    def state(cache):
+        repos = Repo.repos_from_state(bblayers, top_dir=top_dir, src_dir=src_dir, cache=cache)
+        return repos[0]._branch, repos[0]._revision, repos[0]._layers
+
+    # the first run fills the cache file
+    branch, revision, layers = state(StateCache(cache_file))
+    check(branch == "master" and layers == ("./",), "state {0} {1}".format(branch, layers))
+    check(os.path.exists(cache_file), "cache file not written")
+
+    # a fresh cache object reads the file, a matching entry is used as is:
+    # plant a fake value under the current signature and get it back
+    cache = StateCache(cache_file)
+    signature = StateCache.signature(repo_root)
+    check(cache.get(repo_root, signature) is not None, "cache miss")
+    cache.put(repo_root, signature, ["url", "cached", revision, ["./"]])
+    cache.save()
+    check(state(StateCache(cache_file))[0] == "cached", "cache not used")
+
+    # moving HEAD changes the signature, the repo is scanned again
+    subprocess.check_call(["git", "-C", repo_root, "checkout", "--quiet", "-b", "other"])
+    check(StateCache(cache_file).get(repo_root, StateCache.signature(repo_root)) is None,
+          "stale entry after checkout")
+    check(state(StateCache(cache_file))[0] == "other", "branch change not seen")
+    subprocess.check_call(["git", "-C", repo_root, "commit", "--quiet",
+                           "--allow-empty", "--message", "new"])
+    new = subprocess.check_output(["git", "-C", repo_root, "rev-parse", "HEAD"]).decode("utf-8").strip()
+    check(state(StateCache(cache_file))[1] == new, "commit not seen")
+    # and the scan result is cached again
+    check(StateCache(cache_file).get(repo_root, StateCache.signature(repo_root))[2] == new,
+          "rescan not cached")
+
+    # a broken cache file is ignored
+    with open(cache_file, 'w') as cache_fd:
+        cache_fd.write("{")
+    check(state(StateCache(cache_file))[1] == new, "broken cache")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+REPO_DIR=${BASE}.git
+REPO_TMP=${BASE}_tmp
+TOP_DIR=${BASE}_top
+
+# setup
+# a layer repo cloned into the sources of a build directory
+repo_init ${REPO_DIR} ${REPO_TMP}
+mkdir -p ${REPO_TMP}/conf
+echo 'BBFILE_COLLECTIONS += "test"' | { repo_commit ${REPO_TMP} conf/layer.conf; }
+mkdir -p ${TOP_DIR}/sources ${TOP_DIR}/conf
+git clone ${REPO_DIR} ${TOP_DIR}/sources/meta-test
+cat > ${TOP_DIR}/conf/bblayers.conf << EOF_BBLAYERS
+BBLAYERS ?= "\${TOPDIR}/sources/meta-test"
+EOF_BBLAYERS
+
+# test
+PYTHONPATH+=../ python ./state_cache.py --top-dir=${TOP_DIR}
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# tear down
+rm -rf ${REPO_DIR} ${REPO_TMP} ${TOP_DIR}
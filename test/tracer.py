@@ -0,0 +1,70 @@
+from twobit.oebuild import Repo, RepoFetcher, Tracer
+from argparse import ArgumentParser
+from functions import check
+import json
+
+def main():
+    """ Test case for the JSON and Chrome traces of twobit.oebuild.Tracer.
+    """
+    description="Program to trace git operations with twobit.oebuild.Tracer."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.add_argument("-s", "--src-dir",
+                        default="tracer_test",
+                        help="directory where repos are cloned")
+    parser.add_argument("-t", "--trace",
+                        default="tracer_trace",
+                        help="prefix of the trace files written")
+    parser.add_argument("urls",
+                        nargs="+",
+                        help="URLs of repos to clone")
+    args = parser.parse_args()
+
+    # events recorded by hand end up in the traces as given
+    tracer = Tracer()
+    origin = tracer._origin
+    tracer.record("b", "fetch", origin + 2.0, 0.5, 1, nbytes=10)
+    tracer.record("a", "clone", origin + 1.0, 1.5, 0, nbytes=100, args=["git", "clone"])
+    tracer.record("a", "checkout", origin + 2.5, 0.25, 0)
+    check([event["op"] for event in tracer.events()] == ["clone", "fetch", "checkout"],
+          "events not ordered by start")
+    tracer.write(args.trace + "_manual.json")
+    with open(args.trace + "_manual.json", 'r') as trace_fd:
+        trace = json.load(trace_fd)
+    check(trace["repos"] == {"a": {"duration": 1.75, "bytes": 100},
+                             "b": {"duration": 0.5, "bytes": 10}},
+          "totals {0}".format(trace["repos"]))
+    check(trace["events"][0]["args"] == ["git", "clone"] and
+          "bytes" not in trace["events"][2], "events {0}".format(trace["events"]))
+    tracer.write(args.trace + "_manual.chrome", trace_format="chrome")
+    with open(args.trace + "_manual.chrome", 'r') as trace_fd:
+        trace = json.load(trace_fd)
+    names = dict((event["tid"], event["args"]["name"]) for event in trace["traceEvents"]
+                 if event["ph"] == "M")
+    check(sorted(names.values()) == ["a", "b"], "tracks {0}".format(names))
+    spans = [(names[event["tid"]], event["name"], event["ts"], event["dur"], event["args"])
+             for event in trace["traceEvents"] if event["ph"] == "X"]
+    check(spans == [("a", "clone", 1000000, 1500000, {"rc": 0, "bytes": 100}),
+                    ("b", "fetch", 2000000, 500000, {"rc": 1, "bytes": 10}),
+                    ("a", "checkout", 2500000, 250000, {"rc": 0})],
+          "spans {0}".format(spans))
+
+    # every git command run by a RepoFetcher is traced
+    repos = [Repo("repo{0}".format(i), url, layers=None)
+             for i, url in enumerate(args.urls)]
+    tracer = Tracer()
+    results = RepoFetcher(args.src_dir, repos=repos, jobs=2, tracer=tracer).clone()
+    RepoFetcher.report(results)
+    check(all(result.ok() for result in results), "clone failed")
+    tracer.write(args.trace + ".json")
+    with open(args.trace + ".json", 'r') as trace_fd:
+        trace = json.load(trace_fd)
+    for repo in repos:
+        clones = [event for event in trace["events"]
+                  if event["repo"] == repo._name and event["op"] == "clone"]
+        check(len(clones) == 1 and clones[0]["rc"] == 0 and clones[0]["bytes"] > 0,
+              "{0} clone events {1}".format(repo._name, clones))
+        check(trace["repos"][repo._name]["bytes"] == clones[0]["bytes"],
+              "{0} totals {1}".format(repo._name, trace["repos"][repo._name]))
+
+if __name__ == '__main__':
+    main()
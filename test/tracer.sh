@@ -0,0 +1,73 @@
+#!/bin/sh
+
+if [ -f ./functions.sh ]; then
+    . ./functions.sh
+else
+    echo "missing function library"
+    exit 1
+fi
+
+BASE=$(echo "$0" | sed 's&^\(.*\)\.sh&\1&')
+SRC_DIR=${BASE}_test
+TRACE=${BASE}_trace
+
+# setup
+# create two repos each with a single commit
+URLS=""
+for i in 0 1; do
+    repo_init ${BASE}${i}.git ${BASE}${i}_tmp
+    echo "test${i}" | { repo_commit ${BASE}${i}_tmp test_file; }
+    rm -rf ${BASE}${i}_tmp
+    URLS="${URLS} ${BASE}${i}.git"
+done
+mkdir ${SRC_DIR}
+
+# test
+PYTHONPATH+=../ python ./tracer.py --src-dir="${SRC_DIR}" --trace="${TRACE}" ${URLS}
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# resolve and apply trace their git commands, a failing resolve too
+TOP_DIR=${BASE}_top
+BUILD_OP=$(readlink -f ../build_op.py)
+mkdir ${TOP_DIR}
+cat > ${TOP_DIR}/LAYERS.json << EOF
+[
+    {"name": "repo0", "url": "$(readlink -f ${BASE}0.git)"},
+    {"name": "repo1", "url": "$(readlink -f ${BASE}1.git)"}
+]
+EOF
+cat > ${TOP_DIR}/BROKEN.json << EOF
+[
+    {"name": "repo0", "url": "$(readlink -f ${BASE}0.git)_missing"}
+]
+EOF
+(cd ${TOP_DIR} && python ${BUILD_OP} resolve --ttl=0 --trace=resolve.json && \
+    python ${BUILD_OP} apply --trace=apply.json --trace-format=chrome)
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+(cd ${TOP_DIR} && python ${BUILD_OP} resolve -j BROKEN.json --ttl=0 --trace=broken.json)
+if [ $? -eq 0 ]; then
+    exit 1
+fi
+python - ${TOP_DIR} << EOF
+import json, os, sys
+def load(name):
+    with open(os.path.join(sys.argv[1], name)) as trace_fd:
+        return json.load(trace_fd)
+ops = [event["op"] for event in load("resolve.json")["events"]]
+assert ops == ["ls-remote", "ls-remote"], ops
+ops = [event["name"] for event in load("apply.json")["traceEvents"] if event["ph"] == "X"]
+assert ops.count("clone") == 2, ops
+rcs = [event["rc"] for event in load("broken.json")["events"]]
+assert len(rcs) == 1 and rcs[0] != 0, rcs
+EOF
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# tear down
+rm -rf ${SRC_DIR} ${BASE}0.git ${BASE}1.git ${TRACE}.json ${TRACE}_manual.json \
+    ${TRACE}_manual.chrome ${TOP_DIR}
@@ -0,0 +1,45 @@
+from twobit.oebuild import WorkPool
+from argparse import ArgumentParser
+import threading
+from functions import check
+
+def main():
+    """ Test case for twobit.oebuild.WorkPool.
+    """
+    description="Program to exercise applying a function with a pool of threads."
+    parser = ArgumentParser(prog=__file__, description=description)
+    parser.parse_args()
+
+    # results come back in item order, started in the given order
+    for jobs in (1, 4):
+        started = []
+        lock = threading.Lock()
+        def square(item):
+            with lock:
+                started.append(item)
+            return item * item
+        results = WorkPool(jobs).map(square, [1, 2, 3, 4], order=[3, 2, 1, 0])
+        check(results == [1, 4, 9, 16], "results with {0} jobs {1}".format(jobs, results))
+        if jobs == 1:
+            check(started == [4, 3, 2, 1], "order {0}".format(started))
+
+    # an exception doesn't stop the other items, serial or not
+    for jobs in (1, 4):
+        done = []
+        lock = threading.Lock()
+        def fail_on_two(item):
+            if item == 2:
+                raise ValueError("item {0}".format(item))
+            with lock:
+                done.append(item)
+        try:
+            WorkPool(jobs).map(fail_on_two, [1, 2, 3, 4])
+        except ValueError as e:
+            check(str(e) == "item 2", "exception with {0} jobs {1}".format(jobs, e))
+        else:
+            check(False, "exception swallowed with {0} jobs".format(jobs))
+        check(sorted(done) == [1, 3, 4], "items after the exception with {0} jobs {1}".format(
+            jobs, done))
+
+if __name__ == '__main__':
+    main()
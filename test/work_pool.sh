@@ -0,0 +1,7 @@
+#!/bin/sh
+
+# test
+PYTHONPATH+=../ python ./work_pool.py
+if [ $? -ne 0 ]; then
+    exit 1
+fi
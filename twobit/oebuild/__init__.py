@@ -1,7 +1,32 @@
 from bb_layer_serializer import BBLayerSerializer
+from build_type_checker import BuildTypeChecker
+from cache_collector import CacheCollector
+from clone_options import CloneOptions
+from conf_parser import ConfAssignment, ConfParser
+from fetch_history import FetchHistory
+from fetch_result import FetchResult
 from fetcher_encoder import FetcherEncoder
+from file_lock import FileLock
+from generated_file import GeneratedFile
+from git_runner import GitRunner
+from git_state import GitState
+from host_parallelism import HostParallelism
+from layer_graph import LayerGraph
+from layer_index import LayerIndex
 from layer_serializer import LayerSerializer
+from manifest_archive import ManifestArchive
+from manifest_loader import ManifestError, ManifestLoader
+from mirror_cache import MirrorCache
 from path_sanity import PathSanity
+from plan_entry import PlanEntry
+from process_loop import ProcessJob, ProcessLoop
+from progress_display import ProgressDisplay
+from remote_resolver import RemoteResolver
 from repo import Repo
 from repo_encoder import RepoEncoder
 from repo_fetcher import RepoFetcher
+from retry_policy import RetryPolicy
+from shared_caches import SharedCaches
+from state_cache import StateCache
+from tracer import Tracer
+from work_pool import WorkPool
@@ -3,20 +3,32 @@ from __future__ import print_function
 import sys
 import os
 
+from layer_graph import LayerGraph
 from repo import Repo
 
 class BBLayerSerializer:
     """ Class to serialize a collection of Repo objects into bblayer form.
     """
-    def __init__(self, base, repos=[]):
+    def __init__(self, base, repos=[], top_dir=None, roots=None, prune=False):
         """ Initialize class.
 
         base: Directory component relative to TOPDIR where repos live.
               For repos in ${TOPDIR}/repos the base would be 'repos'.
         repos: An optional list of Repo objects. These objects hold all the
                interesting data that's written to the bblayers.conf file.
+        top_dir: Optional TOPDIR. When given the conf/layer.conf of the
+                 layers found there is read to sort the layers by their
+                 dependencies, see LayerGraph.
+        roots: Optional collections or layers the build needs, layers none
+               of them needs are reported.
+        prune: Leave incompatible and unneeded layers out instead of only
+               reporting them.
         """
         self._base = base
+        self._top_dir = top_dir
+        self._roots = roots
+        self._prune = prune
+        self._warnings = []
         self._repos = []
         for repo in repos:
             if type(repo) is Repo:
@@ -35,12 +47,24 @@ class BBLayerSerializer:
         fd: A file object where the bblayer.conf file will be written.
             The default is sys.stdout.
         """
-        fd.write("LCONF_VERSION ?= \"5\"\n")
-        fd.write("BBPATH ?= \"${TOPDIR}\"\n")
-        fd.write("BBLAYERS ?= \" \\\n")
+        layers = []
         for repo in self._repos:
             if repo._layers is not None:
                 for layer in repo._layers:
-                    tmp_path = os.path.normpath("{0}/{1}/{2}".format(self._base, repo._name, layer))
-                    fd.write("    ${{TOPDIR}}/{0} \\\n".format(tmp_path))
+                    layers.append(os.path.normpath(
+                        "{0}/{1}/{2}".format(self._base, repo._name, layer)))
+        if self._top_dir is not None:
+            graph = LayerGraph(self._top_dir, layers)
+            layers = graph.layers(roots=self._roots, prune=self._prune)
+            self._warnings = graph.warnings()
+        fd.write("LCONF_VERSION ?= \"5\"\n")
+        fd.write("BBPATH ?= \"${TOPDIR}\"\n")
+        fd.write("BBLAYERS ?= \" \\\n")
+        for tmp_path in layers:
+            fd.write("    ${{TOPDIR}}/{0} \\\n".format(tmp_path))
         fd.write("\"\n")
+    def warnings(self):
+        """ Problems with the layers found by the last write() when top_dir
+            was given.
+        """
+        return self._warnings
@@ -0,0 +1,126 @@
+import os
+import re
+import time
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from bb_layer_serializer import BBLayerSerializer
+from conf_parser import ConfParser
+from host_parallelism import HostParallelism
+from manifest_loader import ManifestError, ManifestLoader
+
+class BuildTypeChecker(object):
+    """ Check the files describing each build type in a build_op_data
+        directory without setting up a build.
+
+    A build type 'foo' is made of LAYERS_foo.json, local_foo.conf and
+    build_foo.sh. For each type the manifest is loaded and validated, the
+    conf file parsed, its parallelism profile checked, the build script
+    sanity checked and bblayers.conf generated in memory and parsed back.
+    """
+    _FILE = re.compile(r'^(LAYERS_(?P<json>.+)\.json|local_(?P<conf>.+)\.conf|build_(?P<sh>.+)\.sh)$')
+
+    def __init__(self, data_dir, src_dir="sources", top_dir="/TOPDIR"):
+        """ Initialize BuildTypeChecker.
+
+        data_dir: Path to the build_op_data directory.
+        src_dir: Source directory relative to TOPDIR used for bblayers.conf.
+        top_dir: Value of TOPDIR when expanding generated files.
+        """
+        self._data_dir = data_dir
+        self._src_dir = src_dir
+        self._top_dir = top_dir
+    def build_types(self):
+        """ Sorted names of every build type with at least one file in the
+            data directory.
+        """
+        types = set()
+        for name in os.listdir(self._data_dir):
+            match = BuildTypeChecker._FILE.match(name)
+            if match is not None:
+                types.add(match.group("json") or match.group("conf") or match.group("sh"))
+        return sorted(types)
+    def _path(self, pattern, build_type):
+        return os.path.join(self._data_dir, pattern.format(build_type))
+    def check(self, build_type):
+        """ Check one build type.
+
+        returns a list of error messages, empty if the type is fine.
+        """
+        errors = []
+        repos = None
+        json_file = self._path("LAYERS_{0}.json", build_type)
+        if not os.path.isfile(json_file):
+            errors.append("{0} is missing".format(json_file))
+        else:
+            try:
+                repos = ManifestLoader(json_file).load()
+            except ManifestError as e:
+                errors.append(str(e))
+
+        conf_file = self._path("local_{0}.conf", build_type)
+        if not os.path.isfile(conf_file):
+            errors.append("{0} is missing".format(conf_file))
+        else:
+            try:
+                ConfParser({"TOPDIR": self._top_dir}).parse_file(conf_file)
+            except ValueError as e:
+                errors.append(str(e))
+
+        try:
+            profile_name, profile = HostParallelism.load_profile(
+                os.path.join(self._data_dir, "parallelism.json"), build_type)
+            HostParallelism(cpus=1, memory=1, profile=profile, profile_name=profile_name)
+        except ValueError as e:
+            errors.append(str(e))
+
+        build_file = self._path("build_{0}.sh", build_type)
+        if not os.path.isfile(build_file):
+            errors.append("{0} is missing".format(build_file))
+        else:
+            with open(build_file, 'r') as build_fd:
+                if not build_fd.readline().startswith("#!"):
+                    errors.append("{0}: missing #! line".format(build_file))
+
+        if repos is not None:
+            # generate bblayers.conf and make sure bitbake would see the
+            # layers we asked for
+            bblayers_fd = StringIO()
+            BBLayerSerializer(self._src_dir, repos=repos).write(fd=bblayers_fd)
+            bblayers = ConfParser({"TOPDIR": self._top_dir})
+            try:
+                bblayers.parse(bblayers_fd.getvalue(), filename="bblayers.conf")
+            except ValueError as e:
+                errors.append(str(e))
+            else:
+                expected = [os.path.normpath(os.path.join(self._top_dir, self._src_dir,
+                                                          repo._name, layer))
+                            for repo in repos for layer in (repo._layers or [])]
+                found = (bblayers.getvar("BBLAYERS") or "").split()
+                if found != expected:
+                    errors.append("generated BBLAYERS {0} doesn't match {1}".format(found, expected))
+        return errors
+    def check_common(self):
+        """ Check the files shared by every build type.
+
+        returns a list of error messages, empty if they are fine.
+        """
+        errors = []
+        template = os.path.join(self._data_dir, "environment.sh.template")
+        if not os.path.isfile(template):
+            errors.append("{0} is missing".format(template))
+        return errors
+    def check_all(self):
+        """ Check every build type.
+
+        returns a list of (build_type, errors, seconds) tuples.
+        """
+        results = []
+        for build_type in self.build_types():
+            start = time.time()
+            errors = self.check(build_type)
+            results.append((build_type, errors, time.time() - start))
+        return results
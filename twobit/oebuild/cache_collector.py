@@ -0,0 +1,243 @@
+import heapq
+import json
+import os
+import re
+import shutil
+import time
+
+from file_lock import FileLock
+
+class CacheCollector(object):
+    """ Least recently used eviction for a DL_DIR or SSTATE_DIR.
+
+    The directory is indexed by size and last use of its entries: the later
+    of access and modification time of files (bitbake touches the sstate
+    archives it restores) and the modification time of directories, which
+    our own listing would otherwise make look used. The index is kept in
+    a subdirectory and reused by the next run: only directories whose mtime
+    changed are listed again and an entry is only stat()ed again right
+    before it's evicted, so a run doesn't stat every file of a large cache.
+
+    An entry is a file together with its .done, .lock and .siginfo
+    companions. Directories deeper than depth are entries as a whole, e.g.
+    the mirrors in DL_DIR/git2.
+    """
+    # directory of the index, kept out of the top level so writing the
+    # index doesn't make the next run list it again
+    INDEX = ".build_op_gc"
+    VERSION = 1
+    COMPANIONS = (".done", ".lock", ".siginfo")
+    _HASH = re.compile(r"[0-9a-f]{32,64}")
+
+    def __init__(self, path, depth=None):
+        """ Initialize CacheCollector, loading the index if it exists.
+
+        path: DL_DIR or SSTATE_DIR.
+        depth: Depth below which directories are entries as a whole, 1
+               for a DL_DIR. None makes only files entries.
+        """
+        self._path = path
+        self._depth = depth
+        self._index = os.path.join(path, CacheCollector.INDEX, "index.json")
+        self._dirs = {}
+        self._entries = {}
+        if os.path.exists(self._index):
+            try:
+                with FileLock(self._index + ".lock"):
+                    with open(self._index, 'r') as index_fd:
+                        data = json.load(index_fd)
+                if data.get("version") == CacheCollector.VERSION:
+                    self._dirs = data.get("dirs", {})
+                    self._entries = data.get("entries", {})
+            except (ValueError, AttributeError):
+                self._dirs = {}
+                self._entries = {}
+    @staticmethod
+    def referenced(build_dirs):
+        """ Task hashes of the stamps in the TMPDIRs of build_dirs.
+
+        build_dirs: TOPDIRs, whose tmp* directories are searched, or TMPDIRs.
+        returns a set of hashes, sstate archives named after them are in use.
+        """
+        hashes = set()
+        for build_dir in build_dirs:
+            stamps = [os.path.join(build_dir, "stamps")]
+            if not os.path.isdir(stamps[0]):
+                stamps = [os.path.join(build_dir, name, "stamps")
+                          for name in sorted(os.listdir(build_dir)) if name.startswith("tmp")]
+            for stamp_dir in stamps:
+                for _, _, files in os.walk(stamp_dir):
+                    for name in files:
+                        hashes.update(CacheCollector._HASH.findall(name))
+        return hashes
+    @staticmethod
+    def _base(name):
+        for suffix in CacheCollector.COMPANIONS:
+            if name.endswith(suffix) and len(name) > len(suffix):
+                return name[:-len(suffix)]
+        return name
+    def _stat(self, key, names):
+        """ Size and last use of the files names making up entry key.
+
+        returns a dict for the index, None if none of the files exists.
+        """
+        entry = {"files": sorted(names), "size": 0, "time": 0}
+        found = False
+        for name in names:
+            path = os.path.join(self._path, os.path.dirname(key), name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            found = True
+            if not os.path.isdir(path) or os.path.islink(path):
+                entry["size"] += st.st_size
+                entry["time"] = max(entry["time"], st.st_atime, st.st_mtime)
+                continue
+            entry["time"] = max(entry["time"], st.st_mtime)
+            for root, dirs, files in os.walk(path):
+                for child in dirs:
+                    try:
+                        st = os.lstat(os.path.join(root, child))
+                    except OSError:
+                        continue
+                    entry["time"] = max(entry["time"], st.st_mtime)
+                for child in files:
+                    try:
+                        st = os.lstat(os.path.join(root, child))
+                    except OSError:
+                        continue
+                    entry["size"] += st.st_size
+                    entry["time"] = max(entry["time"], st.st_atime, st.st_mtime)
+        return entry if found else None
+    def scan(self):
+        """ Bring the index up to date with the directory.
+
+        returns the number of directories that had to be listed.
+        """
+        by_dir = {}
+        for key in self._entries:
+            by_dir.setdefault(os.path.dirname(key), []).append(key)
+        dirs = {}
+        entries = {}
+        listed = 0
+        pending = [("", 0)]
+        while pending:
+            rel, depth = pending.pop()
+            path = os.path.join(self._path, rel)
+            try:
+                mtime = os.lstat(path).st_mtime
+            except OSError:
+                continue
+            old = self._dirs.get(rel)
+            if old is not None and old["mtime"] == mtime:
+                subdirs = old["subdirs"]
+                for key in by_dir.get(rel, []):
+                    entries[key] = self._entries[key]
+            else:
+                listed += 1
+                subdirs = []
+                groups = {}
+                for name in os.listdir(path):
+                    if not rel and name == CacheCollector.INDEX:
+                        continue
+                    full = os.path.join(path, name)
+                    if (os.path.isdir(full) and not os.path.islink(full) and
+                            (self._depth is None or depth < self._depth)):
+                        subdirs.append(name)
+                        continue
+                    groups.setdefault(CacheCollector._base(name), []).append(name)
+                for base, names in groups.items():
+                    key = os.path.join(rel, base)
+                    entry = self._entries.get(key)
+                    if entry is None or entry["files"] != sorted(names):
+                        entry = self._stat(key, names)
+                    if entry is not None:
+                        entries[key] = entry
+            dirs[rel] = {"mtime": mtime, "subdirs": subdirs}
+            pending.extend((os.path.join(rel, name), depth + 1) for name in subdirs)
+        self._dirs = dirs
+        self._entries = entries
+        return listed
+    def entries(self):
+        """ Number of entries in the index.
+        """
+        return len(self._entries)
+    def size(self):
+        """ Total size in bytes of the entries in the index.
+        """
+        return sum(entry["size"] for entry in self._entries.values())
+    def kept(self, key, keep):
+        """ True if entry key is named after one of the hashes in keep.
+        """
+        return bool(keep) and any(
+            found in keep for found in CacheCollector._HASH.findall(os.path.basename(key)))
+    def _remove(self, key, entry):
+        for name in entry["files"]:
+            path = os.path.join(self._path, os.path.dirname(key), name)
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.unlink(path)
+            except OSError:
+                pass
+    def collect(self, max_size=None, max_age=None, keep=None, dry_run=False, now=None):
+        """ Evict least recently used entries until the budgets are met.
+
+        max_size: Bytes the directory may use, None for no limit.
+        max_age: Seconds since last use after which an entry is evicted,
+                 None for no limit.
+        keep: Set of task hashes, entries named after one are never evicted.
+        dry_run: Only report what would be evicted.
+        now: Current time, for testing.
+        returns a list of (key, size, time) tuples of the evicted entries,
+        least recently used first.
+        """
+        now = time.time() if now is None else now
+        total = self.size()
+        heap = [(entry["time"], key) for key, entry in self._entries.items()
+                if not self.kept(key, keep)]
+        heapq.heapify(heap)
+        evicted = []
+        while heap:
+            last_use, key = heap[0]
+            if not ((max_age is not None and now - last_use > max_age) or
+                    (max_size is not None and total > max_size)):
+                break
+            heapq.heappop(heap)
+            # the index may predate the last use, look again before deleting
+            entry = self._entries[key]
+            fresh = self._stat(key, entry["files"])
+            total -= entry["size"]
+            if fresh is None:
+                del self._entries[key]
+                continue
+            total += fresh["size"]
+            self._entries[key] = fresh
+            if fresh["time"] > last_use:
+                heapq.heappush(heap, (fresh["time"], key))
+                continue
+            if not dry_run:
+                self._remove(key, fresh)
+                del self._entries[key]
+            total -= fresh["size"]
+            evicted.append((key, fresh["size"], fresh["time"]))
+        return evicted
+    def save(self):
+        """ Write the index into the directory.
+        """
+        if not os.path.isdir(os.path.dirname(self._index)):
+            # creating the index directory changes the top level, which
+            # doesn't need to be listed again for that
+            top = self._dirs.get("")
+            mtime = os.lstat(self._path).st_mtime
+            os.mkdir(os.path.dirname(self._index))
+            if top is not None and top["mtime"] == mtime:
+                top["mtime"] = os.lstat(self._path).st_mtime
+        with FileLock(self._index + ".lock"):
+            tmp_file = self._index + ".tmp"
+            with open(tmp_file, 'w') as index_fd:
+                json.dump({"version": CacheCollector.VERSION, "dirs": self._dirs,
+                           "entries": self._entries}, index_fd, sort_keys=True)
+            os.rename(tmp_file, self._index)
@@ -0,0 +1,89 @@
+class CloneOptions(object):
+    """ Options limiting how much of a repo is cloned.
+
+    Any option left at None falls back to the value from another
+    CloneOptions object through merge(), so options from the manifest can
+    override defaults given on the command line. To turn a default off the
+    manifest sets "single-branch": false, or null for "depth" and "filter",
+    which is kept as depth 0 and an empty filter. Like Repo, CloneOptions
+    objects are immutable.
+    """
+    __slots__ = ("_depth", "_single_branch", "_filter")
+
+    def __init__(self, depth=None, single_branch=None, clone_filter=None):
+        """ Initialize CloneOptions.
+
+        depth: Create a shallow clone with history truncated to this many
+               commits, 0 for the full history.
+        single_branch: Only fetch the history of the branch being cloned.
+        clone_filter: Partial clone filter spec passed to 'git clone
+                      --filter', e.g. 'blob:none' or 'tree:0'. An empty
+                      string for no filter.
+        """
+        if depth is not None and depth < 0:
+            raise ValueError("depth must not be negative, got {0}".format(depth))
+        object.__setattr__(self, "_depth", depth)
+        object.__setattr__(self, "_single_branch", single_branch)
+        object.__setattr__(self, "_filter", clone_filter)
+    def __setattr__(self, name, value):
+        raise AttributeError("CloneOptions objects are immutable")
+    def _key(self):
+        return (self._depth, self._single_branch, self._filter)
+    def __eq__(self, other):
+        return type(other) is CloneOptions and self._key() == other._key()
+    def __ne__(self, other):
+        return not self.__eq__(other)
+    def __hash__(self):
+        return hash(self._key())
+    def merge(self, defaults):
+        """ Return new CloneOptions using defaults for options that are unset.
+
+        defaults: CloneOptions object or None.
+        """
+        if defaults is None:
+            return self
+        return CloneOptions(
+            self._depth if self._depth is not None else defaults._depth,
+            self._single_branch if self._single_branch is not None else defaults._single_branch,
+            self._filter if self._filter is not None else defaults._filter)
+    def args(self, branch):
+        """ Arguments for 'git clone' implementing these options.
+
+        branch: Branch that will be checked out. Shallow and single branch
+                clones only get one branch so it has to be the right one.
+        """
+        args = []
+        if self._depth:
+            args += ['--depth', str(self._depth)]
+        if self._single_branch:
+            args += ['--single-branch']
+        if self._depth or self._single_branch:
+            args += ['--branch', branch]
+        if self._filter:
+            args += ['--filter={0}'.format(self._filter)]
+        return args
+    def encode(self, dict_tmp):
+        """ Add options that are set to a dictionary representing a Repo.
+        """
+        if self._depth is not None:
+            dict_tmp["depth"] = self._depth or None
+        if self._single_branch is not None:
+            dict_tmp["single-branch"] = self._single_branch
+        if self._filter is not None:
+            dict_tmp["filter"] = self._filter or None
+        return dict_tmp
+    @staticmethod
+    def decode(json_obj):
+        """ Create CloneOptions from a dictionary representing a Repo.
+
+        returns None if the dictionary has none of the clone option keys.
+        """
+        if not any(key in json_obj for key in ("depth", "single-branch", "filter")):
+            return None
+        depth = json_obj.get("depth", None)
+        if depth is None and "depth" in json_obj:
+            depth = 0
+        clone_filter = json_obj.get("filter", None)
+        if clone_filter is None and "filter" in json_obj:
+            clone_filter = ""
+        return CloneOptions(depth, json_obj.get("single-branch", None), clone_filter)
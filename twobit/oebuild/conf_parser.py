@@ -0,0 +1,243 @@
+import re
+
+class ConfAssignment(object):
+    """ A single statement parsed from a bitbake conf file.
+    """
+    def __init__(self, var, op, value, flag=None, override=None,
+                 exported=False, lineno=0):
+        """ Initialize ConfAssignment.
+
+        var: Name of the variable.
+        op: The assignment operator: '=', '?=', '??=', ':=', '+=', '=+',
+            '.=' or '=.'.
+        value: The unexpanded value between the quotes. For ':=' the value
+               expanded when the statement was parsed.
+        flag: Name of the variable flag for 'VAR[flag] = ...', otherwise None.
+        override: 'append', 'prepend' or 'remove' for 'VAR_append = ...' and
+                  'VAR:append = ...', otherwise None.
+        exported: True if the statement was prefixed with 'export'.
+        lineno: Line number where the statement starts.
+        """
+        self._var = var
+        self._op = op
+        self._value = value
+        self._flag = flag
+        self._override = override
+        self._exported = exported
+        self._lineno = lineno
+    def __str__(self):
+        var = self._var
+        if self._override is not None:
+            var += ":" + self._override
+        if self._flag is not None:
+            var += "[{0}]".format(self._flag)
+        return "{0}{1} {2} \"{3}\"".format("export " if self._exported else "",
+                                          var, self._op, self._value)
+
+class ConfParser(object):
+    """ Parser for bitbake conf files like bblayers.conf and local.conf.
+
+    Files are read in one go and parsed a logical line at a time into a list
+    of ConfAssignment objects. Variable values are then evaluated following
+    the bitbake rules for the assignment operators, append / prepend /
+    remove overrides and ${VAR} expansion. ':=' is expanded right away
+    against the statements parsed so far. Other statements like include,
+    inherit, addpylib or addtask, and python, shell and def functions, are
+    recorded but not followed.
+    """
+    _ASSIGN = re.compile(
+        r'^(?P<exp>export\s+)?'
+        r'(?P<var>[a-zA-Z0-9\-_+.${}/~:]+?)'
+        r'(?:[:_](?P<override>append|prepend|remove))?'
+        r'(?:\[(?P<flag>[a-zA-Z0-9\-_+.]+)\])?'
+        r'\s*(?P<op>\?\?=|\?=|:=|\+=|=\+|\.=|=\.|=)\s*'
+        r'(?P<quote>[\'"])(?P<value>.*)(?P=quote)\s*$')
+    _DIRECTIVE = re.compile(
+        r'^(?P<keyword>include|include_all|require|inherit|inherit_defer|unset|export|'
+        r'addtask|deltask|addhandler|addpylib|addfragments|EXPORT_FUNCTIONS)'
+        r'\s+(?P<arg>.+?)\s*$')
+    # 'python do_foo() {', 'fakeroot do_install() {' ... '}' at column 0
+    _FUNCTION = re.compile(
+        r'^(?:fakeroot\s+)?(?:(?P<python>python)(?:\s+|(?=\())|)'
+        r'(?P<name>[a-zA-Z0-9\-_+.${}:/~]*)\s*\(\s*\)\s*\{\s*$')
+    # 'def name(args):' followed by an indented body
+    _DEF = re.compile(r'^def\s+(?P<name>[a-zA-Z0-9_]+)\s*\(.*\)\s*:\s*$')
+    _EXPAND = re.compile(r'\$\{([a-zA-Z0-9\-_+./~:]+?)\}')
+
+    def __init__(self, variables=None):
+        """ Initialize ConfParser.
+
+        variables: Optional dictionary of variables known before parsing,
+                   e.g. {'TOPDIR': '/path/to/build'}.
+        """
+        self._variables = dict(variables or {})
+        self._assignments = []
+        self._by_var = {}
+        self._directives = []
+    def assignments(self):
+        """ List of ConfAssignment objects in the order they were parsed.
+        """
+        return self._assignments
+    def directives(self):
+        """ List of (keyword, argument, lineno) for the statements that
+            aren't assignments, e.g. include, inherit, unset, bare export,
+            addpylib and addtask. Functions are recorded with the keyword
+            'python', 'shell' or 'def' and their name as argument.
+        """
+        return self._directives
+    def parse(self, data, filename="<string>"):
+        """ Parse the content of a conf file.
+
+        data: String holding the whole file.
+        filename: Name used in error messages.
+        Raises ValueError for lines that can't be parsed.
+        """
+        lines = data.splitlines()
+        index = 0
+        count = len(lines)
+        while index < count:
+            lineno = index + 1
+            line = lines[index].rstrip()
+            index += 1
+            # join continuation lines, dropping the backslash like bitbake
+            while line.endswith("\\") and index < count:
+                line = line[:-1] + lines[index].rstrip()
+                index += 1
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            match = ConfParser._FUNCTION.match(stripped)
+            if match is not None:
+                # the body isn't parsed, it ends with a '}' at column 0
+                while index < count and lines[index].rstrip() != "}":
+                    index += 1
+                if index == count:
+                    raise ValueError("{0}:{1}: unterminated function".format(filename, lineno))
+                index += 1
+                self._directives.append(
+                    ("python" if match.group("python") else "shell", match.group("name"), lineno))
+                continue
+            match = ConfParser._DEF.match(stripped)
+            if match is not None:
+                while index < count and (not lines[index].strip() or lines[index][0] in " \t"):
+                    index += 1
+                self._directives.append(("def", match.group("name"), lineno))
+                continue
+            match = ConfParser._ASSIGN.match(stripped)
+            if match is not None:
+                value = match.group("value")
+                if (match.group("op") == ":=" and match.group("flag") is None and
+                        match.group("override") is None):
+                    # immediate expansion sees only what was parsed so far,
+                    # the variable itself included
+                    name = match.group("var")
+                    value = self.expand(value.replace("${" + name + "}",
+                                                      self.getvar(name) or ""))
+                assign = ConfAssignment(match.group("var"), match.group("op"),
+                                        value,
+                                        flag=match.group("flag"),
+                                        override=match.group("override"),
+                                        exported=match.group("exp") is not None,
+                                        lineno=lineno)
+                self._assignments.append(assign)
+                self._by_var.setdefault(assign._var, []).append(assign)
+                continue
+            match = ConfParser._DIRECTIVE.match(stripped)
+            if match is not None:
+                self._directives.append(
+                    (match.group("keyword"), match.group("arg"), lineno))
+                continue
+            raise ValueError("{0}:{1}: unparsed line: {2}".format(filename, lineno, stripped))
+        return self._assignments
+    def parse_file(self, path):
+        """ Read the file at path in bulk and parse it.
+        """
+        with open(path, 'r') as conf_fd:
+            return self.parse(conf_fd.read(), filename=path)
+    def _evaluate(self, name):
+        """ Apply the assignments to name, returning the unexpanded value.
+        """
+        value = self._variables.get(name)
+        weak = None
+        appends = []
+        removes = []
+        for assign in self._by_var.get(name, []):
+            if assign._flag is not None:
+                continue
+            op = assign._op
+            if assign._override == "append":
+                appends.append((False, assign._value))
+            elif assign._override == "prepend":
+                appends.append((True, assign._value))
+            elif assign._override == "remove":
+                removes.append(assign._value)
+            elif op in ("=", ":="):
+                # ':=' was expanded when it was parsed
+                value = assign._value
+            elif op == "?=":
+                if value is None:
+                    value = assign._value
+            elif op == "??=":
+                weak = assign._value
+            elif op == "+=":
+                value = "{0} {1}".format(value or "", assign._value)
+            elif op == "=+":
+                value = "{0} {1}".format(assign._value, value or "")
+            elif op == ".=":
+                value = (value or "") + assign._value
+            elif op == "=.":
+                value = assign._value + (value or "")
+        if value is None:
+            value = weak
+        if value is None and not appends:
+            return None
+        value = value or ""
+        for prepend, text in appends:
+            value = text + value if prepend else value + text
+        if removes:
+            drop = set()
+            for text in removes:
+                drop.update(self.expand(text).split())
+            value = " ".join(item for item in self.expand(value, set([name])).split()
+                             if item not in drop)
+        return value
+    def expand(self, value, _seen=None):
+        """ Expand ${VAR} references in value.
+
+        References to unknown variables and inline python are left as is.
+        """
+        if "${" not in value:
+            return value
+        seen = _seen or set()
+        def replace(match):
+            name = match.group(1)
+            if name in seen:
+                raise ValueError("recursive expansion of {0}".format(name))
+            found = self._evaluate(name)
+            if found is None:
+                return match.group(0)
+            return self.expand(found, seen | set([name]))
+        return ConfParser._EXPAND.sub(replace, value)
+    def getvar(self, name, expand=True):
+        """ Return the value of variable name, None if it was never set.
+
+        name: Name of the variable.
+        expand: Expand ${VAR} references in the value.
+        """
+        value = self._evaluate(name)
+        if value is None or not expand:
+            return value
+        return self.expand(value, set([name]))
+    def getvarflag(self, name, flag):
+        """ Return the value of flag on variable name, None if unset.
+        """
+        value = None
+        for assign in self._by_var.get(name, []):
+            if assign._flag == flag:
+                value = assign._value
+        return value
+    def variables(self):
+        """ Names of all variables assigned in the parsed files.
+        """
+        return [name for name in self._by_var
+                if any(assign._flag is None for assign in self._by_var[name])]
@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+
+from file_lock import FileLock
+
+class FetchHistory(object):
+    """ Durations of past operations on each repo, kept in a JSON file.
+
+    Durations are recorded per URL and operation ('clone', 'update', ...)
+    as a moving average so a single slow run doesn't dominate. RepoFetcher
+    uses them to start the repos expected to take longest first, so a big
+    repo listed last in the manifest doesn't become the critical path.
+    """
+    VERSION = 1
+    # weight of the newest sample in the moving average
+    WEIGHT = 0.5
+
+    def __init__(self, path):
+        """ Initialize FetchHistory, loading the history file if it exists.
+
+        path: Path of the JSON history file.
+        """
+        self._path = path
+        self._durations = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as history_fd:
+                    data = json.load(history_fd)
+                if data.get("version") == FetchHistory.VERSION:
+                    self._durations = data.get("durations", {})
+            except (ValueError, AttributeError):
+                self._durations = {}
+    def estimate(self, url, op):
+        """ Expected seconds for operation op on the repo at url, None if it
+            was never recorded.
+        """
+        with self._lock:
+            return self._durations.get(url, {}).get(op)
+    def record(self, url, op, seconds):
+        """ Add a measured duration of operation op on the repo at url.
+        """
+        with self._lock:
+            ops = self._durations.setdefault(url, {})
+            if op in ops:
+                seconds = (1 - FetchHistory.WEIGHT) * ops[op] + FetchHistory.WEIGHT * seconds
+            ops[op] = seconds
+            self._dirty = True
+    def order(self, work):
+        """ Indices of work ordered longest expected duration first.
+
+        work: List of (url, operation) tuples.
+        Work without history comes first since it's most likely a repo new
+        to this build. Ties keep their original order.
+        """
+        estimates = [self.estimate(url, op) for url, op in work]
+        def key(index):
+            return (estimates[index] is not None, -(estimates[index] or 0))
+        return sorted(range(len(work)), key=key)
+    def save(self):
+        """ Write the history file if anything changed, merging with what
+            other processes recorded since it was loaded.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            durations = dict((url, dict(ops)) for url, ops in self._durations.items())
+            self._dirty = False
+        history_dir = os.path.dirname(os.path.abspath(self._path))
+        if not os.path.isdir(history_dir):
+            os.makedirs(history_dir)
+        with FileLock(self._path + ".lock"):
+            merged = FetchHistory(self._path)._durations
+            for url, ops in durations.items():
+                merged.setdefault(url, {}).update(ops)
+            tmp_file = self._path + ".tmp"
+            with open(tmp_file, 'w') as history_fd:
+                json.dump({"version": FetchHistory.VERSION, "durations": merged},
+                          history_fd, indent=4, sort_keys=True)
+            os.rename(tmp_file, self._path)
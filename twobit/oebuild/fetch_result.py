@@ -0,0 +1,41 @@
+from repo import Repo
+
+class FetchResult(object):
+    """ Outcome of the git operations performed on a single Repo.
+    """
+    def __init__(self, name, rc=0, error=None, output=None, status=None,
+                 touched=None):
+        """ Initialize FetchResult.
+
+        name: Name of the Repo the result belongs to.
+        rc: Exit code of the first git command that failed, 0 on success.
+        error: Message from an exception raised while processing the repo.
+        output: Output captured from git, None if it went to the terminal.
+        status: What was done to the repo: 'cloned', 'updated',
+                'fast-forwarded', 'reset' or 'skipped' when it was already
+                in the requested state. 'cancelled' when it was stopped
+                because another repo failed.
+        touched: List of files rewritten in the work tree, None if not
+                 tracked for the operation.
+        """
+        self._name = name
+        self._rc = rc
+        self._error = error
+        self._output = output
+        self._status = status
+        self._touched = touched
+    def ok(self):
+        """ True if every operation on the repo succeeded.
+        """
+        return self._rc == 0 and self._error is None
+    def __str__(self):
+        """ Create a one line summary of the result.
+        """
+        if self._error is not None:
+            return "{0}: error: {1}".format(self._name, self._error)
+        if self._rc != 0:
+            return "{0}: failed (exit code {1})".format(self._name, self._rc)
+        line = "{0}: {1}".format(self._name, self._status or "ok")
+        if self._touched:
+            line += " ({0})".format(Repo.touched_summary(self._touched))
+        return line
@@ -0,0 +1,34 @@
+import fcntl
+import os
+
+class FileLock(object):
+    """ Exclusive advisory lock on a file, usable as a context manager.
+
+    The lock is taken with flock so it serializes threads in this process as
+    well as other processes working on the same path, e.g. two builds set up
+    concurrently in different TOPDIRs.
+    """
+    def __init__(self, path):
+        """ Initialize FileLock.
+
+        path: Path to the lock file. It is created if it doesn't exist.
+        """
+        self._path = path
+        self._fd = None
+    def acquire(self):
+        """ Block until the lock is held.
+        """
+        self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+    def release(self):
+        """ Release the lock.
+        """
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+    def __enter__(self):
+        self.acquire()
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
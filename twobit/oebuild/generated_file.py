@@ -0,0 +1,71 @@
+import hashlib
+import os
+import tempfile
+
+class GeneratedFile(object):
+    """ A file rendered in memory and only written when its content changes.
+
+    bitbake keys its parse cache on the mtime of the conf files, so
+    rewriting local.conf or bblayers.conf with the same content makes the
+    next build parse every recipe again. The content is compared by hash
+    with the file on disk and a changed file is replaced atomically: it's
+    written to a temporary file in the same directory and renamed over the
+    old one, so an interrupted setup never leaves a truncated file behind.
+    """
+    def __init__(self, path, mode=None):
+        """ Initialize GeneratedFile.
+
+        path: Path of the file.
+        mode: Optional permission bits of the file.
+        """
+        self._path = path
+        self._mode = mode
+    @staticmethod
+    def digest(data):
+        """ SHA256 of the string data.
+        """
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+    def current(self):
+        """ SHA256 of the file on disk, None if it doesn't exist.
+        """
+        try:
+            with open(self._path, 'rb') as current_fd:
+                return GeneratedFile.digest(current_fd.read())
+        except IOError:
+            return None
+    def write(self, content):
+        """ Replace the file with content unless it already holds it.
+
+        returns True if the file was written, False if it was left alone.
+        """
+        if self.current() == GeneratedFile.digest(content):
+            if self._mode is not None and os.stat(self._path).st_mode & 0o7777 != self._mode:
+                os.chmod(self._path, self._mode)
+            return False
+        if not isinstance(content, bytes):
+            content = content.encode("utf-8")
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp_file = tempfile.mkstemp(prefix="." + os.path.basename(self._path) + ".",
+                                        dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as tmp_fd:
+                tmp_fd.write(content)
+                tmp_fd.flush()
+                os.fsync(tmp_fd.fileno())
+            if self._mode is not None:
+                mode = self._mode
+            elif os.path.exists(self._path):
+                mode = os.stat(self._path).st_mode & 0o7777
+            else:
+                # mkstemp creates 0600, use what open() would have
+                umask = os.umask(0)
+                os.umask(umask)
+                mode = 0o666 & ~umask
+            os.chmod(tmp_file, mode)
+            os.rename(tmp_file, self._path)
+        except (IOError, OSError):
+            os.unlink(tmp_file)
+            raise
+        return True
@@ -0,0 +1,196 @@
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from process_loop import ProcessJob
+from retry_policy import RetryPolicy
+from tracer import Tracer
+
+class GitRunner(object):
+    """ Run git commands on behalf of a Repo object.
+
+    By default git inherits our stdout / stderr so progress goes straight to
+    the terminal. When an 'out' file object is provided all messages and git
+    output are written there instead so that concurrent operations on
+    different repos don't interleave their output. When a Tracer is provided
+    every git command is recorded with its wall time and exit code. When a
+    ProcessLoop is provided git is run by the loop thread instead of being
+    waited for in the calling thread. A RetryPolicy adds timeouts, which
+    need a loop, and retries of network operations that failed in a
+    transient way.
+    """
+    def __init__(self, out=None, tracer=None, name=None, loop=None, policy=None):
+        """ Initialize GitRunner.
+
+        out: Optional file object (must have a fileno unless there's a loop)
+             where messages and output from git are written. Default is to
+             inherit stdout.
+        tracer: Optional Tracer recording each git command.
+        name: Name of the repo the commands are run for, used in the trace.
+        loop: Optional ProcessLoop running the git processes.
+        policy: Optional RetryPolicy.
+        """
+        if policy is not None and policy.has_timeouts() and loop is None:
+            raise ValueError("git timeouts require a ProcessLoop")
+        self._out = out
+        self._tracer = tracer
+        self._name = name
+        self._loop = loop
+        self._policy = policy
+    def message(self, msg):
+        """ Write a status message.
+        """
+        fd = self._out if self._out is not None else sys.stdout
+        print(msg, file=fd)
+        fd.flush()
+    @staticmethod
+    def operation(args):
+        """ The git subcommand in args, i.e. the first non option argument.
+        """
+        for arg in args:
+            if not arg.startswith('-'):
+                return arg
+        return None
+    def _traced(self, args, git_dir, run):
+        """ Call run, recording it with the tracer if there is one.
+
+        For network operations the growth of the object store in git_dir is
+        recorded as the number of bytes transferred.
+        """
+        if self._tracer is None:
+            return run()
+        op = GitRunner.operation(args)
+        before = None
+        if git_dir is not None and op in RetryPolicy.NETWORK:
+            before = Tracer.object_bytes(git_dir)
+        start = time.time()
+        result = run()
+        duration = time.time() - start
+        nbytes = None
+        if before is not None:
+            nbytes = Tracer.object_bytes(git_dir) - before
+        rc = result[0]
+        self._tracer.record(self._name, op, start, duration, rc,
+                            nbytes=nbytes, args=['git'] + args)
+        return result
+    def _retried(self, args, git_dir, run):
+        """ Call run(timeout) as the policy says: with the timeout of the git
+            subcommand, retrying network operations that failed in a
+            transient way after a delay.
+
+        run returns a tuple (exit code, stdout, stderr, timed out), stderr
+        is the tail of what git wrote there or None if it wasn't kept. Every
+        attempt is traced separately.
+        """
+        op = GitRunner.operation(args)
+        timeout = None
+        if self._policy is not None:
+            timeout = self._policy.timeout(op)
+        attempt = 0
+        while True:
+            result = self._traced(args, git_dir, lambda: run(timeout))
+            rc, _, stderr, timed_out = result
+            if (rc == 0 or self._policy is None or
+                    not self._policy.retry(op, attempt, rc, stderr, timed_out)):
+                return result
+            if self._loop is not None and self._loop.cancelled():
+                return result
+            delay = self._policy.delay(attempt)
+            attempt += 1
+            self.message("git {0} failed with exit code {1}, retry {2} of {3} in {4:g} seconds".format(
+                op, rc, attempt, self._policy.retries(), delay))
+            time.sleep(delay)
+    def _keeps_stderr(self, args):
+        """ True if the stderr of git is needed to decide on a retry.
+
+        Without a loop stderr is only piped then, git shows progress only
+        when stderr is a terminal.
+        """
+        return (self._policy is not None and self._policy.retries() > 0 and
+                GitRunner.operation(args) in RetryPolicy.NETWORK)
+    def _tee(self, pipe, tail):
+        """ Copy the stderr of git from pipe to out as it arrives, keeping
+            its last ProcessJob.STDERR_TAIL bytes in the list tail.
+        """
+        fd = self._out if self._out is not None else sys.stderr
+        while True:
+            data = os.read(pipe.fileno(), 65536)
+            if not data:
+                break
+            fd.write(data.decode("utf-8", "replace"))
+            fd.flush()
+            tail[0] = (tail[0] + data)[-ProcessJob.STDERR_TAIL:]
+        pipe.close()
+    def _run(self, args, timeout, capture):
+        """ Run git once, from the loop if there is one.
+
+        returns a tuple (exit code, stdout, stderr, timed out), stdout is
+        None unless captured.
+        """
+        if self._loop is not None:
+            job = self._loop.submit(['git'] + args, out=self._out,
+                                    capture=capture, timeout=timeout,
+                                    name=self._name)
+            rc, stdout = job.wait()
+            return rc, stdout, job.stderr(), job.timed_out()
+        stdout = subprocess.PIPE if capture else self._out
+        if not self._keeps_stderr(args):
+            proc = subprocess.Popen(['git'] + args, stdout=stdout,
+                                    stderr=self._out, shell=False)
+            output = proc.communicate()[0]
+            return (proc.returncode, output.decode("utf-8") if capture else None,
+                    None, False)
+        proc = subprocess.Popen(['git'] + args, stdout=stdout,
+                                stderr=subprocess.PIPE, shell=False)
+        tail = [b""]
+        tee = threading.Thread(target=self._tee, args=(proc.stderr, tail))
+        tee.start()
+        output = proc.stdout.read() if capture else None
+        tee.join()
+        proc.wait()
+        return (proc.returncode, output.decode("utf-8") if capture else None,
+                tail[0].decode("utf-8", "replace"), False)
+    def call(self, args, git_dir=None):
+        """ Run git with the parameter arguments and return its exit code.
+
+        args: List of arguments passed to git.
+        git_dir: The git directory the command works on, used to measure the
+                 bytes transferred when tracing.
+        """
+        return self._retried(args, git_dir,
+                             lambda timeout: self._run(args, timeout, False))[0]
+    def output(self, args, git_dir=None):
+        """ Run git and capture its stdout.
+
+        args: List of arguments passed to git.
+        returns a tuple (exit code, stdout)
+        """
+        return self._retried(args, git_dir,
+                             lambda timeout: self._run(args, timeout, True))[:2]
+    @staticmethod
+    def tree_args(work_tree):
+        """ Arguments pointing git at the repo in work_tree.
+        """
+        return [
+            '--git-dir={0}'.format(os.path.join(work_tree, '.git')),
+            '--work-tree={0}'.format(work_tree)
+        ]
+    def call_tree(self, work_tree, args):
+        """ Run git against the repo in work_tree and return its exit code.
+
+        work_tree: Path to the work tree of a git repo.
+        args: List of arguments passed to git.
+        """
+        return self.call(GitRunner.tree_args(work_tree) + args,
+                         git_dir=os.path.join(work_tree, '.git'))
+    def output_tree(self, work_tree, args):
+        """ Run git against the repo in work_tree and capture its stdout.
+
+        returns a tuple (exit code, stdout)
+        """
+        return self.output(GitRunner.tree_args(work_tree) + args,
+                           git_dir=os.path.join(work_tree, '.git'))
@@ -0,0 +1,176 @@
+import os
+import re
+import subprocess
+import threading
+
+from work_pool import WorkPool
+
+class GitState(object):
+    """ Collect the url, branch and revision of local git repos.
+
+    The state is read directly from HEAD, the loose refs, packed-refs and the
+    config file in the git directory. git is only run for repos that use a
+    layout we don't understand (e.g. the reftable ref backend), and then only
+    once per repo.
+    """
+    _SECTION = re.compile(r'^\[\s*([^\s\]"]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]')
+    _SHA = re.compile(r'^[0-9a-f]{40}([0-9a-f]{24})?$')
+    # file in the git dir of a worktree with a detached HEAD naming the
+    # branch it follows, written by Repo.worktree()
+    WORKTREE_BRANCH = "BUILD_OP_BRANCH"
+
+    def __init__(self):
+        self._spawns = 0
+        self._lock = threading.Lock()
+    def spawns(self):
+        """ Number of git processes run by this object so far.
+        """
+        return self._spawns
+    @staticmethod
+    def _read(path):
+        """ Read a small file, return None if it doesn't exist.
+        """
+        try:
+            with open(path, 'r') as fd:
+                return fd.read()
+        except IOError:
+            return None
+    @staticmethod
+    def git_dirs(git_dir):
+        """ Split git_dir into the per work tree and the common directory.
+
+        A '.git' file (worktrees, submodules) is followed to the directory it
+        points at. Worktrees keep HEAD in their own directory and share refs
+        and config with the main repo through 'commondir'.
+        returns a tuple (private_dir, common_dir)
+        """
+        if os.path.isfile(git_dir):
+            data = GitState._read(git_dir) or ""
+            if not data.startswith("gitdir:"):
+                raise EnvironmentError("{0} is not a git directory".format(git_dir))
+            git_dir = os.path.join(os.path.dirname(git_dir),
+                                   data[len("gitdir:"):].strip())
+        git_dir = os.path.normpath(git_dir)
+        common = GitState._read(os.path.join(git_dir, "commondir"))
+        if common is None:
+            return git_dir, git_dir
+        return git_dir, os.path.normpath(os.path.join(git_dir, common.strip()))
+    @staticmethod
+    def parse_config(data):
+        """ Parse git config file content into a dict.
+
+        Keys are 'section.subsection.name' with section and name lower
+        cased as git does. Later values override earlier ones.
+        """
+        config = {}
+        section = None
+        for line in data.splitlines():
+            line = line.strip()
+            if not line or line[0] in "#;":
+                continue
+            if line.startswith("["):
+                match = GitState._SECTION.match(line)
+                if match is None:
+                    raise ValueError("bad config section: {0}".format(line))
+                section = match.group(1).lower()
+                if match.group(2) is not None:
+                    section += "." + re.sub(r'\\(.)', r'\1', match.group(2))
+                continue
+            if section is None:
+                raise ValueError("config entry outside of section: {0}".format(line))
+            name, _, value = line.partition("=")
+            value = value.strip()
+            if value.startswith('"') and value.endswith('"') and len(value) > 1:
+                value = value[1:-1]
+            config["{0}.{1}".format(section, name.strip().lower())] = value
+        return config
+    @staticmethod
+    def resolve_ref(git_dir, common_dir, ref):
+        """ Resolve a ref name to an object id without running git.
+
+        returns None if the ref can't be found.
+        """
+        for _ in range(5):
+            data = None
+            for base in (git_dir, common_dir):
+                data = GitState._read(os.path.join(base, ref))
+                if data is not None:
+                    break
+            if data is None:
+                break
+            data = data.strip()
+            if not data.startswith("ref:"):
+                return data
+            ref = data[len("ref:"):].strip()
+        packed = GitState._read(os.path.join(common_dir, "packed-refs")) or ""
+        for line in packed.splitlines():
+            if not line or line[0] in "#^":
+                continue
+            sha, _, name = line.partition(" ")
+            if name == ref:
+                return sha
+        return None
+    def _git(self, args):
+        """ Run git and return its output, counting the spawn.
+        """
+        with self._lock:
+            self._spawns += 1
+        return subprocess.check_output(['git'] + args).decode("utf-8")
+    def _state_from_git(self, git_dir, config):
+        """ Fall back to asking git for the revision, branch and upstream.
+
+        Raises EnvironmentError if git can't tell, e.g. for a HEAD without
+        a commit in a clone of an empty repo.
+        """
+        try:
+            out = self._git(
+                ["--git-dir", git_dir, "rev-parse", "HEAD", "--abbrev-ref", "HEAD",
+                 "--symbolic-full-name", "@{u}"]
+            ).split()
+        except subprocess.CalledProcessError:
+            raise EnvironmentError("Cannot resolve HEAD of {0}".format(git_dir))
+        if len(out) != 3:
+            raise EnvironmentError("Cannot resolve HEAD of {0}".format(git_dir))
+        rev, branch, upstream = out
+        remote = upstream.split("/")[0]
+        return config.get("remote." + remote + ".url"), branch, rev
+    def state(self, git_dir):
+        """ Collect the url, branch and revision of the parameter git repo
+
+        git_dir: The file path to the .git directory (or file) of a clone.
+        returns a tripple (url, branch, rev). A detached HEAD has branch
+        'HEAD', unless it's a worktree recording its branch, and the url of
+        the 'origin' remote.
+        Raises EnvironmentError if HEAD can't be resolved.
+        """
+        private, common = GitState.git_dirs(git_dir)
+        config = GitState.parse_config(
+            GitState._read(os.path.join(common, "config")) or "")
+        if "extensions.refstorage" in config:
+            return self._state_from_git(git_dir, config)
+        head = GitState._read(os.path.join(private, "HEAD"))
+        if head is None:
+            raise EnvironmentError("{0} is not a git directory".format(git_dir))
+        head = head.strip()
+        if head.startswith("ref:"):
+            ref = head[len("ref:"):].strip()
+            rev = GitState.resolve_ref(private, common, ref)
+            branch = ref[len("refs/heads/"):] if ref.startswith("refs/heads/") else ref
+        else:
+            rev, branch = head, "HEAD"
+            recorded = GitState._read(os.path.join(private, GitState.WORKTREE_BRANCH))
+            if recorded:
+                branch = recorded.strip()
+        if rev is None or not GitState._SHA.match(rev):
+            return self._state_from_git(git_dir, config)
+        remote = config.get("branch." + branch + ".remote", "origin")
+        url = config.get("remote." + remote + ".url")
+        return url, branch, rev
+    def collect(self, git_dirs, jobs=1):
+        """ Collect the state of many repos concurrently.
+
+        git_dirs: List of paths to .git directories.
+        jobs: Number of repos processed concurrently.
+        returns a list of (url, branch, rev) tripples in git_dirs order.
+        """
+        return WorkPool(jobs).map(self.state, git_dirs)
@@ -0,0 +1,140 @@
+import json
+import multiprocessing
+import os
+
+class HostParallelism(object):
+    """ Derive BB_NUMBER_THREADS, PARALLEL_MAKE and BB_NUMBER_PARSE_THREADS
+        from the CPUs and memory of the build host.
+
+    Each setting starts at the number of CPUs and is capped by the memory:
+    a profile gives the memory in GiB a bitbake task, a make job and a
+    recipe parser need. make jobs get the memory left once every bitbake
+    task has its share: few tasks compile at full width at the same
+    moment, so assuming all of them do would leave large hosts idle.
+    Profiles are kept per build type in a JSON file mapping build type
+    names, or 'default', to the keys of DEFAULT_PROFILE.
+    """
+    DEFAULT_PROFILE = {
+        "mem_per_task": 1.0,
+        "mem_per_make_job": 1.0,
+        "mem_per_parser": 0.25,
+        "max_threads": None,
+    }
+
+    def __init__(self, cpus=None, memory=None, profile=None, profile_name="default"):
+        """ Initialize HostParallelism.
+
+        cpus: Number of CPUs, detected if None.
+        memory: Memory in GiB, detected if None.
+        profile: Dict overriding keys of DEFAULT_PROFILE. The memory keys
+                 take numbers, 0 for no limit, and max_threads a positive
+                 integer or None.
+        profile_name: Name of the profile, shown in the generated comment
+                      and in errors.
+        """
+        self._cpus = cpus if cpus is not None else HostParallelism.detect_cpus()
+        self._memory = memory if memory is not None else HostParallelism.detect_memory()
+        self._profile = dict(HostParallelism.DEFAULT_PROFILE)
+        for key, value in (profile or {}).items():
+            if key not in HostParallelism.DEFAULT_PROFILE:
+                raise ValueError("unknown parallelism profile key: {0}".format(key))
+            if key == "max_threads":
+                valid = value is None or (isinstance(value, int) and
+                                          not isinstance(value, bool) and value >= 1)
+                expected = "a positive integer or null"
+            else:
+                valid = (isinstance(value, (int, float)) and
+                         not isinstance(value, bool) and value >= 0)
+                expected = "a number of GiB"
+            if not valid:
+                raise ValueError("parallelism profile '{0}': {1} must be {2}, got {3}".format(
+                    profile_name, key, expected, json.dumps(value)))
+            self._profile[key] = value
+        self._profile_name = profile_name
+        if self._cpus < 1:
+            raise ValueError("cpus must be at least 1, got {0}".format(self._cpus))
+    @staticmethod
+    def detect_cpus():
+        """ Number of CPUs this process may run on.
+        """
+        if hasattr(os, "sched_getaffinity"):
+            return len(os.sched_getaffinity(0))
+        return multiprocessing.cpu_count()
+    @staticmethod
+    def detect_memory(meminfo="/proc/meminfo"):
+        """ Total memory in GiB, None if it can't be read.
+        """
+        try:
+            with open(meminfo, 'r') as meminfo_fd:
+                for line in meminfo_fd:
+                    if line.startswith("MemTotal:"):
+                        return int(line.split()[1]) / float(1024 * 1024)
+        except (IOError, ValueError, IndexError):
+            pass
+        return None
+    @staticmethod
+    def load_profile(path, build_type):
+        """ Read the profile for build_type from the JSON file at path.
+
+        The 'default' entry applies to every build type and is overridden
+        by the entry of the build type itself.
+        returns a tuple (name, profile dict). A missing file gives the
+        built in defaults.
+        """
+        if path is None or not os.path.exists(path):
+            return "default", {}
+        try:
+            with open(path, 'r') as profile_fd:
+                profiles = json.load(profile_fd)
+        except ValueError as e:
+            raise ValueError("{0}: {1}".format(path, e))
+        if not isinstance(profiles, dict):
+            raise ValueError("{0}: expected an object of profiles".format(path))
+        for name in ("default", build_type):
+            if not isinstance(profiles.get(name, {}), dict):
+                raise ValueError("{0}: profile '{1}' is not an object".format(path, name))
+        profile = dict(profiles.get("default", {}))
+        profile.update(profiles.get(build_type, {}))
+        return (build_type if build_type in profiles else "default"), profile
+    def _limit(self, mem_per_unit, reserved=0):
+        """ CPUs capped by how many units fit in memory and max_threads.
+
+        reserved: Memory in GiB already taken by something else.
+        """
+        value = self._cpus
+        if self._memory is not None and mem_per_unit:
+            value = min(value, int((self._memory - reserved) / mem_per_unit))
+        if self._profile["max_threads"] is not None:
+            value = min(value, self._profile["max_threads"])
+        return max(1, value)
+    def settings(self):
+        """ List of (variable, value) tuples for local.conf.
+        """
+        threads = self._limit(self._profile["mem_per_task"])
+        return [
+            ("BB_NUMBER_THREADS", str(threads)),
+            ("PARALLEL_MAKE", "-j {0}".format(
+                self._limit(self._profile["mem_per_make_job"],
+                            reserved=threads * self._profile["mem_per_task"]))),
+            ("BB_NUMBER_PARSE_THREADS", str(self._limit(self._profile["mem_per_parser"]))),
+        ]
+    def conf(self):
+        """ local.conf fragment assigning the settings, with a comment
+            explaining where the values come from.
+        """
+        memory = "unknown memory"
+        if self._memory is not None:
+            memory = "{0:.1f} GiB memory".format(self._memory)
+        lines = [
+            "# Parallelism derived by build_op.py from the build host:",
+            "# {0} CPUs, {1}, profile '{2}' ({3} GiB per bitbake task,".format(
+                self._cpus, memory, self._profile_name, self._profile["mem_per_task"]),
+            "# {0} GiB per make job, {1} GiB per parser{2}).".format(
+                self._profile["mem_per_make_job"], self._profile["mem_per_parser"],
+                "" if self._profile["max_threads"] is None
+                else ", at most {0}".format(self._profile["max_threads"])),
+            "# make jobs use the memory left after BB_NUMBER_THREADS tasks.",
+        ]
+        for name, value in self.settings():
+            lines.append('{0} = "{1}"'.format(name, value))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,210 @@
+import os
+import re
+
+from conf_parser import ConfParser
+
+class LayerGraph(object):
+    """ Dependencies between the layers of a build, read from their
+        conf/layer.conf.
+
+    Every layer names its collections in BBFILE_COLLECTIONS and, per
+    collection, the collections it needs (LAYERDEPENDS) or would like
+    (LAYERRECOMMENDS), its BBFILE_PRIORITY and the release series it works
+    with (LAYERSERIES_COMPAT). The core layer lists the series it belongs
+    to in LAYERSERIES_CORENAMES. Layers are ordered so every layer comes
+    after the layers it depends on, keeping the given order otherwise, and
+    layers bitbake would reject or never use can be dropped before bitbake
+    parses them. Layers without a conf/layer.conf, e.g. not fetched yet,
+    are kept where they are.
+    """
+    _VERSION = re.compile(r"\([^)]*\)")
+
+    def __init__(self, top_dir, layers):
+        """ Initialize LayerGraph, reading the conf/layer.conf of each layer.
+
+        top_dir: TOPDIR, the layer paths are relative to it.
+        layers: List of layer paths in the order they were given.
+        """
+        self._top_dir = top_dir
+        self._layers = list(layers)
+        self._info = {}
+        self._warnings = []
+        self._corenames = None
+        for layer in self._layers:
+            self._load(layer)
+        self._by_collection = {}
+        for layer in self._layers:
+            for collection in self.collections(layer):
+                if collection in self._by_collection:
+                    self._warnings.append("collection {0} of {1} is already provided "
+                                          "by {2}".format(collection, layer,
+                                                          self._by_collection[collection]))
+                    continue
+                self._by_collection[collection] = layer
+    @staticmethod
+    def _names(value):
+        """ Collection names from a LAYERDEPENDS style value, without the
+            version constraints.
+        """
+        return LayerGraph._VERSION.sub(" ", value or "").split()
+    def _load(self, layer):
+        layer_dir = os.path.normpath(os.path.join(self._top_dir, layer))
+        conf_file = os.path.join(layer_dir, "conf", "layer.conf")
+        if not os.path.isfile(conf_file):
+            return
+        conf = ConfParser({"LAYERDIR": layer_dir, "TOPDIR": self._top_dir})
+        try:
+            conf.parse_file(conf_file)
+        except ValueError as e:
+            # keep the variables parsed before the error, bitbake would
+            # stop at it too but the layer still exists
+            self._warnings.append(str(e))
+        info = {"collections": (conf.getvar("BBFILE_COLLECTIONS") or "").split(),
+                "depends": [], "recommends": [], "priority": {}, "compat": None}
+        for collection in info["collections"]:
+            info["depends"] += LayerGraph._names(conf.getvar("LAYERDEPENDS_" + collection))
+            info["recommends"] += LayerGraph._names(conf.getvar("LAYERRECOMMENDS_" + collection))
+            priority = conf.getvar("BBFILE_PRIORITY_" + collection)
+            try:
+                info["priority"][collection] = int(priority) if priority else None
+            except ValueError:
+                self._warnings.append("{0}: BBFILE_PRIORITY_{1} is not a number: {2}".format(
+                    conf_file, collection, priority))
+                info["priority"][collection] = None
+            compat = conf.getvar("LAYERSERIES_COMPAT_" + collection)
+            if compat is not None:
+                info["compat"] = (info["compat"] or []) + compat.split()
+        corenames = conf.getvar("LAYERSERIES_CORENAMES")
+        if corenames is not None:
+            self._corenames = corenames.split()
+        self._info[layer] = info
+    def collections(self, layer):
+        """ Collections of layer, empty if its layer.conf wasn't found.
+        """
+        return self._info.get(layer, {}).get("collections", [])
+    def priority(self, layer):
+        """ Dict mapping the collections of layer to their BBFILE_PRIORITY,
+            None for unset.
+        """
+        return dict(self._info.get(layer, {}).get("priority", {}))
+    def dependencies(self, layer, recommends=True):
+        """ Layers providing the collections layer depends on.
+
+        recommends: Include the layers of LAYERRECOMMENDS.
+        """
+        info = self._info.get(layer)
+        if info is None:
+            return []
+        names = info["depends"] + (info["recommends"] if recommends else [])
+        found = []
+        for name in names:
+            dependency = self._by_collection.get(name)
+            if dependency is not None and dependency != layer and dependency not in found:
+                found.append(dependency)
+        return found
+    def missing(self, layer):
+        """ Collections in LAYERDEPENDS of layer no layer provides.
+        """
+        info = self._info.get(layer)
+        if info is None:
+            return []
+        return [name for name in info["depends"] if name not in self._by_collection]
+    def compatible(self, layer):
+        """ False if LAYERSERIES_COMPAT of layer has none of the series of
+            the core layer. Unknown compatibility counts as compatible.
+        """
+        info = self._info.get(layer)
+        if info is None or info["compat"] is None or self._corenames is None:
+            return True
+        return bool(set(info["compat"]) & set(self._corenames))
+    def order(self, layers=None):
+        """ Sort layers, all layers by default, so each comes after the
+            layers it depends on. Otherwise the given order is kept.
+        """
+        remaining = list(self._layers if layers is None else layers)
+        placed = []
+        while remaining:
+            for layer in remaining:
+                if not [dependency for dependency in self.dependencies(layer)
+                        if dependency in remaining]:
+                    break
+            else:
+                self._warnings.append("circular layer dependencies between {0}".format(
+                    ", ".join(remaining)))
+                placed += remaining
+                break
+            remaining.remove(layer)
+            placed.append(layer)
+        return placed
+    def reachable(self, roots):
+        """ Layers reachable from roots through LAYERDEPENDS and
+            LAYERRECOMMENDS.
+
+        roots: Collection names or layer paths.
+        """
+        pending = []
+        for root in roots:
+            layer = self._by_collection.get(root)
+            if layer is None and root in self._layers:
+                layer = root
+            if layer is None:
+                self._warnings.append("layer root {0} is not a layer or collection".format(root))
+            else:
+                pending.append(layer)
+        found = set()
+        while pending:
+            layer = pending.pop()
+            if layer not in found:
+                found.add(layer)
+                pending.extend(self.dependencies(layer))
+        return found
+    def layers(self, roots=None, prune=False):
+        """ The layers for bblayers.conf, in dependency order.
+
+        Layers incompatible with the core layer, and with roots the layers
+        none of the roots need, are reported by warnings() and dropped when
+        prune is set, together with the layers depending on a dropped one.
+        Layers without a layer.conf are always kept.
+        roots: Optional collection names or layer paths the build needs.
+        prune: Drop the layers instead of only warning about them.
+        """
+        dropped = {}
+        for layer in self._layers:
+            if self._corenames is not None and layer in self._info and \
+                    self._info[layer]["compat"] is None:
+                self._warnings.append("{0} doesn't set LAYERSERIES_COMPAT".format(layer))
+            if not self.compatible(layer):
+                dropped[layer] = "is not compatible with {0}, only with {1}".format(
+                    " ".join(self._corenames), " ".join(self._info[layer]["compat"]))
+            for name in self.missing(layer):
+                self._warnings.append("{0} depends on {1}, which no layer provides".format(layer, name))
+        if roots:
+            needed = self.reachable(roots)
+            for layer in self._layers:
+                if layer in self._info and layer not in needed and layer not in dropped:
+                    dropped[layer] = "is not needed by {0}".format(" ".join(roots))
+        if prune:
+            # a layer can't be used without the layers it depends on
+            changed = True
+            while changed:
+                changed = False
+                for layer in self._layers:
+                    if layer in dropped:
+                        continue
+                    for dependency in self.dependencies(layer, recommends=False):
+                        if dependency in dropped:
+                            dropped[layer] = "depends on {0}".format(dependency)
+                            changed = True
+                            break
+        for layer in self._layers:
+            if layer in dropped:
+                self._warnings.append("{0} {1}{2}".format(
+                    layer, dropped[layer], ", dropped" if prune else ""))
+        kept = self._layers
+        if prune:
+            kept = [layer for layer in self._layers if layer not in dropped]
+        return self.order(kept)
+    def warnings(self):
+        """ List of problems found, in the order they were found.
+        """
+        return list(self._warnings)
@@ -0,0 +1,67 @@
+import os
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+class LayerIndex(object):
+    """ Find the OE meta-layers in a repo, i.e. directories holding a
+        conf/layer.conf file.
+
+    Only directories that can hold layers are visited: the walk skips hidden
+    directories (.git) and the contents of layers (recipes-*, classes, conf,
+    ...), and stops at max_depth. Results aren't cached here, callers keep
+    them across runs in a StateCache together with the rest of the repo
+    state.
+    """
+    _SKIP = frozenset(["conf", "classes", "classes-global", "classes-recipe",
+                       "files", "lib", "scripts", "doc", "docs", "licenses",
+                       "wic"])
+
+    def __init__(self, max_depth=3):
+        """ Initialize LayerIndex.
+
+        max_depth: How many directories below the repo root to look for
+                   layers. 0 only checks the root itself.
+        """
+        self._max_depth = max_depth
+    @staticmethod
+    def _subdirs(path):
+        """ Names of the directories in path that may contain layers.
+        """
+        if scandir is not None:
+            names = [entry.name for entry in scandir(path)
+                     if entry.is_dir(follow_symlinks=False)]
+        else:
+            names = [name for name in os.listdir(path)
+                     if os.path.isdir(os.path.join(path, name))
+                     and not os.path.islink(os.path.join(path, name))]
+        return [name for name in names
+                if not name.startswith(".") and not name.startswith("recipes-")
+                and name not in LayerIndex._SKIP]
+    def layers(self, repo_root):
+        """ List the layers in repo_root as paths relative to it.
+
+        The layer at the root of the repo is returned as './'.
+        repo_root: Path to the work tree of the repo.
+        """
+        layers = []
+        pending = [("", 0)]
+        while pending:
+            rel, depth = pending.pop()
+            path = os.path.join(repo_root, rel)
+            if os.path.isfile(os.path.join(path, "conf", "layer.conf")):
+                layers.append(rel if rel else "./")
+            if depth < self._max_depth:
+                pending.extend((os.path.join(rel, name), depth + 1)
+                               for name in LayerIndex._subdirs(path))
+        return sorted(layers)
+    @staticmethod
+    def normalize(path):
+        """ Normalize a layer path for comparison.
+        """
+        return os.path.realpath(path)
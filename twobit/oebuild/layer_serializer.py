@@ -2,6 +2,8 @@ from __future__ import print_function
 
 import sys
 
+from repo import Repo
+
 class LayerSerializer:
     """ Class to serialize a collection of Repo objects into LAYERS form.
     """
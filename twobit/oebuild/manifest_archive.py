@@ -0,0 +1,176 @@
+import bz2
+import gzip
+import hashlib
+import io
+import os
+import stat
+import tarfile
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+class _CompressedWriter(object):
+    """ Minimal write only file object compressing into another file.
+    """
+    def __init__(self, fd, compressor):
+        self._fd = fd
+        self._compressor = compressor
+    def write(self, data):
+        self._fd.write(self._compressor.compress(data))
+    def close(self):
+        self._fd.write(self._compressor.flush())
+
+class _HashingReader(object):
+    """ Read only file object feeding everything read through a hash.
+    """
+    def __init__(self, fd, digest):
+        self._fd = fd
+        self._digest = digest
+    def read(self, size=-1):
+        data = self._fd.read(size)
+        self._digest.update(data)
+        return data
+
+class ManifestArchive(object):
+    """ Tarball holding the files needed to reproduce a build.
+
+    Files are streamed straight from their location on disk into the archive
+    under a common prefix directory. Owner, group and timestamps are fixed
+    and modes normalized so the same inputs always produce the same archive
+    bit for bit. Optionally a SHA256SUMS file listing the content hash of
+    every file is added at the end.
+    """
+    EXTENSIONS = {
+        "bz2": ".tar.bz2",
+        "gz": ".tar.gz",
+        "xz": ".tar.xz",
+        "zst": ".tar.zst",
+        "none": ".tar",
+    }
+
+    def __init__(self, prefix, compression="bz2", checksums=False, mtime=0):
+        """ Initialize ManifestArchive.
+
+        prefix: Name of the top level directory in the archive.
+        compression: One of the keys of EXTENSIONS. zst requires the
+                     zstandard module, xz the lzma module.
+        checksums: Add a SHA256SUMS file for the archived files.
+        mtime: Modification time recorded for every member.
+        """
+        if compression not in ManifestArchive.EXTENSIONS:
+            raise ValueError("unknown compression: {0}".format(compression))
+        if compression == "xz" and lzma is None:
+            raise ValueError("xz compression requires the lzma module")
+        if compression == "zst" and zstandard is None:
+            raise ValueError("zst compression requires the zstandard module")
+        self._prefix = prefix
+        self._compression = compression
+        self._checksums = checksums
+        self._mtime = mtime
+        self._members = []
+    @staticmethod
+    def split_name(name):
+        """ Split an archive file name into prefix and compression.
+
+        returns (name, None) if the name has no known extension.
+        """
+        for compression, extension in ManifestArchive.EXTENSIONS.items():
+            if name.endswith(extension):
+                return name[:-len(extension)], compression
+        return name, None
+    def file_name(self):
+        """ File name of the archive: the prefix plus the extension matching
+            the compression.
+        """
+        return self._prefix + ManifestArchive.EXTENSIONS[self._compression]
+    def add_file(self, src, arcname):
+        """ Add the file at src as arcname below the prefix directory.
+        """
+        self._members.append((arcname, src, None))
+    def add_data(self, data, arcname, executable=False):
+        """ Add a file with content data (bytes) as arcname below the prefix
+            directory.
+        """
+        self._members.append((arcname, None, (data, executable)))
+    def _info(self, name, size=0, executable=False, directory=False):
+        """ Create a TarInfo with all the variable metadata fixed.
+        """
+        info = tarfile.TarInfo(name)
+        info.mtime = self._mtime
+        info.uid = info.gid = 0
+        info.uname = info.gname = ""
+        if directory:
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o755
+        else:
+            info.size = size
+            info.mode = 0o755 if executable else 0o644
+        return info
+    def _open(self, fd):
+        """ Wrap fd in the selected compressor.
+        """
+        if self._compression == "gz":
+            return gzip.GzipFile(filename="", mode="wb", fileobj=fd,
+                                 mtime=self._mtime)
+        if self._compression == "bz2":
+            return _CompressedWriter(fd, bz2.BZ2Compressor())
+        if self._compression == "xz":
+            return _CompressedWriter(fd, lzma.LZMACompressor())
+        if self._compression == "zst":
+            return _CompressedWriter(fd, zstandard.ZstdCompressor().compressobj())
+        return None
+    def write(self, path):
+        """ Write the archive to path.
+        """
+        dirs = set()
+        sums = []
+        with open(path, 'wb') as raw_fd:
+            stream = self._open(raw_fd)
+            tar = tarfile.open(fileobj=stream or raw_fd, mode="w|",
+                               format=tarfile.GNU_FORMAT)
+            tar.addfile(self._info(self._prefix, directory=True))
+            for arcname, src, data in self._members:
+                # directories leading up to the member
+                parent = os.path.dirname(arcname)
+                missing = []
+                while parent and parent not in dirs:
+                    missing.insert(0, parent)
+                    dirs.add(parent)
+                    parent = os.path.dirname(parent)
+                for directory in missing:
+                    tar.addfile(self._info(os.path.join(self._prefix, directory),
+                                           directory=True))
+                digest = hashlib.sha256()
+                name = os.path.join(self._prefix, arcname)
+                if src is not None:
+                    mode = os.stat(src).st_mode
+                    with open(src, 'rb') as src_fd:
+                        tar.addfile(self._info(name, os.fstat(src_fd.fileno()).st_size,
+                                               bool(mode & stat.S_IXUSR)),
+                                    _HashingReader(src_fd, digest))
+                else:
+                    content, executable = data
+                    digest.update(content)
+                    tar.addfile(self._info(name, len(content), executable),
+                                io.BytesIO(content))
+                sums.append((arcname, digest.hexdigest()))
+            if self._checksums:
+                content = "".join("{0}  {1}\n".format(digest, arcname)
+                                  for arcname, digest in sorted(sums))
+                content = content.encode("utf-8")
+                tar.addfile(self._info(os.path.join(self._prefix, "SHA256SUMS"),
+                                       len(content)),
+                            io.BytesIO(content))
+            tar.close()
+            if stream is not None:
+                stream.close()
@@ -0,0 +1,118 @@
+import json
+import os
+
+from repo import Repo
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+class ManifestError(ValueError):
+    """ A LAYERS.json manifest that can't be used, with where the problem is.
+    """
+    def __init__(self, path, message, index=None, name=None, key=None):
+        """ Initialize ManifestError.
+
+        path: Path of the manifest file.
+        message: What is wrong.
+        index: Position of the offending repo in the manifest.
+        name: Name of the offending repo, if known.
+        key: The offending key of the repo.
+        """
+        location = path
+        if index is not None:
+            location += ": repo {0}".format(index)
+            if name is not None:
+                location += " ({0})".format(name)
+        if key is not None:
+            location += ": key '{0}'".format(key)
+        super(ManifestError, self).__init__("{0}: {1}".format(location, message))
+        self.path = path
+        self.index = index
+        self.name = name
+        self.key = key
+
+class ManifestLoader(object):
+    """ Load a LAYERS.json manifest into a list of Repo objects.
+
+    The file is decoded once and validated against SCHEMA before any Repo is
+    created: required and unknown keys, value types, and names or checkout
+    paths used by more than one repo are reported as ManifestError.
+    """
+    # key: (check, description)
+    SCHEMA = {
+        "name": (lambda v: isinstance(v, string_types) and v != "", "a non-empty string"),
+        "url": (lambda v: isinstance(v, string_types) and v != "", "a non-empty string"),
+        "branch": (lambda v: isinstance(v, string_types) and v != "", "a non-empty string"),
+        "revision": (lambda v: v is None or isinstance(v, string_types), "a string or null"),
+        "layers": (lambda v: v is None or (isinstance(v, list) and
+                                           all(isinstance(l, string_types) for l in v)),
+                   "a list of strings or null"),
+        "depth": (lambda v: v is None or (type(v) is int and v > 0),
+                  "a positive integer or null"),
+        "single-branch": (lambda v: type(v) is bool, "true or false"),
+        "filter": (lambda v: v is None or (isinstance(v, string_types) and v != ""),
+                   "a non-empty string or null"),
+    }
+    REQUIRED = ("name", "url")
+
+    def __init__(self, path):
+        """ Initialize ManifestLoader.
+
+        path: Path of the LAYERS.json file.
+        """
+        self._path = path
+    def validate(self, data):
+        """ Check decoded manifest data, raising ManifestError on problems.
+        """
+        if not isinstance(data, list):
+            raise ManifestError(self._path, "expected a list of repos")
+        names = {}
+        paths = {}
+        for index, entry in enumerate(data):
+            if not isinstance(entry, dict):
+                raise ManifestError(self._path, "expected an object", index=index)
+            name = entry.get("name")
+            if not isinstance(name, string_types):
+                name = None
+            for key in ManifestLoader.REQUIRED:
+                if key not in entry:
+                    raise ManifestError(self._path, "missing", index, name, key)
+            for key in sorted(entry):
+                if key not in ManifestLoader.SCHEMA:
+                    raise ManifestError(self._path, "unknown key", index, name, key)
+                check, description = ManifestLoader.SCHEMA[key]
+                if not check(entry[key]):
+                    raise ManifestError(self._path, "must be " + description,
+                                        index, name, key)
+            path = os.path.normpath(name)
+            if os.path.isabs(path) or path.split(os.sep)[0] == os.pardir:
+                raise ManifestError(self._path, "checkout path escapes the source directory",
+                                    index, name, "name")
+            if name in names:
+                raise ManifestError(self._path, "duplicate name, first used by repo {0}".format(names[name]),
+                                    index, name, "name")
+            if path in paths:
+                raise ManifestError(self._path, "duplicate checkout path, first used by repo {0}".format(paths[path]),
+                                    index, name, "name")
+            names[name] = index
+            paths[path] = index
+            layers = entry.get("layers") or []
+            if len(set(os.path.normpath(layer) for layer in layers)) != len(layers):
+                raise ManifestError(self._path, "duplicate layer", index, name, "layers")
+    def load(self):
+        """ Read, validate and decode the manifest.
+
+        returns a list of Repo objects in manifest order.
+        """
+        try:
+            with open(self._path, 'r') as repos_fd:
+                data = json.load(repos_fd)
+        except IOError as e:
+            raise ManifestError(self._path, e.strerror)
+        except ValueError as e:
+            # the json module reports the line and column of syntax errors
+            raise ManifestError(self._path, str(e))
+        self.validate(data)
+        return [Repo.repo_decode(entry) for entry in data]
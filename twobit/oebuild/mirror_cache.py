@@ -0,0 +1,78 @@
+import hashlib
+import os
+import threading
+
+from file_lock import FileLock
+
+class MirrorCache(object):
+    """ Directory of bare mirrors of remote repos keyed by URL.
+
+    Each URL is mirrored once and kept up to date at most once per
+    MirrorCache object. Repos are then cloned with --reference pointing at
+    the mirror so their objects are shared through git alternates instead of
+    being downloaded and stored again for every clone.
+    """
+    def __init__(self, cache_dir):
+        """ Initialize MirrorCache.
+
+        cache_dir: Directory holding the mirrors. Created if it doesn't exist.
+        """
+        self._cache_dir = os.path.abspath(cache_dir)
+        if not os.path.isdir(self._cache_dir):
+            os.makedirs(self._cache_dir)
+        self._synced = set()
+        self._synced_lock = threading.Lock()
+    @staticmethod
+    def key(url):
+        """ Name of the mirror directory for url.
+
+        The readable part comes from the last component of the url, the hash
+        keeps urls that share it apart.
+        """
+        name = os.path.basename(url.rstrip("/"))
+        if name.endswith(".git"):
+            name = name[:-len(".git")]
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        return "{0}-{1}.git".format(name, digest)
+    def path(self, url):
+        """ Path to the mirror of url.
+        """
+        return os.path.join(self._cache_dir, MirrorCache.key(url))
+    def lock(self, url):
+        """ FileLock serializing changes to the mirror of url across threads
+            and processes.
+        """
+        return FileLock(self.path(url) + ".lock")
+    def sync(self, url, runner):
+        """ Create or update the mirror of url and return its path.
+
+        The mirror is updated at most once per MirrorCache object no matter
+        how many repos share the url. Returns None if git fails, in which case
+        callers should clone from the url directly.
+
+        url: URL of the remote repo.
+        runner: GitRunner used to execute git.
+        """
+        mirror = self.path(url)
+        with self.lock(url):
+            with self._synced_lock:
+                if url in self._synced:
+                    return mirror
+            if not os.path.exists(mirror):
+                runner.message("mirroring {0} into {1}".format(url, mirror))
+                rc = runner.call(['clone', '--mirror', '--progress', url, mirror],
+                                 git_dir=mirror)
+                if rc == 0:
+                    # clones borrow objects from the mirror through
+                    # alternates, never let gc drop them
+                    rc = runner.call(['--git-dir={0}'.format(mirror), 'config',
+                                      'gc.pruneExpire', 'never'])
+            else:
+                runner.message("updating mirror {0}".format(mirror))
+                rc = runner.call(['--git-dir={0}'.format(mirror), 'remote',
+                                  'update', '--prune'], git_dir=mirror)
+            if rc != 0:
+                return None
+            with self._synced_lock:
+                self._synced.add(url)
+        return mirror
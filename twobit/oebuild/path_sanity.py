@@ -15,12 +15,13 @@ class PathSanity(dict):
         name: Key for retrieval.
         value: Value associated with key.
         exist: Wiether or not the entity must exist. Exception is thrown if
-               this is True and the item does not exist.
+               this is True and the item does not exist. None skips the
+               check.
         """
         tmp = os.path.realpath(os.path.join(self._top_dir, value))
         if exist and not os.path.exists(tmp):
             raise ValueError("{0} does not exist".format(tmp))
-        if not exist and os.path.exists(tmp):
+        if exist is False and os.path.exists(tmp):
             raise ValueError("{0} already exists".format(tmp))
         self.__setitem__(name, tmp)
     def getitem_rel(self, name):
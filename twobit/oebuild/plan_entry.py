@@ -0,0 +1,38 @@
+class PlanEntry(object):
+    """ What has to be done to bring one repo in the source directory to the
+        state in the manifest.
+    """
+    UP_TO_DATE = "up-to-date"
+    FAST_FORWARD = "fast-forward"
+    NEEDS_RESET = "needs-reset"
+    NEEDS_FETCH = "needs-fetch"
+    MISSING = "missing"
+    EXTRANEOUS = "extraneous"
+
+    def __init__(self, name, action, head=None, target=None):
+        """ Initialize PlanEntry.
+
+        name: Name of the repo.
+        action: One of the constants above. NEEDS_FETCH means the target
+                commit isn't available locally, so whether a fast-forward
+                is enough is only known after fetching. EXTRANEOUS repos
+                are in the source directory but not in the manifest.
+        head: Commit id currently checked out, None if the repo is missing.
+        target: Commit id the repo should be at, None if it isn't known
+                locally.
+        """
+        self._name = name
+        self._action = action
+        self._head = head
+        self._target = target
+    def __str__(self):
+        """ Create a one line summary of the entry.
+        """
+        line = "{0}: {1}".format(self._name, self._action)
+        if self._head is not None and self._target is not None and self._head != self._target:
+            line += " ({0} -> {1})".format(self._head[:12], self._target[:12])
+        elif self._head is not None:
+            line += " ({0})".format(self._head[:12])
+        elif self._target is not None:
+            line += " (-> {0})".format(self._target[:12])
+        return line
@@ -0,0 +1,288 @@
+import errno
+import os
+import re
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+class ProcessJob(object):
+    """ A process submitted to a ProcessLoop.
+    """
+    # bytes of stderr kept for stderr()
+    STDERR_TAIL = 4096
+
+    def __init__(self, argv, out=None, capture=False, timeout=None, name=None):
+        self._argv = argv
+        self._out = out
+        self._capture = capture
+        self._timeout = timeout
+        self._name = name if name is not None else argv[0]
+        self._proc = None
+        self._stdout_fd = None
+        self._deadline = None
+        self._killed = None
+        self._fds = {}
+        self._stdout = []
+        self._stderr = b""
+        self._rc = None
+        self._timed_out = False
+        self._cancelled = False
+        self._done = threading.Event()
+    def wait(self):
+        """ Block until the process exited.
+
+        returns a tuple (exit code, stdout). stdout is only captured when
+        the job was submitted with capture=True, it's None otherwise.
+        """
+        # wait with a timeout so KeyboardInterrupt is delivered on python 2
+        while not self._done.wait(0.1):
+            pass
+        if not self._capture:
+            return self._rc, None
+        return self._rc, b"".join(self._stdout).decode("utf-8")
+    def stderr(self):
+        """ The last STDERR_TAIL bytes the process wrote to stderr.
+        """
+        return self._stderr.decode("utf-8", "replace")
+    def timed_out(self):
+        """ True if the process was killed because it ran past its timeout.
+        """
+        return self._timed_out
+    def cancelled(self):
+        """ True if the process was killed or never started because the loop
+            was cancelled.
+        """
+        return self._cancelled
+
+class ProcessLoop(object):
+    """ Run many processes from a single thread that multiplexes their pipes.
+
+    Any thread can submit() a command and wait for it. One loop thread starts
+    the processes, reads their output with select() as it arrives, writes it
+    to the file object of each job (so output is captured per repo instead of
+    interleaved on the terminal), feeds progress meters to an optional
+    ProgressDisplay, and kills processes that run past their timeout or when
+    the loop is cancelled. Each process runs in its own process group so
+    the helpers git spawns (remote helpers, index-pack) are killed with it.
+    """
+    # seconds between SIGTERM and SIGKILL
+    KILL_GRACE = 2.0
+    # seconds between redraws of the display
+    REFRESH = 0.1
+    _PROGRESS = re.compile(b"[\r\n]")
+
+    def __init__(self, timeout=None, display=None):
+        """ Initialize ProcessLoop.
+
+        timeout: Default number of seconds a process may run before it's
+                 killed, None for no limit.
+        display: Optional ProgressDisplay showing the last progress line of
+                 every running process.
+        """
+        self._timeout = timeout
+        self._display = display
+        self._lock = threading.Lock()
+        self._pending = []
+        self._running = []
+        self._cancelled = False
+        self._closed = False
+        self._wake_r, self._wake_w = os.pipe()
+        self._thread = None
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b"x")
+        except OSError:
+            pass
+    def submit(self, argv, out=None, capture=False, timeout=None, name=None):
+        """ Start argv from the loop thread.
+
+        argv: Command and arguments.
+        out: File object receiving stderr, and stdout unless it's captured.
+             Default writes to stdout through the display.
+        capture: Capture stdout, returned by ProcessJob.wait().
+        timeout: Seconds before the process is killed, default is the loop
+                 timeout.
+        name: Name shown on the display, e.g. the repo.
+        returns a ProcessJob.
+        """
+        job = ProcessJob(argv, out=out, capture=capture,
+                         timeout=timeout if timeout is not None else self._timeout,
+                         name=name)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ProcessLoop is closed")
+            if self._cancelled:
+                job._cancelled = True
+                job._rc = -signal.SIGTERM
+                job._done.set()
+                return job
+            self._pending.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop)
+                self._thread.daemon = True
+                self._thread.start()
+        self._wake()
+        return job
+    def call(self, argv, out=None, timeout=None, name=None):
+        """ Run argv and return its exit code.
+        """
+        return self.submit(argv, out=out, timeout=timeout, name=name).wait()[0]
+    def cancel(self):
+        """ Kill every running process and fail every job submitted from now
+            on.
+        """
+        with self._lock:
+            self._cancelled = True
+        self._wake()
+    def cancelled(self):
+        """ True once cancel() was called.
+        """
+        with self._lock:
+            return self._cancelled
+    def close(self):
+        """ Wait for the submitted jobs and stop the loop thread.
+        """
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        self._wake()
+        if thread is not None:
+            while thread.is_alive():
+                thread.join(0.1)
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+    def _start(self, job):
+        """ Start the process of job, called from the loop thread.
+        """
+        try:
+            job._proc = subprocess.Popen(job._argv, stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE,
+                                         preexec_fn=lambda: os.setpgid(0, 0))
+        except OSError as e:
+            self._write(job, "{0}: {1}\n".format(job._argv[0], e.strerror).encode("utf-8"))
+            job._rc = 127
+            job._done.set()
+            return
+        job._stdout_fd = job._proc.stdout.fileno()
+        job._fds = {job._stdout_fd: job._proc.stdout,
+                    job._proc.stderr.fileno(): job._proc.stderr}
+        if job._timeout is not None:
+            job._deadline = time.time() + job._timeout
+        self._running.append(job)
+        if self._display is not None:
+            self._display.update(job._name, "started")
+    def _write(self, job, data):
+        """ Write process output to the file object of job.
+        """
+        text = data if isinstance(data, str) else data.decode("utf-8", "replace")
+        if job._out is not None:
+            job._out.write(text)
+            job._out.flush()
+        elif self._display is not None:
+            self._display.write(text)
+        else:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+    def _read(self, job, fd):
+        """ Read what's available on fd of job, return False at EOF.
+        """
+        try:
+            data = os.read(fd, 65536)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return True
+            data = b""
+        if not data:
+            job._fds.pop(fd).close()
+            return False
+        if job._capture and fd == job._stdout_fd:
+            job._stdout.append(data)
+            return True
+        if fd != job._stdout_fd:
+            job._stderr = (job._stderr + data)[-ProcessJob.STDERR_TAIL:]
+        if self._display is not None and fd != job._stdout_fd:
+            lines = [line for line in ProcessLoop._PROGRESS.split(data) if line.strip()]
+            if lines:
+                self._display.update(job._name, lines[-1].decode("utf-8", "replace"))
+        self._write(job, data)
+        return True
+    def _kill(self, job, sig):
+        try:
+            os.killpg(job._proc.pid, sig)
+        except OSError:
+            pass
+    def _reap(self, job):
+        """ Collect the exit code of job once both pipes are closed.
+        """
+        job._rc = job._proc.wait()
+        self._running.remove(job)
+        if self._display is not None:
+            self._display.finish(job._name)
+        if job._timed_out:
+            self._write(job, "{0}: timed out after {1} seconds\n".format(
+                " ".join(job._argv), job._timeout).encode("utf-8"))
+        job._done.set()
+    def _loop(self):
+        last_render = 0
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                cancelled = self._cancelled
+                closed = self._closed
+            for job in pending:
+                if cancelled:
+                    job._cancelled = True
+                    job._rc = -signal.SIGTERM
+                    job._done.set()
+                else:
+                    self._start(job)
+            now = time.time()
+            for job in self._running:
+                if cancelled and job._killed is None:
+                    job._cancelled = True
+                    job._killed = now
+                    self._kill(job, signal.SIGTERM)
+                elif (job._killed is None and job._deadline is not None and
+                      now >= job._deadline):
+                    job._timed_out = True
+                    job._killed = now
+                    self._kill(job, signal.SIGTERM)
+                elif job._killed is not None and now - job._killed >= ProcessLoop.KILL_GRACE:
+                    self._kill(job, signal.SIGKILL)
+            if closed and not self._running:
+                break
+            # sleep until output arrives, a deadline passes or we're woken
+            wait = None
+            deadlines = [job._deadline for job in self._running
+                         if job._deadline is not None and job._killed is None]
+            deadlines += [job._killed + ProcessLoop.KILL_GRACE
+                          for job in self._running if job._killed is not None]
+            if deadlines:
+                wait = max(0, min(deadlines) - now)
+            if self._display is not None and self._running:
+                wait = ProcessLoop.REFRESH if wait is None else min(wait, ProcessLoop.REFRESH)
+            fds = {}
+            for job in self._running:
+                for fd in job._fds:
+                    fds[fd] = job
+            try:
+                readable = select.select(list(fds) + [self._wake_r], [], [], wait)[0]
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd in readable:
+                if fd == self._wake_r:
+                    os.read(self._wake_r, 4096)
+                    continue
+                job = fds[fd]
+                if not self._read(job, fd) and not job._fds:
+                    self._reap(job)
+            if self._display is not None and time.time() - last_render >= ProcessLoop.REFRESH:
+                self._display.render()
+                last_render = time.time()
+        if self._display is not None:
+            self._display.clear()
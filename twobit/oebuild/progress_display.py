@@ -0,0 +1,64 @@
+import os
+import sys
+
+class ProgressDisplay(object):
+    """ One status line per running operation, redrawn in place.
+
+    git writes its progress meters to stderr, ending each update with '\\r'.
+    The last update of every operation is kept and the whole block is
+    redrawn on each render() so many concurrent operations share the
+    terminal without scrolling. Nothing is drawn unless fd is a terminal.
+    """
+    def __init__(self, fd=sys.stderr):
+        """ Initialize ProgressDisplay.
+
+        fd: File object the display is drawn on.
+        """
+        self._fd = fd
+        self._tty = hasattr(fd, "isatty") and fd.isatty()
+        self._lines = {}
+        self._order = []
+        self._drawn = 0
+    @staticmethod
+    def _width():
+        try:
+            return int(os.environ.get("COLUMNS", "80"))
+        except ValueError:
+            return 80
+    def update(self, name, line):
+        """ Set the status line of the operation called name.
+        """
+        if name not in self._lines:
+            self._order.append(name)
+        self._lines[name] = line
+    def finish(self, name):
+        """ Remove the operation called name from the display.
+        """
+        if name in self._lines:
+            del self._lines[name]
+            self._order.remove(name)
+    def clear(self):
+        """ Erase the lines drawn by the last render().
+        """
+        if self._tty and self._drawn:
+            self._fd.write("\x1b[{0}A\x1b[J".format(self._drawn))
+            self._fd.flush()
+        self._drawn = 0
+    def write(self, data):
+        """ Write data above the display.
+        """
+        self.clear()
+        self._fd.write(data)
+        self.render()
+    def render(self):
+        """ Redraw the status lines.
+        """
+        if not self._tty:
+            return
+        self.clear()
+        width = ProgressDisplay._width() - 1
+        for name in self._order:
+            self._fd.write("{0}: {1}"
+                           .format(name, self._lines[name])[:width] + "\n")
+        self._drawn = len(self._order)
+        self._fd.flush()
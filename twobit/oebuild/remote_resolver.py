@@ -0,0 +1,115 @@
+import json
+import os
+import time
+
+from file_lock import FileLock
+from git_runner import GitRunner
+from work_pool import WorkPool
+
+class RemoteResolver(object):
+    """ Resolve the branches of Repo objects to commit ids on their remotes.
+
+    Every URL is queried with a single 'git ls-remote', no matter how many
+    repos use it, and URLs are queried concurrently. Results can be cached
+    in a JSON file and reused until they are older than the TTL.
+    """
+    def __init__(self, cache_file=None, ttl=300, jobs=1, runner=None):
+        """ Initialize RemoteResolver.
+
+        cache_file: Optional path of the JSON file caching ls-remote results.
+        ttl: Seconds a cached result stays valid.
+        jobs: Number of URLs queried concurrently.
+        runner: GitRunner used to execute git. Default writes to the terminal.
+        """
+        self._cache_file = cache_file
+        self._ttl = ttl
+        self._jobs = jobs
+        self._runner = runner if runner is not None else GitRunner()
+    def _load_cache(self):
+        """ Read the cache file, ignoring it if it's missing or broken.
+        """
+        if self._cache_file is None or not os.path.exists(self._cache_file):
+            return {}
+        try:
+            with open(self._cache_file, 'r') as cache_fd:
+                cache = json.load(cache_fd)
+        except ValueError:
+            return {}
+        return cache if isinstance(cache, dict) else {}
+    def _save_cache(self, fresh):
+        """ Merge fresh results into the cache file.
+        """
+        cache_dir = os.path.dirname(os.path.abspath(self._cache_file))
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with FileLock(self._cache_file + ".lock"):
+            cache = self._load_cache()
+            cache.update(fresh)
+            tmp_file = self._cache_file + ".tmp"
+            with open(tmp_file, 'w') as cache_fd:
+                json.dump(cache, cache_fd, indent=4, sort_keys=True)
+            os.rename(tmp_file, self._cache_file)
+    def ls_remote(self, url):
+        """ Map every branch and tag on the remote at url to its commit id.
+
+        Peeled tags ('^{}') replace the tag object with the commit it
+        points at. Raises EnvironmentError if git fails.
+        """
+        rc, out = self._runner.output(['ls-remote', '--heads', '--tags', url])
+        if rc != 0:
+            raise EnvironmentError("git ls-remote {0} failed with exit code {1}".format(url, rc))
+        refs = {}
+        for line in out.splitlines():
+            sha, _, ref = line.partition("\t")
+            if ref.endswith("^{}"):
+                ref = ref[:-len("^{}")]
+            refs[ref] = sha
+        return refs
+    def refs(self, urls):
+        """ ls-remote results for each of urls, from the cache when fresh.
+
+        returns a dict mapping url to {ref: commit id}.
+        """
+        now = time.time()
+        cache = self._load_cache()
+        results = {}
+        stale = []
+        for url in sorted(set(urls)):
+            entry = cache.get(url)
+            if entry is not None and now - entry.get("time", 0) < self._ttl:
+                results[url] = entry["refs"]
+            else:
+                stale.append(url)
+        fresh = {}
+        for url, refs in zip(stale, WorkPool(self._jobs).map(self.ls_remote, stale)):
+            results[url] = refs
+            fresh[url] = {"time": now, "refs": refs}
+        if fresh and self._cache_file is not None:
+            self._save_cache(fresh)
+        return results
+    def resolve(self, repos, force=False):
+        """ Return copies of repos with their revision set to the commit their
+            branch points at on the remote.
+
+        repos: List of Repo objects.
+        force: Also resolve repos that already have a revision.
+        Raises ValueError if a branch doesn't exist on its remote.
+        """
+        todo = [repo for repo in repos if force or repo._revision is None]
+        refs = self.refs([repo._url for repo in todo])
+        resolved = []
+        for repo in repos:
+            if not force and repo._revision is not None:
+                resolved.append(repo)
+                continue
+            remote = refs[repo._url]
+            sha = None
+            for ref in ("refs/heads/" + repo._branch, "refs/tags/" + repo._branch):
+                if ref in remote:
+                    sha = remote[ref]
+                    break
+            if sha is None:
+                raise ValueError("{0}: branch {1} not found on {2}".format(
+                    repo._name, repo._branch, repo._url))
+            resolved.append(repo.replace(revision=sha))
+        return resolved
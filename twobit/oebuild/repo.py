@@ -1,12 +1,30 @@
 from __future__ import print_function
 
 import os
-import subprocess
+import re
+
+from clone_options import CloneOptions
+from conf_parser import ConfParser
+from git_runner import GitRunner
+from git_state import GitState
+from layer_index import LayerIndex
+from state_cache import StateCache
 
 class Repo(object):
     """ Data required to clone a git repo in a specific state.
+
+    Repo objects are immutable so they can be shared between threads, use
+    replace() to derive a Repo with different values.
     """
-    def __init__(self, name, url, branch="master", revision=None, layers=["./"]):
+    __slots__ = ("_name", "_url", "_branch", "_revision", "_layers",
+                 "_clone_options")
+    _SHA = re.compile(r'^[0-9a-f]{40}$')
+    _RECIPE = re.compile(r'\.(bb|bbappend|bbclass|inc)$')
+    # ref holding the pinned revision in bundles created by Repo.bundle()
+    BUNDLE_REF = "refs/build_op/pinned"
+
+    def __init__(self, name, url, branch="master", revision=None, layers=("./",),
+                 clone_options=None):
         """ Initialize Repo object.
 
         name: Sting name of the repo.
@@ -17,161 +35,428 @@ class Repo(object):
                 By default we assume the base of the repo is the root of the
                 meta layer but in some cases the repo may contain many, or none
                 at all. In this last case layers should be set to None.
+                Stored as a tuple.
+        clone_options: Optional CloneOptions for shallow / partial clones.
         """
-        self._name = name
-        self._url = url
-        self._branch = branch
-        self._revision = revision
-        self._layers = layers
-    def set_branch(self, branch):
-        """ Set branch for Repo object.
-        """
-        self._branch = branch
-    def set_revision(self, revision):
-        """ Set revision for Repo object.
-        """
-        self._revision = revision
-    def set_layers(self, layers):
-        """ Set the list of layers for the Repo ojbect.
+        if layers is not None:
+            layers = tuple(layers)
+        for slot, value in zip(Repo.__slots__, (name, url, branch, revision,
+                                                layers, clone_options)):
+            object.__setattr__(self, slot, value)
+    def __setattr__(self, name, value):
+        raise AttributeError("Repo objects are immutable, use replace()")
+    def replace(self, **kwargs):
+        """ Create a copy of the Repo with the parameter values replaced.
+
+        Takes the same keyword arguments as the constructor.
         """
-        self._layers = layers
+        values = {
+            "name": self._name,
+            "url": self._url,
+            "branch": self._branch,
+            "revision": self._revision,
+            "layers": self._layers,
+            "clone_options": self._clone_options,
+        }
+        for key in kwargs:
+            if key not in values:
+                raise TypeError("unknown Repo field: {0}".format(key))
+        values.update(kwargs)
+        return Repo(**values)
+    def _key(self):
+        return (self._name, self._url, self._branch, self._revision,
+                self._layers, self._clone_options)
+    def __eq__(self, other):
+        return type(other) is Repo and self._key() == other._key()
+    def __ne__(self, other):
+        return not self.__eq__(other)
+    def __hash__(self):
+        return hash(self._key())
     def __str__(self):
         """ Create a human readable string representation of the Repo object.
         """
+        layers = self._layers
+        if layers is not None:
+            layers = list(layers)
         return ("name:     {0}\n"
                 "url:      {1}\n"
                 "branch:   {2}\n"
                 "revision: {3}\n"
                 "layers:   {4}\n".format(self._name, self._url, self._branch,
-                                         self._revision,self._layers))
-    def clone(self, path):
+                                         self._revision, layers))
+    def clone(self, path, runner=None, reference=None, options=None):
         """ Clone the Repo.
 
         path: Path where Repo will be cloned. If renative it will be relative
               to $(pwd).
+        runner: GitRunner used to execute git. Default writes to the terminal.
+        reference: Optional path to a local repo with the same history.
+                   Objects are borrowed from it through git alternates.
+        options: CloneOptions to use instead of the ones from the constructor.
         """
+        if runner is None:
+            runner = GitRunner()
         work_dir = os.path.join(path, self._name)
-        try:
-            if not os.path.exists(work_dir):
-                print("cloning {0} into {1}".format (self._name, path))
-                return subprocess.call(
-                    ['git', 'clone', '--progress', self._url, work_dir], shell=False
-                )
-            else:
-                raise EnvironmentError("Cannot clone {0} to {1}: directory exists".format(self._name, work_dir))
-        except subprocess.CalledProcessError, e:
-            print(e)
+        if not os.path.exists(work_dir):
+            runner.message("cloning {0} into {1}".format (self._name, path))
+            args = ['clone', '--progress']
+            if options is None:
+                options = self._clone_options
+            if options is not None:
+                args += options.args(self._branch)
+            if reference is not None:
+                args += ['--reference', reference]
+            return runner.call(args + [self._url, work_dir],
+                               git_dir=os.path.join(work_dir, '.git'))
+        else:
+            raise EnvironmentError("Cannot clone {0} to {1}: directory exists".format(self._name, work_dir))
 
-    def fetch(self, path):
+    def fetch(self, path, runner=None):
         """ Fetch the Repo.
         """
+        if runner is None:
+            runner = GitRunner()
         work_tree = os.path.join(path, self._name)
         if work_tree is None or not os.path.exists(work_tree):
             raise EnvironmentError("{0} doesn't exist, cannot fetch".format(work_tree))
-        git_dir = os.path.join(work_tree, ".git")
-        try:
-            print("fetching {0} ...".format(self._name))
-            return subprocess.call(
-                [
-                    'git',
-                    '--git-dir={0}'.format(git_dir),
-                    '--work-tree={0}'.format(work_tree),
-                    'fetch'
-                ],
-                shell=False
-            )
-        except subprocess.CalledProcessError as e:
-            print(e)
-
-    def checkout_branch(self, path):
+        runner.message("fetching {0} ...".format(self._name))
+        return runner.call_tree(work_tree, ['fetch'])
+
+    def checkout_branch(self, path, runner=None):
         """ Checkout the branch specified. Fall back to using the branch
             specified in the constructor.
         """
+        if runner is None:
+            runner = GitRunner()
         work_tree = os.path.join(path, self._name)
         if work_tree is None or not os.path.exists(work_tree):
             raise EnvironmentError("Cannot reset repo state: {0} doesn't exist".format(work_tree))
-        git_dir = os.path.join(work_tree, ".git")
-        try:
-            print("checking out branch: {0}".format(self._branch))
-            return subprocess.call(
-                [
-                    'git',
-                    '--git-dir={0}'.format(git_dir),
-                    '--work-tree={0}'.format(work_tree),
-                    'checkout',
-                    self._branch
-                ],
-                shell=False
-            )
-        except subprocess.CalledProcessError as e:
-            print(e)
-
-    def reset_revision(self, path):
+        url, branch, head = GitState().state(os.path.join(work_tree, '.git'))
+        if branch == self._branch:
+            runner.message("already on branch: {0}".format(self._branch))
+            return 0
+        runner.message("checking out branch: {0}".format(self._branch))
+        return runner.call_tree(work_tree, ['checkout', self._branch])
+
+    def reset_revision(self, path, runner=None, touched=None):
         """ Reset the repo to the specified revision.
 
-        Use this method with care. You may lose data.
+        Use this method with care. You may lose data. Nothing is done if
+        HEAD is at the revision and the work tree is clean.
+        touched: Optional list extended with the files that were rewritten.
         """
+        if runner is None:
+            runner = GitRunner()
         if self._revision is None:
-            print('revision is None, nothing to reset')
-            return
+            runner.message('revision is None, nothing to reset')
+            return 0
         work_tree = os.path.join(path, self._name)
         if work_tree is None or not os.path.exists(work_tree):
             raise EnvironmentError("Cannot reset repo state: {0} doesn't exist".format(work_tree))
-        git_dir = os.path.join(work_tree, ".git")
-        try:
-            print("resetting repo revision {0}".format(self._revision))
-            return subprocess.call(
-                [
-                    'git',
-                    '--git-dir={0}'.format(git_dir),
-                    '--work-tree={0}'.format(work_tree),
-                    'reset',
-                    '--hard',
-                    self._revision
-                ],
-                shell=False
-            )
-        except subprocess.CalledProcessError as e:
-            print(e)
-
-    def ffpull(self, path):
+        rc, target = self._fetch_revision(path, runner)
+        if rc != 0:
+            return rc
+        url, branch, head = GitState().state(os.path.join(work_tree, '.git'))
+        changed = self.changed_files(path, target, runner=runner)
+        if head == target and changed == []:
+            runner.message("already at revision {0}".format(self._revision))
+            return 0
+        runner.message("resetting repo revision {0}".format(self._revision))
+        rc = runner.call_tree(work_tree, ['reset', '--hard', target])
+        if rc == 0:
+            if changed:
+                runner.message(Repo.touched_summary(changed))
+            if touched is not None:
+                touched.extend(changed or [])
+        return rc
+    def _fetch_revision(self, path, runner):
+        """ Resolve the revision, fetching it if it isn't available locally.
+
+        Shallow and single branch clones may not have the revision, in
+        which case just that commit is fetched.
+        returns a tuple (exit code, commit id).
+        """
+        target = self.local_revision(path, runner=runner)
+        if target is not None:
+            return 0, target
+        work_tree = os.path.join(path, self._name)
+        args = ['fetch', 'origin', self._revision]
+        if os.path.exists(os.path.join(work_tree, '.git', 'shallow')):
+            args[1:1] = ['--depth', '1']
+        runner.message("fetching revision {0}".format(self._revision))
+        rc = runner.call_tree(work_tree, args)
+        if rc != 0:
+            return rc, None
+        target = self.local_revision(path, runner=runner)
+        if target is None:
+            raise EnvironmentError("{0}: revision {1} not found".format(self._name, self._revision))
+        return 0, target
+    def changed_files(self, path, target, runner=None):
+        """ Files whose content in the work tree differs from commit target,
+            i.e. the files a checkout or reset to target has to write.
+
+        The index is refreshed first so files with new timestamps but
+        unchanged content aren't taken as modified, and so aren't
+        rewritten, by the checkout.
+        returns a list of paths relative to the work tree, None if git
+        fails.
+        """
+        if runner is None:
+            runner = GitRunner()
+        work_tree = os.path.join(path, self._name)
+        # exits 1 if there are modified files, that's fine
+        runner.call_tree(work_tree, ['update-index', '-q', '--refresh'])
+        rc, out = runner.output_tree(work_tree, ['diff', '--name-only', '--no-renames',
+                                                 target, '--'])
+        if rc != 0:
+            return None
+        return out.splitlines()
+    @staticmethod
+    def touched_summary(files):
+        """ Describe a list of rewritten files as counts of bitbake recipes,
+            conf files and others.
+        """
+        recipes = len([f for f in files if Repo._RECIPE.search(f)])
+        confs = len([f for f in files if f.endswith(".conf")])
+        return "{0} recipes, {1} conf files, {2} other files rewritten".format(
+            recipes, confs, len(files) - recipes - confs)
+    def switch(self, path, runner=None, touched=None):
+        """ Check out the branch at the revision in a single step.
+
+        Does what checkout_branch() followed by reset_revision() does, but
+        each file is written at most once and only if its content differs,
+        so bitbake doesn't have to parse unchanged recipes again. Nothing
+        is done if the branch is already checked out at the revision and
+        the work tree is clean. Without a revision only the branch is
+        checked out.
+
+        touched: Optional list extended with the files that were rewritten.
+        """
+        if self._revision is None:
+            return self.checkout_branch(path, runner=runner)
+        if runner is None:
+            runner = GitRunner()
+        work_tree = os.path.join(path, self._name)
+        if not os.path.exists(work_tree):
+            raise EnvironmentError("Cannot reset repo state: {0} doesn't exist".format(work_tree))
+        rc, target = self._fetch_revision(path, runner)
+        if rc != 0:
+            return rc
+        git_dir = os.path.join(work_tree, '.git')
+        url, branch, head = GitState().state(git_dir)
+        changed = self.changed_files(path, target, runner=runner)
+        if branch == self._branch and head == target and changed == []:
+            runner.message("{0} is at {1}, nothing to do".format(self._branch, self._revision))
+            return 0
+        private, common = GitState.git_dirs(git_dir)
+        tracking = GitState.resolve_ref(private, common, "refs/heads/" + self._branch) is None
+        runner.message("checking out branch {0} at revision {1}".format(self._branch, self._revision))
+        rc = runner.call_tree(work_tree, ['checkout', '--force', '-B', self._branch, target])
+        if rc == 0 and tracking and GitState.resolve_ref(
+                private, common, "refs/remotes/origin/" + self._branch) is not None:
+            # a new branch tracks origin like 'git checkout <branch>' does
+            rc = runner.call_tree(work_tree, ['branch', '--set-upstream-to',
+                                              'origin/' + self._branch, self._branch])
+        if rc == 0:
+            if changed:
+                runner.message(Repo.touched_summary(changed))
+            if touched is not None:
+                touched.extend(changed or [])
+        return rc
+
+    def ffpull(self, path, runner=None):
         """ Merge the current HEAD with the branch.
         """
+        if runner is None:
+            runner = GitRunner()
         work_tree = os.path.join(path, self._name)
         if work_tree is None:
             raise EnvironmentError('Cannot merge repo. Invalid path: {0}'.format(work_tree))
-        git_dir = os.path.join(work_tree, '.git')
-        try:
-            return subprocess.call(
-                [
-                    'git',
-                    '--git-dir={0}'.format(git_dir),
-                    '--work-tree={0}'.format(work_tree),
-                    'pull',
-                    '--ff-only'
-                ],
-                shell=False
-            )
-        except subprocess.CalledProcessError as e:
-            print(e)
-
-    def update(self, path):
+        return runner.call_tree(work_tree, ['pull', '--ff-only'])
+
+    def local_revision(self, path, runner=None):
+        """ Resolve the revision to a commit id using the local repo only.
+
+        returns None if the revision is None or the commit isn't available
+        locally, in which case it has to be fetched.
+        """
+        if self._revision is None:
+            return None
+        if runner is None:
+            runner = GitRunner()
+        work_tree = os.path.join(path, self._name)
+        rc, out = runner.output_tree(work_tree, ['rev-parse', '--verify',
+                                                 '--quiet',
+                                                 self._revision + '^{commit}'])
+        if rc != 0:
+            return None
+        return out.strip()
+    def target(self, path, runner=None, mirror=False):
+        """ Commit id the work tree should be at, using the local repo only.
+
+        That's the revision, or for repos without one the tip of the branch
+        on 'origin' as of the last fetch. returns None if the commit isn't
+        available locally.
+        mirror: The work tree is a worktree of a bare mirror, see worktree().
+                The mirror has the branches of the remote as refs/heads/*.
+        """
+        if self._revision is not None:
+            return self.local_revision(path, runner=runner)
+        if runner is None:
+            runner = GitRunner()
+        work_tree = os.path.join(path, self._name)
+        ref = 'refs/heads/{0}' if mirror else 'refs/remotes/origin/{0}'
+        rc, out = runner.output_tree(work_tree, ['rev-parse', '--verify', '--quiet',
+                                                 ref.format(self._branch) + '^{commit}'])
+        if rc != 0:
+            return None
+        return out.strip()
+    def fast_forward(self, path, target, runner=None, touched=None):
+        """ Move the checked out branch forward to the commit target.
+
+        Only files that differ between HEAD and target are written. Fails
+        if target isn't a descendant of HEAD or local changes are in the way.
+        touched: Optional list extended with the files that were rewritten.
+        """
+        if runner is None:
+            runner = GitRunner()
+        work_tree = os.path.join(path, self._name)
+        if not os.path.exists(work_tree):
+            raise EnvironmentError("Cannot fast-forward repo: {0} doesn't exist".format(work_tree))
+        changed = self.changed_files(path, target, runner=runner)
+        runner.message("fast-forwarding {0} to {1}".format(self._branch, target))
+        rc = runner.call_tree(work_tree, ['merge', '--ff-only', target])
+        if rc == 0:
+            if changed:
+                runner.message(Repo.touched_summary(changed))
+            if touched is not None:
+                touched.extend(changed or [])
+        return rc
+    def is_current(self, path, runner=None):
+        """ True if the work tree already has the branch checked out at the
+            pinned revision.
+
+        Only repos with a revision can be current: for a branch we'd have to
+        ask the remote. Local modifications to the work tree are not
+        considered. A full commit id is compared without running git.
+        """
+        if self._revision is None:
+            return False
+        work_tree = os.path.join(path, self._name)
+        if not os.path.isdir(work_tree):
+            return False
+        url, branch, head = GitState().state(os.path.join(work_tree, '.git'))
+        if branch != self._branch:
+            return False
+        if Repo._SHA.match(self._revision):
+            return head == self._revision
+        return head == self.local_revision(path, runner=runner)
+    def update(self, path, runner=None, touched=None):
         """ Update the repo.
 
-        Check it out if necessary. Otherwise fetch it and reset state.
+        Check it out if necessary. Otherwise fetch it and reset state. The
+        fetch is skipped if the revision is already available locally.
+        Returns the exit code of the first git command that failed, 0 on
+        success.
+        touched: Optional list extended with the files that were rewritten.
         """
         work_tree = os.path.join(path, self._name)
         if work_tree is None:
             raise EnvironmentError("Cannot update repo. Invalid path: {0}".format(work_tree))
         if not os.path.exists(work_tree):
-            self.clone(path)
-        else:
-            self.fetch(path)
-            self.checkout_branch(path)
+            return self.clone(path, runner=runner)
+        rc = 0
+        if self.local_revision(path, runner=runner) is None:
+            rc = self.fetch(path, runner=runner)
+        if rc == 0:
             if self._revision is not None:
-                self.reset_revision(path)
+                rc = self.switch(path, runner=runner, touched=touched)
             else:
-                self.ffpull(path)
+                rc = self.checkout_branch(path, runner=runner)
+                if rc == 0:
+                    rc = self.ffpull(path, runner=runner)
+        return rc
+    def worktree(self, path, canonical, runner=None):
+        """ Check the Repo out as a worktree of a shared canonical clone.
+
+        The worktree has a detached HEAD at the revision, or at the tip of
+        the branch if there's no revision, so any number of worktrees can
+        follow the same branch at different revisions. The branch is
+        recorded in the git dir of the worktree for GitState. An existing
+        worktree is moved to the new commit, discarding local changes.
+
+        path: Directory holding the worktree.
+        canonical: Path to a bare mirror of the Repo URL, see MirrorCache.
+        runner: GitRunner used to execute git. Default writes to the terminal.
+        """
+        if runner is None:
+            runner = GitRunner()
+        work_tree = os.path.abspath(os.path.join(path, self._name))
+        target = self._revision if self._revision is not None else self._branch
+        if not os.path.exists(work_tree):
+            runner.message("adding worktree {0} of {1} at {2}".format(
+                work_tree, canonical, target))
+            # forget worktrees of build directories that were deleted
+            rc = runner.call(['--git-dir={0}'.format(canonical), 'worktree', 'prune'])
+            if rc == 0:
+                rc = runner.call(['--git-dir={0}'.format(canonical), 'worktree',
+                                  'add', '--detach', work_tree, target])
+        elif not os.path.isfile(os.path.join(work_tree, '.git')):
+            raise EnvironmentError("Cannot use {0} as a worktree: it's a clone".format(work_tree))
+        else:
+            runner.message("moving worktree {0} to {1}".format(work_tree, target))
+            rc = runner.call_tree(work_tree, ['checkout', '--force', '--detach', target])
+        if rc != 0:
+            return rc
+        private = GitState.git_dirs(os.path.join(work_tree, '.git'))[0]
+        with open(os.path.join(private, GitState.WORKTREE_BRANCH), 'w') as branch_fd:
+            branch_fd.write(self._branch + "\n")
+        return 0
+    def bundle(self, path, bundle_file, runner=None):
+        """ Write the history of the pinned revision to a git bundle.
+
+        The revision is stored under BUNDLE_REF. If the Repo has no revision
+        the current HEAD of the work tree is used.
+        """
+        if runner is None:
+            runner = GitRunner()
+        work_tree = os.path.join(path, self._name)
+        if not os.path.exists(work_tree):
+            raise EnvironmentError("Cannot bundle repo: {0} doesn't exist".format(work_tree))
+        rev = self.local_revision(path, runner=runner) or 'HEAD'
+        runner.message("bundling {0} at {1}".format(self._name, rev))
+        rc = runner.call_tree(work_tree, ['update-ref', Repo.BUNDLE_REF, rev])
+        if rc != 0:
+            return rc
+        try:
+            return runner.call_tree(work_tree, ['bundle', 'create', bundle_file,
+                                                Repo.BUNDLE_REF])
+        finally:
+            runner.call_tree(work_tree, ['update-ref', '-d', Repo.BUNDLE_REF])
+    def restore(self, path, bundle_file, runner=None):
+        """ Create the repo from a bundle written by bundle(), without
+            network access.
+
+        The branch is created at the bundled revision and tracks the
+        branch of the same name on the 'origin' remote, which points at the
+        Repo URL, so the repo can be updated normally later.
+        """
+        if runner is None:
+            runner = GitRunner()
+        work_tree = os.path.join(path, self._name)
+        if os.path.exists(work_tree):
+            raise EnvironmentError("Cannot restore {0} to {1}: directory exists".format(self._name, work_tree))
+        runner.message("restoring {0} from {1}".format(self._name, bundle_file))
+        rc = runner.call(['init', '--quiet', work_tree])
+        for args in (['remote', 'add', 'origin', self._url],
+                     ['fetch', bundle_file, '{0}:refs/remotes/origin/{1}'.format(
+                         Repo.BUNDLE_REF, self._branch)],
+                     ['checkout', '--track', '-B', self._branch,
+                      'origin/{0}'.format(self._branch)]):
+            if rc != 0:
+                break
+            rc = runner.call_tree(work_tree, args)
+        return rc
     @staticmethod
     def repo_decode(json_obj):
         """ Create a repository object from a dictionary.
@@ -185,9 +470,11 @@ class Repo(object):
                     json_obj["url"],
                     json_obj.get("branch", "master"),
                     json_obj.get("revision", None),
-                    json_obj.get("layers", None))
+                    json_obj.get("layers", None),
+                    CloneOptions.decode(json_obj))
     @staticmethod
-    def repos_from_state(bblayers_file, top_dir="./", src_dir="./sources"):
+    def repos_from_state(bblayers_file, top_dir="./", src_dir="./sources", jobs=1,
+                         cache=None):
         """ Build a list of Repo objects from current build state.
 
         This requires that we do a few things:
@@ -197,47 +484,58 @@ class Repo(object):
 
         bblayers_file: path to bblayers file
         sources: path to directory holding all of the relevant repos
+        jobs: number of repos whose git state is collected concurrently
+        cache: optional StateCache. Only repos whose git metadata changed
+               since they were cached are scanned.
         """
         top_dir = os.path.abspath(top_dir)
         src_dir = os.path.abspath(src_dir)
-        # Get layers from bblayers.conf
-        with open(bblayers_file, 'r') as bblayers_fd:
-            layers = layers_from_bblayers(top_dir, bblayers_fd)
-     
+        # Get layers from bblayers.conf, keeping their order
+        bblayers = ConfParser({"TOPDIR": top_dir})
+        bblayers.parse_file(bblayers_file)
+        active = {}
+        for layer in (bblayers.getvar("BBLAYERS") or "").split():
+            active.setdefault(LayerIndex.normalize(layer), len(active))
+
+        # find the git repos in src_dir, take what we can from the cache
+        items = [item for item in sorted(os.listdir(src_dir))
+                 if os.path.exists(os.path.join(src_dir, item, ".git"))]
+        states = {}
+        signatures = {}
+        if cache is not None:
+            for item in items:
+                repo_root = os.path.join(src_dir, item)
+                signatures[item] = StateCache.signature(repo_root)
+                value = cache.get(repo_root, signatures[item])
+                if value is not None:
+                    states[item] = value
+
+        # collect the state of the remaining repos in one batch
+        missing = [item for item in items if item not in states]
+        collected = GitState().collect(
+            [os.path.join(src_dir, item, ".git") for item in missing], jobs=jobs)
+        index = LayerIndex()
+        for item, (url, branch, rev) in zip(missing, collected):
+            repo_root = os.path.join(src_dir, item)
+            states[item] = [url, branch, rev, index.layers(repo_root)]
+            if cache is not None:
+                cache.put(repo_root, signatures[item], states[item])
+        if cache is not None:
+            cache.save()
+
         # Create Repo objects from repos in src_dir
         repos = []
-        subdirs = os.listdir(src_dir)
-        for item in subdirs:
+        for item in items:
+            url, branch, rev, layers = states[item]
             repo_root = os.path.join(src_dir, item)
-            git_dir = os.path.join(repo_root, ".git")
-            # check that directory is a git repo
-            if os.path.isdir(git_dir):
-                # collect data from git repo
-                url, branch, rev = repo_state(git_dir)
-                # get layers in the repo we're processing
-                metas = []
-                for thing in subprocess.check_output(
-                    ["find", repo_root, "-name", "layer.conf"]
-                ).strip().split('\n'):
-                    if os.path.exists(thing):
-                        metas.append(os.path.dirname(os.path.dirname(thing)))
-
-                # find layers that are active in each repo 
-                repo_layer = []
-                for layer in metas:
-                    if layer in layers:
-                        # strip leading directory component from layer path
-                        # including directory separator character
-                        # If string is empty then meta-layer is in the root of
-                        # repo. Use explicit "./" instead of empty string.
-                        tmp = layer[len(repo_root) + 1:]
-                        if not tmp:
-                            tmp = "./"
-                        repo_layer.append(tmp)
-                # reduce empty list to None
-                if repo_layer == []:
-                    repo_layer = None
-
-                repos.append(Repo(item, url, branch=branch, revision=rev, layers=repo_layer))
-        return repos
+            # find layers that are active in each repo, layers in the root
+            # of the repo are "./"
+            repo_layer = [layer for layer in layers
+                          if LayerIndex.normalize(os.path.join(repo_root, layer)) in active]
+            repo_layer.sort(key=lambda layer: active[LayerIndex.normalize(os.path.join(repo_root, layer))])
+            # reduce empty list to None
+            if repo_layer == []:
+                repo_layer = None
 
+            repos.append(Repo(item, url, branch=branch, revision=rev, layers=repo_layer))
+        return repos
@@ -21,6 +21,10 @@ class RepoEncoder(JSONEncoder):
         dict_tmp["url"] = obj._url
         if obj._branch != "master":
             dict_tmp["branch"] = obj._branch
+        if obj._revision is not None:
+            dict_tmp["revision"] = obj._revision
         if obj._layers is not None:
-            dict_tmp["layers"] = obj._layers
+            dict_tmp["layers"] = list(obj._layers)
+        if obj._clone_options is not None:
+            obj._clone_options.encode(dict_tmp)
         return dict_tmp
@@ -1,17 +1,65 @@
 from __future__ import print_function
 
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from fetch_result import FetchResult
+from git_runner import GitRunner
+from git_state import GitState
+from plan_entry import PlanEntry
 from repo import Repo
+from work_pool import WorkPool
 
 class RepoFetcher(object):
     """ Class to manage git repo state.
     """
-    def __init__(self, base, repos=[]):
+    def __init__(self, base, repos=[], jobs=1, mirror=None, clone_options=None,
+                 tracer=None, worktrees=False, loop=None, policy=None,
+                 fail_fast=False, history=None):
         """ Initialize class.
 
         base: Directory where repos will or currently do reside.
         repos: List of Repo objects for the RepoFetcher to operate on.
+        jobs: Number of repos processed concurrently. When greater than 1 the
+              output from git is captured per repo rather than written
+              directly to the terminal.
+        mirror: Optional MirrorCache. New clones borrow their objects from a
+                local mirror of their URL instead of downloading everything.
+        clone_options: Optional default CloneOptions, used for any option
+                       a repo doesn't set itself.
+        tracer: Optional Tracer recording every git command.
+        loop: Optional ProcessLoop running every git process. Output from
+              git is then always captured per repo.
+        worktrees: Check repos out as git worktrees of the mirrors instead of
+                   cloning them, so builds share one clone per URL. Requires
+                   a mirror. Clone options don't apply to worktrees.
+        policy: Optional RetryPolicy for timeouts and retries of git
+                commands. Timeouts require a loop.
+        fail_fast: Stop at the first repo that fails: repos not started yet
+                   are cancelled, and so are running ones when there's a
+                   loop. By default every repo is processed no matter how
+                   many others failed.
+        history: Optional FetchHistory. Repos are started longest expected
+                 duration first and the duration of every repo that was
+                 cloned, updated, skipped or restored is recorded.
         """
+        if worktrees and mirror is None:
+            raise ValueError("worktrees require a mirror cache")
+        if policy is not None and policy.has_timeouts() and loop is None:
+            raise ValueError("git timeouts require a ProcessLoop")
         self._base = base
+        self._jobs = jobs
+        self._mirror = mirror
+        self._clone_options = clone_options
+        self._tracer = tracer
+        self._worktrees = worktrees
+        self._loop = loop
+        self._policy = policy
+        self._fail_fast = fail_fast
+        self._history = history
         self._repos = []
         for repo in repos:
             if type(repo) is Repo:
@@ -26,29 +74,293 @@ class RepoFetcher(object):
         """ Create a string representation of all Repos in the RepoFetcher.
         """
         return ''.join(str(repo) for repo in self._repos)
+    def _worktree(self, repo, runner, result, sync=True):
+        """ Create or move the worktree of repo, syncing its mirror first.
+
+        Changes to the worktrees of a mirror are serialized with the mirror
+        lock so builds set up concurrently in other directories don't
+        collide.
+        sync: Update the mirror from the network. Not needed when the
+              commit is known to be in the mirror already.
+        """
+        if sync:
+            canonical = self._mirror.sync(repo._url, runner)
+        else:
+            canonical = self._mirror.path(repo._url)
+        if canonical is None:
+            raise EnvironmentError("Cannot sync the mirror of {0}".format(repo._url))
+        if os.path.exists(os.path.join(self._base, repo._name)):
+            result._status = "updated"
+        else:
+            result._status = "cloned"
+        with self._mirror.lock(repo._url):
+            return repo.worktree(self._base, canonical, runner=runner)
+    def _clone(self, repo, runner, result):
+        """ Clone repo, through the mirror cache if there is one.
+        """
+        if self._worktrees:
+            return self._worktree(repo, runner, result)
+        reference = None
+        if self._mirror is not None:
+            reference = self._mirror.sync(repo._url, runner)
+        options = self._clone_options
+        if repo._clone_options is not None:
+            options = repo._clone_options.merge(options)
+        result._status = "cloned"
+        return repo.clone(self._base, runner=runner, reference=reference,
+                          options=options)
+    def _update(self, repo, runner, result):
+        """ Update repo, cloning it through _clone if it doesn't exist and
+            skipping it if it's already at the pinned revision.
+        """
+        if not os.path.exists(os.path.join(self._base, repo._name)):
+            return self._clone(repo, runner, result)
+        if repo.is_current(self._base, runner=runner):
+            runner.message("{0} is at {1}, skipping".format(repo._name, repo._revision))
+            result._status = "skipped"
+            return 0
+        if self._worktrees:
+            return self._worktree(repo, runner, result)
+        result._status = "updated"
+        result._touched = []
+        return repo.update(self._base, runner=runner, touched=result._touched)
+    def _run(self, steps):
+        """ Run a pipeline of Repo methods on every repo.
+
+        The steps for a single repo are always run in order and stop at the
+        first one that fails. Different repos are processed concurrently
+        according to the jobs parameter from the constructor.
+
+        steps: List of names of Repo methods taking (path, runner=...).
+               'clone' and 'update' go through the RepoFetcher so they can
+               use the mirror cache. A step may also be a function taking
+               (repo, runner, result).
+        returns a list of FetchResult objects in the same order as the repos.
+        """
+        overrides = {"clone": self._clone, "update": self._update}
+        # name of the first repo that failed, for fail_fast
+        failed = []
+        failed_lock = threading.Lock()
+        def cancelled(result):
+            with failed_lock:
+                if not failed:
+                    return False
+            result._status = "cancelled"
+            result._error = "cancelled after {0} failed".format(failed[0])
+            return True
+        def pipeline(repo):
+            start = time.time()
+            out = None
+            if self._jobs > 1 or self._loop is not None:
+                out = tempfile.TemporaryFile(mode="w+")
+            result = FetchResult(repo._name)
+            try:
+                runner = GitRunner(out=out, tracer=self._tracer, name=repo._name,
+                                   loop=self._loop, policy=self._policy)
+                for step in steps:
+                    if self._fail_fast and cancelled(result):
+                        break
+                    if callable(step):
+                        rc = step(repo, runner, result)
+                    elif step in overrides:
+                        rc = overrides[step](repo, runner, result)
+                    else:
+                        rc = getattr(repo, step)(self._base, runner=runner)
+                    if rc:
+                        result._rc = rc
+                        break
+            except EnvironmentError as e:
+                result._error = str(e)
+            except Exception as e:
+                # one broken repo mustn't take the others and the summary
+                # down with it
+                result._error = "{0}: {1}".format(type(e).__name__, e)
+            finally:
+                if out is not None:
+                    out.seek(0)
+                    result._output = out.read()
+                    out.close()
+            if self._fail_fast and not result.ok() and result._status != "cancelled":
+                with failed_lock:
+                    first = not failed
+                    if first:
+                        failed.append(repo._name)
+                if first:
+                    # kill the git commands still running for other repos
+                    if self._loop is not None:
+                        self._loop.cancel()
+                else:
+                    cancelled(result)
+            if self._history is not None and result.ok() and result._status is not None:
+                self._history.record(repo._url, result._status, time.time() - start)
+            return result
+        order = None
+        if self._history is not None:
+            # we can't know if an existing repo will be skipped, expect the
+            # worst
+            order = self._history.order([
+                (repo._url, "updated" if os.path.exists(os.path.join(self._base, repo._name))
+                 else "cloned") for repo in self._repos])
+        try:
+            return WorkPool(self._jobs).map(pipeline, self._repos, order=order)
+        finally:
+            if self._history is not None:
+                self._history.save()
+    def _classify(self, repo, runner):
+        """ Compare the work tree of repo with the manifest, see PlanEntry.
+        """
+        work_tree = os.path.join(self._base, repo._name)
+        if not os.path.exists(work_tree):
+            return PlanEntry(repo._name, PlanEntry.MISSING, target=repo._revision)
+        url, branch, head = GitState().state(os.path.join(work_tree, '.git'))
+        target = repo.target(self._base, runner=runner, mirror=self._worktrees)
+        if target is None:
+            return PlanEntry(repo._name, PlanEntry.NEEDS_FETCH, head, repo._revision)
+        if branch != repo._branch:
+            return PlanEntry(repo._name, PlanEntry.NEEDS_RESET, head, target)
+        if head == target:
+            return PlanEntry(repo._name, PlanEntry.UP_TO_DATE, head, target)
+        # worktrees have a detached HEAD, there's no branch to move
+        if not self._worktrees and runner.call_tree(
+                work_tree, ['merge-base', '--is-ancestor', head, target]) == 0:
+            return PlanEntry(repo._name, PlanEntry.FAST_FORWARD, head, target)
+        return PlanEntry(repo._name, PlanEntry.NEEDS_RESET, head, target)
+    def plan(self):
+        """ Compare the source directory with the manifest without changing
+            anything or using the network.
+
+        Repos without a revision are compared with their branch on 'origin'
+        as of the last fetch.
+        returns a list of PlanEntry objects: one per repo in manifest order,
+        followed by the repos in the source directory that aren't in the
+        manifest.
+        """
+        def classify(repo):
+            with open(os.devnull, 'w') as null:
+                return self._classify(repo, GitRunner(out=null, tracer=self._tracer,
+                                                      name=repo._name))
+        entries = WorkPool(self._jobs).map(classify, self._repos)
+        names = set(os.path.normpath(repo._name) for repo in self._repos)
+        if os.path.isdir(self._base):
+            for item in sorted(os.listdir(self._base)):
+                if (item not in names and
+                        os.path.exists(os.path.join(self._base, item, '.git'))):
+                    entries.append(PlanEntry(item, PlanEntry.EXTRANEOUS))
+        return entries
+    def apply(self):
+        """ Bring every repo to the state in the manifest with as little
+            work as possible.
+
+        Each repo is classified again like plan() does and only the
+        operations its entry needs are run: nothing for up-to-date repos, a
+        fast-forward merge rewriting only the changed files, a reset, or a
+        clone for missing repos. Repos whose target isn't available locally
+        are fetched first and then classified again. Extraneous repos are
+        left alone.
+        """
+        def apply(repo, runner, result):
+            entry = self._classify(repo, runner)
+            if entry._action == PlanEntry.MISSING:
+                rc = self._clone(repo, runner, result)
+                if rc == 0 and not self._worktrees:
+                    rc = repo.switch(self._base, runner=runner)
+                return rc
+            if entry._action == PlanEntry.NEEDS_FETCH:
+                if self._worktrees:
+                    rc = 0 if self._mirror.sync(repo._url, runner) else 1
+                else:
+                    rc = repo.fetch(self._base, runner=runner)
+                if rc != 0:
+                    return rc
+                entry = self._classify(repo, runner)
+            if entry._action == PlanEntry.UP_TO_DATE:
+                runner.message("{0} is up to date, skipping".format(repo._name))
+                result._status = "skipped"
+                return 0
+            result._touched = []
+            if entry._action == PlanEntry.FAST_FORWARD:
+                result._status = "fast-forwarded"
+                return repo.fast_forward(self._base, entry._target, runner=runner,
+                                         touched=result._touched)
+            result._status = "reset"
+            if self._worktrees:
+                # the target was found in the mirror, no need to sync it
+                return self._worktree(repo, runner, result, sync=False)
+            # a pinned revision still missing is fetched on demand by
+            # switch()
+            if repo._revision is None:
+                if entry._target is None:
+                    raise EnvironmentError("{0}: branch {1} not found on origin".format(
+                        repo._name, repo._branch))
+                repo = repo.replace(revision=entry._target)
+            return repo.switch(self._base, runner=runner, touched=result._touched)
+        return self._run([apply])
     def clone(self):
         """ Clone all repos in a RepoFetcher.
 
         Does nothing more than loop over the list of Repo objects invoking the
-        'clone' method on each.
+        'clone' and 'switch' methods on each. Worktrees are created at their
+        revision in a single step.
         """
-        for repo in self._repos:
-            repo.clone(self._base)
-            repo.checkout_branch(self._base)
-            repo.reset_revision(self._base)
+        if self._worktrees:
+            return self._run(["clone"])
+        return self._run(["clone", "switch"])
     def fetch(self):
         """ Fetch all respos in the RepoFetcher.
         """
-        for repo in self._repos:
-            repo.fetch(self._base)
+        return self._run(["fetch"])
     def reset_state(self):
         """ Set the state of each Repo to the default repo and verision.
         """
-        for repo in self._repos:
-            repo.checkout_branch(self._base)
-            repo.reset_revision(self._base)
+        def switch(repo, runner, result):
+            result._touched = []
+            return repo.switch(self._base, runner=runner, touched=result._touched)
+        if self._worktrees:
+            return self._run([self._worktree])
+        return self._run([switch])
     def update(self):
         """ Update repos.
         """
-        for repo in self._repos:
-            repo.update(self._base)
+        return self._run(["update"])
+    def bundle(self, bundle_dir):
+        """ Write a git bundle of each repo to bundle_dir/<name>.bundle.
+        """
+        def bundle(repo, runner, result):
+            return repo.bundle(self._base, os.path.join(bundle_dir, repo._name + ".bundle"),
+                               runner=runner)
+        return self._run([bundle])
+    def restore(self, bundle_dir):
+        """ Create repos from the bundles in bundle_dir written by bundle()
+            and reset them to their revision.
+        """
+        def restore(repo, runner, result):
+            result._status = "restored"
+            return repo.restore(self._base, os.path.join(bundle_dir, repo._name + ".bundle"),
+                                runner=runner)
+        return self._run([restore, "switch"])
+    @staticmethod
+    def report(results, fd=sys.stdout):
+        """ Write captured output followed by a summary line for each repo.
+
+        results: List of FetchResult objects returned by one of the methods
+                 above.
+        fd: A file object where the report will be written.
+        """
+        for result in results:
+            if result._output:
+                fd.write("==> {0} <==\n".format(result._name))
+                fd.write(result._output)
+        fd.write("summary:\n")
+        for result in results:
+            fd.write("    {0}\n".format(result))
+        counts = {}
+        for result in results:
+            status = result._status
+            if not result.ok() and status != "cancelled":
+                status = "failed"
+            if status is not None:
+                counts[status] = counts.get(status, 0) + 1
+        if counts:
+            fd.write("{0}\n".format(", ".join(
+                "{0} {1}".format(counts[status], status)
+                for status in sorted(counts))))
@@ -0,0 +1,107 @@
+import re
+
+class RetryPolicy(object):
+    """ Timeouts and retries for the git commands run by a GitRunner.
+
+    Every git command can have a timeout, either per subcommand or a default
+    for all of them. Only transient failures of network operations are
+    retried: a timeout, or an error git reports when the link or the server
+    let it down. A failed checkout, a pull that can't fast-forward or an
+    unknown branch won't succeed by trying again, a fetch over a flaky link
+    may. Retries wait with exponential backoff.
+    """
+    # git subcommands talking to a remote
+    NETWORK = frozenset(["clone", "fetch", "pull", "remote", "ls-remote"])
+    # stderr of git when the network or the server failed
+    TRANSIENT = re.compile("|".join([
+        r"could not resolve host",
+        r"temporary failure in name resolution",
+        r"early eof",
+        r"unexpected disconnect",
+        r"connection (timed out|reset|refused)",
+        r"operation timed out",
+        r"the remote end hung up unexpectedly",
+        r"rpc failed",
+        r"the requested url returned error: 5\d\d",
+        r"could not read from remote repository",
+        r"does not appear to be a git repository",
+    ]), re.IGNORECASE)
+
+    def __init__(self, retries=0, backoff=1.0, max_backoff=60.0, timeout=None,
+                 timeouts=None):
+        """ Initialize RetryPolicy.
+
+        retries: Number of times a failed network operation is retried.
+        backoff: Seconds to wait before the first retry, doubled for each
+                 following retry.
+        max_backoff: Upper limit of the wait between retries.
+        timeout: Default seconds a git command may run, None for no limit.
+        timeouts: Optional dict mapping git subcommands to their timeout,
+                  overriding the default.
+        """
+        if retries < 0:
+            raise ValueError("retries must not be negative, got {0}".format(retries))
+        if backoff < 0:
+            raise ValueError("backoff must not be negative, got {0}".format(backoff))
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._timeout = timeout
+        self._timeouts = dict(timeouts or {})
+        for op, seconds in self._timeouts.items():
+            if seconds is not None and seconds <= 0:
+                raise ValueError("timeout for {0} must be positive, got {1}".format(op, seconds))
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be positive, got {0}".format(timeout))
+    @staticmethod
+    def parse_timeout(spec):
+        """ Parse a timeout given as 'SECONDS' or 'OPERATION=SECONDS'.
+
+        returns a tuple (operation, seconds), operation is None for the
+        default timeout. Raises ValueError if spec is malformed.
+        """
+        op, sep, seconds = spec.rpartition("=")
+        try:
+            seconds = float(seconds)
+        except ValueError:
+            raise ValueError("invalid timeout: {0}".format(spec))
+        if sep and not op:
+            raise ValueError("invalid timeout: {0}".format(spec))
+        return (op or None), seconds
+    def has_timeouts(self):
+        """ True if any git command has a timeout.
+        """
+        return self._timeout is not None or any(
+            seconds is not None for seconds in self._timeouts.values())
+    def timeout(self, op):
+        """ Timeout in seconds for the git subcommand op, None for no limit.
+        """
+        return self._timeouts.get(op, self._timeout)
+    def retries(self):
+        """ Number of retries of a failed network operation.
+        """
+        return self._retries
+    @staticmethod
+    def transient(rc, stderr=None, timed_out=False):
+        """ True if a git command that exited with rc failed in a way that
+            may not happen again: it timed out or its stderr names a network
+            error.
+        """
+        if rc == 0:
+            return False
+        return timed_out or (stderr is not None and
+                             RetryPolicy.TRANSIENT.search(stderr) is not None)
+    def retry(self, op, attempt, rc, stderr=None, timed_out=False):
+        """ True if git subcommand op should be run again after failing
+            attempt (counted from 0) times.
+
+        rc: Exit code of the failed attempt.
+        stderr: What the failed attempt wrote to stderr, or its tail.
+        timed_out: True if the attempt was killed by its timeout.
+        """
+        return (op in RetryPolicy.NETWORK and attempt < self._retries and
+                RetryPolicy.transient(rc, stderr, timed_out))
+    def delay(self, attempt):
+        """ Seconds to wait before retry number attempt (counted from 0).
+        """
+        return min(self._max_backoff, self._backoff * 2 ** attempt)
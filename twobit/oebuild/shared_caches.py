@@ -0,0 +1,118 @@
+import os
+import tempfile
+
+from conf_parser import ConfParser
+
+class SharedCaches(object):
+    """ DL_DIR and SSTATE_DIR shared by many build directories.
+
+    The locations come from the command line or a host config file written
+    in bitbake syntax, e.g.
+
+        DL_DIR = "/srv/oe/downloads"
+        SSTATE_DIR = "/srv/oe/sstate-cache"
+        BUILD_OP_MIN_FREE = "50"
+
+    Before a build directory is pointed at them they are created if needed
+    and checked to be writable and on a filesystem with enough free space.
+    """
+    VARIABLES = ("DL_DIR", "SSTATE_DIR")
+    # searched in order when no host config file is given
+    HOST_CONFS = ("~/.config/build_op.conf", "/etc/build_op.conf")
+
+    def __init__(self, dl_dir=None, sstate_dir=None, min_free=20.0):
+        """ Initialize SharedCaches.
+
+        dl_dir: Shared download directory, None to keep the one from the
+                local.conf template.
+        sstate_dir: Shared sstate cache, None to keep the one from the
+                    template.
+        min_free: Free space in GiB required on the filesystem of each
+                  directory.
+        """
+        self._dirs = {"DL_DIR": dl_dir, "SSTATE_DIR": sstate_dir}
+        for name in SharedCaches.VARIABLES:
+            if self._dirs[name] is not None:
+                self._dirs[name] = os.path.abspath(os.path.expanduser(self._dirs[name]))
+        self._min_free = min_free
+    @staticmethod
+    def host_conf(path=None):
+        """ Read DL_DIR, SSTATE_DIR and BUILD_OP_MIN_FREE from a host config
+            file.
+
+        path: Config file, the first existing one of HOST_CONFS if None.
+        returns a dict with the variables set in the file. A missing file
+        gives an empty dict. Raises ValueError on syntax errors.
+        """
+        if path is None:
+            found = [conf for conf in (os.path.expanduser(conf) for conf in SharedCaches.HOST_CONFS)
+                     if os.path.exists(conf)]
+            path = found[0] if found else None
+        if path is None or not os.path.exists(path):
+            return {}
+        conf = ConfParser({"HOME": os.path.expanduser("~")})
+        conf.parse_file(path)
+        values = {}
+        for name in SharedCaches.VARIABLES + ("BUILD_OP_MIN_FREE",):
+            value = conf.getvar(name)
+            if value is not None:
+                values[name] = value
+        if "BUILD_OP_MIN_FREE" in values:
+            try:
+                values["BUILD_OP_MIN_FREE"] = float(values["BUILD_OP_MIN_FREE"])
+            except ValueError:
+                raise ValueError("{0}: BUILD_OP_MIN_FREE is not a number: {1}".format(
+                    path, values["BUILD_OP_MIN_FREE"]))
+        return values
+    def dirs(self):
+        """ List of (variable, directory) tuples for the shared directories.
+        """
+        return [(name, self._dirs[name]) for name in SharedCaches.VARIABLES
+                if self._dirs[name] is not None]
+    @staticmethod
+    def free_space(path):
+        """ Free space in GiB available to us on the filesystem of path.
+        """
+        st = os.statvfs(path)
+        return st.f_bavail * st.f_frsize / float(1024 ** 3)
+    def check(self):
+        """ Create the shared directories if needed and make sure they can
+            be used.
+
+        returns a list of error messages, empty if every directory is fine.
+        """
+        errors = []
+        for name, path in self.dirs():
+            try:
+                if not os.path.isdir(path):
+                    os.makedirs(path)
+                # access() can't see read only mounts or NFS root squashing
+                fd, probe = tempfile.mkstemp(prefix=".build_op-", dir=path)
+                os.close(fd)
+                os.unlink(probe)
+            except OSError as e:
+                errors.append("{0} {1} is not writable: {2}".format(name, path, e.strerror))
+                continue
+            free = SharedCaches.free_space(path)
+            if free < self._min_free:
+                errors.append("{0} {1} has {2:.1f} GiB free, {3:g} GiB required".format(
+                    name, path, free, self._min_free))
+        return errors
+    def local_conf(self):
+        """ local.conf fragment pointing bitbake at the shared directories,
+            empty if there are none.
+        """
+        if not self.dirs():
+            return ""
+        lines = ["# Shared between build directories, set up by build_op.py"]
+        lines += ['{0} = "{1}"'.format(name, path) for name, path in self.dirs()]
+        return "\n".join(lines) + "\n"
+    def environment(self):
+        """ environment.sh fragment exporting the shared directories, empty
+            if there are none.
+        """
+        if not self.dirs():
+            return ""
+        lines = ["# Shared between build directories, set up by build_op.py"]
+        lines += ['export {0}="{1}"'.format(name, path) for name, path in self.dirs()]
+        return "\n".join(lines) + "\n"
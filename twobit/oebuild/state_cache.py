@@ -0,0 +1,85 @@
+import json
+import os
+
+from file_lock import FileLock
+from git_state import GitState
+
+class StateCache(object):
+    """ On-disk cache of the state collected from each repo in src_dir.
+
+    Every entry is stored with a signature made of the size and mtime of
+    the files git changes whenever the state of a repo changes: HEAD, the
+    branch ref it points at, packed-refs, config and the index, plus the
+    work tree root. An entry is only used while its signature matches, so
+    only repos whose git metadata changed are scanned again.
+    """
+    VERSION = 1
+
+    def __init__(self, path):
+        """ Initialize StateCache, loading the cache file if it exists.
+
+        path: Path of the JSON cache file.
+        """
+        self._path = path
+        self._entries = {}
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as cache_fd:
+                    data = json.load(cache_fd)
+                if data.get("version") == StateCache.VERSION:
+                    self._entries = data.get("repos", {})
+            except (ValueError, AttributeError):
+                self._entries = {}
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime, st.st_size]
+    @staticmethod
+    def signature(repo_root):
+        """ Compute the signature of the repo with work tree repo_root.
+        """
+        private, common = GitState.git_dirs(os.path.join(repo_root, ".git"))
+        files = [os.path.join(private, "HEAD"),
+                 os.path.join(private, "index"),
+                 os.path.join(common, "packed-refs"),
+                 os.path.join(common, "config")]
+        try:
+            with open(files[0], 'r') as head_fd:
+                head = head_fd.read().strip()
+        except IOError:
+            head = ""
+        if head.startswith("ref:"):
+            files.append(os.path.join(common, head[len("ref:"):].strip()))
+        return [head, StateCache._stat(repo_root)] + [StateCache._stat(path) for path in files]
+    def get(self, repo_root, signature):
+        """ Cached value for repo_root, None if missing or out of date.
+        """
+        entry = self._entries.get(os.path.abspath(repo_root))
+        if entry is None or entry.get("signature") != signature:
+            return None
+        return entry.get("value")
+    def put(self, repo_root, signature, value):
+        """ Store value, which must be JSON serializable, for repo_root.
+        """
+        self._entries[os.path.abspath(repo_root)] = {"signature": signature,
+                                                     "value": value}
+        self._dirty = True
+    def save(self):
+        """ Write the cache file if anything changed.
+        """
+        if not self._dirty:
+            return
+        cache_dir = os.path.dirname(os.path.abspath(self._path))
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with FileLock(self._path + ".lock"):
+            tmp_file = self._path + ".tmp"
+            with open(tmp_file, 'w') as cache_fd:
+                json.dump({"version": StateCache.VERSION, "repos": self._entries},
+                          cache_fd, indent=4, sort_keys=True)
+            os.rename(tmp_file, self._path)
+        self._dirty = False
@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+
+class Tracer(object):
+    """ Record timing, exit code and bytes transferred for git operations.
+
+    Events are collected from any number of threads and can be written as a
+    plain JSON trace or in the Chrome trace event format understood by
+    chrome://tracing and Perfetto.
+    """
+    def __init__(self):
+        self._events = []
+        self._lock = threading.Lock()
+        self._origin = time.time()
+    @staticmethod
+    def object_bytes(git_dir):
+        """ Total size of the object store of the repo in git_dir.
+
+        Comparing this before and after an operation gives the number of
+        bytes it added to the repo, which for clone and fetch is close to
+        what was transferred.
+        """
+        total = 0
+        for root, dirs, files in os.walk(os.path.join(git_dir, "objects")):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+    def record(self, repo, op, start, duration, rc, nbytes=None, args=None):
+        """ Record a completed operation.
+
+        repo: Name of the repo the operation was run on.
+        op: Name of the operation, e.g. the git subcommand.
+        start: Start time as returned by time.time().
+        duration: Wall time of the operation in seconds.
+        rc: Exit code.
+        nbytes: Growth of the object store in bytes, None if not measured.
+        args: Optional list with the full command.
+        """
+        event = {
+            "repo": repo,
+            "op": op,
+            "start": start - self._origin,
+            "duration": duration,
+            "rc": rc,
+        }
+        if nbytes is not None:
+            event["bytes"] = nbytes
+        if args is not None:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+    def events(self):
+        """ List of recorded events ordered by start time.
+        """
+        with self._lock:
+            return sorted(self._events, key=lambda event: event["start"])
+    def write_json(self, fd):
+        """ Write the events and per-repo totals as JSON.
+        """
+        events = self.events()
+        totals = {}
+        for event in events:
+            total = totals.setdefault(event["repo"], {"duration": 0.0, "bytes": 0})
+            total["duration"] += event["duration"]
+            total["bytes"] += event.get("bytes", 0)
+        json.dump({"events": events, "repos": totals}, fd, indent=4,
+                  sort_keys=True)
+    def write_chrome(self, fd):
+        """ Write the events in the Chrome trace event format, one track per
+            repo.
+        """
+        events = self.events()
+        tids = {}
+        trace = []
+        for event in events:
+            if event["repo"] not in tids:
+                tids[event["repo"]] = len(tids) + 1
+                trace.append({"name": "thread_name", "ph": "M", "pid": 1,
+                              "tid": tids[event["repo"]],
+                              "args": {"name": event["repo"]}})
+            args = {"rc": event["rc"]}
+            if "bytes" in event:
+                args["bytes"] = event["bytes"]
+            trace.append({"name": event["op"], "cat": "git", "ph": "X",
+                          "pid": 1, "tid": tids[event["repo"]],
+                          "ts": int(event["start"] * 1000000),
+                          "dur": int(event["duration"] * 1000000),
+                          "args": args})
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, fd)
+    def write(self, path, trace_format="json"):
+        """ Write the trace to the file at path.
+
+        trace_format: 'json' or 'chrome'.
+        """
+        with open(path, 'w') as trace_fd:
+            if trace_format == "chrome":
+                self.write_chrome(trace_fd)
+            else:
+                self.write_json(trace_fd)
@@ -0,0 +1,71 @@
+import sys
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+class WorkPool(object):
+    """ Apply a function to a list of items using a bounded pool of threads.
+    """
+    def __init__(self, jobs=1):
+        """ Initialize WorkPool.
+
+        jobs: Maximum number of items processed concurrently. A value of 1
+              processes items in order in the calling thread.
+        """
+        if jobs < 1:
+            raise ValueError("jobs must be at least 1, got {0}".format(jobs))
+        self._jobs = jobs
+    def map(self, func, items, order=None):
+        """ Call func on each item and return the results in item order.
+
+        If func raises for any item the remaining items are still processed
+        and the first exception is re-raised once all workers are done.
+
+        order: Optional list of item indices giving the order in which items
+               are started, e.g. longest first to shorten the critical path.
+        """
+        items = list(items)
+        if order is None:
+            order = range(len(items))
+        results = [None] * len(items)
+        errors = []
+        if self._jobs == 1 or len(items) < 2:
+            for index in order:
+                try:
+                    results[index] = func(items[index])
+                except Exception:
+                    errors.append(sys.exc_info()[1])
+            if errors:
+                raise errors[0]
+            return results
+        work = queue.Queue()
+        for index in order:
+            work.put((index, items[index]))
+
+        def worker():
+            while True:
+                try:
+                    index, item = work.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[index] = func(item)
+                except Exception:
+                    errors.append(sys.exc_info()[1])
+
+        threads = []
+        for _ in range(min(self._jobs, len(items))):
+            thread = threading.Thread(target=worker)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        # join with a timeout so KeyboardInterrupt is delivered on python 2
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.1)
+        if errors:
+            raise errors[0]
+        return results